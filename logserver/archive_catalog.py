@@ -0,0 +1,217 @@
+"""Catalog of the rotated archives, kept next to them in the log directory.
+
+Archive search, retention and the files page used to glob the log directory
+and stat, parse or index-load every archive each time. rotate.py instead
+records each archive it writes (and drops each one it deletes) in a small
+JSON file, ``.archive_catalog.json`` in the directory of ROTATED_LOG_PATTERN:
+
+    {"version": 3, "pattern": ROTATED_LOG_PATTERN,
+     "archives": [{"name", "size", "sidecars", "mtime", "first", "last", "lines",
+                   "codec", "members"}, ...]}
+
+sidecars is the total size of the archive's index and rollup sidecars (see
+archive_index.SIDECAR_SUFFIXES), which retention counts with it. first and last are the UTC epoch bounds from the archive's time index (None
+for archives without one), members the host and program summary of its
+column index (see column_index.summarize_columns, None without one). Entries
+are kept oldest first by mtime.
+
+The catalog file gets the modification time the directory had when its
+entries were known to be complete, so a catalog older than its directory may
+have missed archives added or removed by something else (by hand, the
+converter, a restore). It is then refreshed from the archives on disk, which
+only describes again the archives whose size or mtime changed, and is only
+rewritten when that finds a change: temporary files written next to the
+archives make the directory newer without changing any. A missing or
+unreadable catalog is rebuilt from scratch. Readers check this with a single
+stat of the directory; ``python3 archive_catalog.py`` forces a full rebuild.
+
+Every process reading or changing the catalog file does it holding an
+exclusive flock on ``.archive_catalog.json.lock``, so a refresh in a front
+process and rotate.py recording a new archive cannot overwrite each other.
+"""
+import os
+import json
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+import archive_index
+import column_index
+from settings import ROTATED_LOG_PATTERN
+
+CATALOG_NAME = ".archive_catalog.json"
+CATALOG_VERSION = 3
+LOCK_SUFFIX = ".lock"
+
+# Catalog path -> (directory mtime_ns, pattern, entries), per process
+_cache = {}
+_lock = threading.Lock()
+
+def catalog_path(pattern=ROTATED_LOG_PATTERN):
+    return os.path.join(os.path.dirname(pattern), CATALOG_NAME)
+
+def _dir_mtime_ns(path):
+    return os.stat(os.path.dirname(path) or ".").st_mtime_ns
+
+@contextmanager
+def _locked(pattern):
+    """Hold this process's lock and the flock of the catalog file."""
+    with _lock:
+        fd = os.open(catalog_path(pattern) + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+def is_catalog(filename):
+    return os.path.basename(filename).startswith(CATALOG_NAME)
+
+def describe_archive(path, index=None):
+    """The catalog entry of an archive on disk."""
+    st = os.stat(path)
+    if index is None:
+        index = archive_index.load_index(path)
+    columns = column_index.load_columns(path)
+    sidecars = 0
+    for suffix in archive_index.SIDECAR_SUFFIXES:
+        try:
+            sidecars += os.path.getsize(path + suffix)
+        except OSError:
+            pass
+    return {
+        "name": os.path.basename(path),
+        "size": st.st_size,
+        "sidecars": sidecars,
+        "mtime": st.st_mtime,
+        "first": index["first"] if index else None,
+        "last": index["last"] if index else None,
+        "lines": index["lines"] if index else None,
+        "codec": (index or {}).get("codec") or archive_index.archive_codec(path),
+        "members": column_index.summarize_columns(columns) if columns else None,
+    }
+
+def save_catalog(entries, pattern=ROTATED_LOG_PATTERN, complete_ns=None):
+    """Write entries, complete as of directory mtime complete_ns, and return
+    them sorted. Call with _locked held. When the directory changed since,
+    by anything but this write, the catalog is left stale for the next
+    reader to refresh."""
+    path = catalog_path(pattern)
+    entries = sorted(entries, key=lambda e: e["mtime"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        unchanged = complete_ns is None or _dir_mtime_ns(path) == complete_ns
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "pattern": pattern, "archives": entries}, f,
+                      separators=(",", ":"))
+        os.replace(tmp_path, path)
+        # Up to date with the directory as it is now, or as it was
+        stamp_ns = _dir_mtime_ns(path) if unchanged else complete_ns
+        os.utime(path, ns=(stamp_ns, stamp_ns))
+    except OSError as e:
+        logging.warning(f"Could not write archive catalog {path}: {e}")
+    return entries
+
+def rebuild_catalog(pattern=ROTATED_LOG_PATTERN, known=None):
+    """Describe every archive matching pattern and save the result, unless
+    it is the same as known. Entries of known whose archive has the same size
+    and mtime are kept as they are. Call with _locked held."""
+    path = catalog_path(pattern)
+    # Archives appearing from here on may be missed
+    complete_ns = _dir_mtime_ns(path)
+    by_name = {entry["name"]: entry for entry in known or ()}
+    entries = []
+    described = 0
+    for archive in archive_index.archive_glob(pattern):
+        try:
+            st = os.stat(archive)
+            entry = by_name.get(os.path.basename(archive))
+            if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+                entry = describe_archive(archive)
+                described += 1
+            entries.append(entry)
+        except OSError as e:
+            logging.warning(f"Leaving {archive} out of the archive catalog: {e}")
+    if known is not None and not described and len(entries) == len(by_name):
+        try:
+            os.utime(path, ns=(complete_ns, complete_ns))
+        except OSError as e:
+            logging.warning(f"Could not update archive catalog {path}: {e}")
+        return sorted(entries, key=lambda e: e["mtime"])
+    logging.info(f"Refreshed archive catalog of {len(entries)} archives ({described} described)")
+    return save_catalog(entries, pattern, complete_ns)
+
+def _read_catalog(path, pattern):
+    """(entries, mtime_ns) of the catalog file, (None, None) when it has to
+    be rebuilt from scratch."""
+    try:
+        with open(path) as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            catalog = json.load(f)
+        if catalog.get("version") != CATALOG_VERSION or catalog.get("pattern") != pattern:
+            return None, None
+        return catalog["archives"], mtime_ns
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring archive catalog {path}: {e}")
+        return None, None
+
+def _refresh(pattern):
+    """(entries, directory mtime_ns they are complete as of) of the catalog
+    file, refreshed first when it is stale. Call with _locked held."""
+    path = catalog_path(pattern)
+    entries, mtime_ns = _read_catalog(path, pattern)
+    if entries is None or mtime_ns < _dir_mtime_ns(path):
+        entries = rebuild_catalog(pattern, entries)
+        mtime_ns = os.stat(path).st_mtime_ns if os.path.exists(path) else _dir_mtime_ns(path)
+    return entries, mtime_ns
+
+def _with_paths(entries, pattern):
+    directory = os.path.dirname(catalog_path(pattern))
+    return [dict(entry, path=os.path.join(directory, entry["name"])) for entry in entries]
+
+def load_catalog(pattern=ROTATED_LOG_PATTERN):
+    """The catalog entries, oldest first, each with its full "path" added.
+    Nothing is read again while the directory does not change."""
+    path = catalog_path(pattern)
+    with _lock:
+        dir_mtime_ns = _dir_mtime_ns(path)
+        cached = _cache.get(path)
+        if cached and cached[0] == dir_mtime_ns and cached[1] == pattern:
+            return _with_paths(cached[2], pattern)
+        entries, mtime_ns = _read_catalog(path, pattern)
+    if entries is None or mtime_ns < dir_mtime_ns:
+        with _locked(pattern):
+            # Another process may have refreshed it in the meantime
+            entries, mtime_ns = _refresh(pattern)
+            _cache[path] = (mtime_ns, pattern, entries)
+    else:
+        with _lock:
+            _cache[path] = (dir_mtime_ns, pattern, entries)
+    return _with_paths(entries, pattern)
+
+def add_archive(path, index=None, pattern=ROTATED_LOG_PATTERN):
+    """Record a new (or rewritten) archive."""
+    entry = describe_archive(path, index)
+    with _locked(pattern):
+        entries, complete_ns = _refresh(pattern)
+        entries = [e for e in entries if e["name"] != entry["name"]] + [entry]
+        _cache.pop(catalog_path(pattern), None)
+        save_catalog(entries, pattern, complete_ns)
+
+def remove_archives(paths, pattern=ROTATED_LOG_PATTERN):
+    """Drop deleted archives from the catalog."""
+    names = {os.path.basename(path) for path in paths}
+    if names:
+        with _locked(pattern):
+            entries, complete_ns = _refresh(pattern)
+            _cache.pop(catalog_path(pattern), None)
+            save_catalog([e for e in entries if e["name"] not in names], pattern, complete_ns)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [archive_catalog.py]: %(message)s")
+    with _locked(ROTATED_LOG_PATTERN):
+        entries = rebuild_catalog(ROTATED_LOG_PATTERN)
+    for entry in entries:
+        print(f"{entry['name']}: {entry['size']} bytes, {entry['lines']} lines, {entry['codec']}")
@@ -0,0 +1,520 @@
+"""Sidecar time indexes for rotated log archives.
+
+rotate.py writes every rotated file as a compressed archive split into
+segments and records where each segment starts in a small JSON sidecar next
+to the archive (``<archive>.gz.idx``), together with the first line number
+and min/max epoch of the lines it holds. search_archive.py uses it to inflate
+only the segments that overlap a query. Two layouts exist, both readable by the usual command
+line tools (zcat, bzcat, xzcat):
+
+* ``gzip``: one gzip member with a full zlib flush every time the log moves
+  into a new minute. Inflate can restart with an empty window at a flush
+  point, so each minute is a segment.
+* ``blocks``: a series of independently compressed members (gzip, bz2 or xz,
+  see CODECS) of roughly ``block_size_kb`` uncompressed bytes each. Blocks
+  can be decompressed in any order and in parallel, which also allows
+  reading newest-first.
+
+Both are written by a pool of threads compressing chunks of about a block
+each (zlib, bz2 and lzma release the GIL), which for the ``gzip`` layout are
+raw deflate streams ending in a full flush, stitched into one gzip member.
+"""
+import os
+import bz2
+import glob
+import json
+import gzip
+import lzma
+import time
+import zlib
+import struct
+import shutil
+import logging
+from collections import deque
+from datetime import timezone
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from isodate import IsoDateDecoder
+
+INDEX_SUFFIX = ".idx"
+TEXT_INDEX_SUFFIX = ".tri"
+COLUMN_INDEX_SUFFIX = ".cols"
+ROLLUP_SUFFIX = ".rollup"
+INDEX_VERSION = 1
+SIDECAR_SUFFIXES = (INDEX_SUFFIX, TEXT_INDEX_SUFFIX, COLUMN_INDEX_SUFFIX, ROLLUP_SUFFIX)
+ARCHIVE_FORMATS = ("gzip", "blocks")
+READ_CHUNK = 256 * 1024
+DECOMPRESS_THREADS = min(4, os.cpu_count() or 1)
+# Codec -> (archive suffix, default level, one-member compress function,
+# decompressor factory, open function)
+CODECS = {
+    "gzip": (".gz", 6, lambda data, level: gzip.compress(data, compresslevel=level),
+             lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), gzip.open),
+    "bz2": (".bz2", 9, lambda data, level: bz2.compress(data, level), bz2.BZ2Decompressor, bz2.open),
+    "xz": (".xz", 6, lambda data, level: lzma.compress(data, preset=level), lzma.LZMADecompressor, lzma.open),
+}
+# Uncompressed bytes per compression job of the gzip layout
+FLUSH_CHUNK_SIZE = 1024 * 1024
+
+def index_path(gz_path):
+    return gz_path + INDEX_SUFFIX
+
+def is_sidecar(filename):
+    return filename.endswith(SIDECAR_SUFFIXES)
+
+def archive_codec(path):
+    """The codec of an archive by its suffix, None for anything else."""
+    for codec, (suffix, *_) in CODECS.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+def is_archive(path):
+    return archive_codec(path) is not None
+
+def strip_archive_suffix(path):
+    codec = archive_codec(path)
+    return path[:-len(CODECS[codec][0])] if codec else path
+
+def archive_glob(pattern):
+    """Archives matching pattern, with its archive suffix (".gz" in the
+    default rotation pattern) standing for that of any codec."""
+    base = strip_archive_suffix(pattern)
+    if base == pattern:
+        return glob.glob(pattern)
+    return [path for suffix, *_ in CODECS.values() for path in glob.glob(base + suffix)]
+
+def open_archive(path, mode="rt"):
+    """Open an archive (or a plain file) of any codec for reading."""
+    codec = archive_codec(path)
+    open_fn = CODECS[codec][4] if codec else open
+    if "b" in mode:
+        return open_fn(path, mode)
+    return open_fn(path, mode, encoding="utf-8", errors="ignore")
+
+def isodate_to_epoch(isodate):
+    """Return the epoch seconds of a syslog-ng ISODATE, or None if it does not parse.
+    Naive dates are taken as server local time."""
+    return IsoDateDecoder().epoch(isodate)
+
+def datetime_to_epoch(dt):
+    """Epoch seconds of a search bound; naive datetimes are taken as UTC."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _line_epoch(line, decoder):
+    if b"|" not in line:
+        return None
+    return decoder.epoch(line.split(b"|", 1)[0].decode("utf-8", "ignore"))
+
+def _make_index(archive_format, line_no, segments):
+    return {
+        "version": INDEX_VERSION,
+        "format": archive_format,
+        "lines": line_no,
+        "first": min((s[2] for s in segments), default=None),
+        "last": max((s[3] for s in segments), default=None),
+        "segments": segments,
+    }
+
+def _read_chunks(src_path, chunk_size, per_minute):
+    """Split src_path into chunks of about chunk_size bytes for the
+    compression pool, working out the segments on the way.
+
+    Yields (data, pieces, line count so far) with pieces a list of (offset
+    in data, segment) for the segments starting in this chunk, each a new
+    [compressed offset (filled in when written), first line number, min
+    epoch, max epoch]. With per_minute, a segment starts whenever a line
+    moves past the newest minute seen so far; lines with older timestamps
+    (skewed sender clocks) stay in the current segment and just widen its
+    min bound. Otherwise every chunk holding a dated line is one segment."""
+    line_no = 0
+    decoder = IsoDateDecoder()
+    segment = None
+    high_minute = None
+    data, pieces, size = [], [], 0
+    with open(src_path, 'rb') as f_in:
+        for line in f_in:
+            ts = _line_epoch(line, decoder)
+            if ts is not None:
+                if per_minute:
+                    minute = int(ts // 60)
+                    if segment is None or minute > high_minute:
+                        segment = [None, line_no, int(ts), int(ts) + 1]
+                        pieces.append((size, segment))
+                        high_minute = minute
+                elif not pieces:
+                    segment = [None, line_no - len(data), int(ts), int(ts) + 1]
+                    pieces.append((0, segment))
+                segment[2] = min(segment[2], int(ts))
+                segment[3] = max(segment[3], int(ts) + 1)
+            data.append(line)
+            size += len(line)
+            line_no += 1
+            if size >= chunk_size:
+                yield b"".join(data), pieces, line_no
+                data, pieces, size = [], [], 0
+    if data:
+        yield b"".join(data), pieces, line_no
+
+def _deflate_chunk(data, pieces, level):
+    """Raw deflate data with a full flush before each segment start and at
+    the end, so that the chunks can be concatenated and every segment
+    inflated on its own. Returns the compressed bytes and the compressed
+    offset of each piece within them."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    out = []
+    out_size = 0
+    offsets = []
+    prev = 0
+    for offset, _ in pieces:
+        if offset > prev:
+            out.append(compressor.compress(data[prev:offset]) + compressor.flush(zlib.Z_FULL_FLUSH))
+            out_size += len(out[-1])
+            prev = offset
+        offsets.append(out_size)
+    out.append(compressor.compress(data[prev:]) + compressor.flush(zlib.Z_FULL_FLUSH))
+    return b"".join(out), offsets
+
+class _SegmentFeeder:
+    """Cut the chunks written by _compress_chunks back into segments for an
+    on_segment(segment number, first line number, lines) callback, the lines
+    split as iter_segments returns them. Lines before the first segment are
+    not part of any and are left out, as when reading the archive."""
+
+    def __init__(self, on_segment):
+        self.on_segment = on_segment
+        self.current = None
+        self.pending = []
+
+    def feed(self, data, starts):
+        """data is a chunk, starts the (offset in data, segment number,
+        segment) of the segments starting in it."""
+        prev = 0
+        for offset, seg_no, segment in starts:
+            if offset > prev:
+                self.pending.append(data[prev:offset])
+            self.flush()
+            self.current = (seg_no, segment[1])
+            prev = offset
+        self.pending.append(data[prev:])
+
+    def flush(self):
+        text = b"".join(self.pending).decode("utf-8", "ignore")
+        self.pending = []
+        if self.current is not None and text:
+            self.on_segment(*self.current, (text[:-1] if text.endswith("\n") else text).split("\n"))
+
+def _compress_chunks(src_path, f_out, chunk_size, per_minute, compress, workers, progress, written=None,
+                     on_segment=None):
+    """Compress the chunks of src_path on a pool of workers threads and write
+    them to f_out in order, keeping at most two chunks per worker in memory.
+
+    compress(data, pieces) returns the compressed bytes and the offset of
+    each piece within them; written(data), if given, is called with every
+    chunk once it is written, on_segment as for compress_archive. Returns
+    the segments and the line count."""
+    total = os.path.getsize(src_path)
+    segments = []
+    line_no = 0
+    done = 0
+    in_flight = deque()
+    feeder = _SegmentFeeder(on_segment) if on_segment else None
+
+    def write_one():
+        nonlocal done
+        data, pieces, future = in_flight.popleft()
+        compressed, offsets = future.result()
+        base = f_out.tell()
+        starts = []
+        for (start, segment), offset in zip(pieces, offsets):
+            segment[0] = base + offset
+            starts.append((start, len(segments), segment))
+            segments.append(segment)
+        f_out.write(compressed)
+        if written:
+            written(data)
+        if feeder:
+            feeder.feed(data, starts)
+        done += len(data)
+        if progress:
+            progress(done, total)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for data, pieces, line_no in _read_chunks(src_path, chunk_size, per_minute):
+            in_flight.append((data, pieces, pool.submit(compress, data, pieces)))
+            if len(in_flight) >= workers * 2:
+                write_one()
+        while in_flight:
+            write_one()
+    if feeder:
+        feeder.flush()
+    return segments, line_no
+
+def _write_flush_gzip(src_path, gz_path, level, workers, progress, on_segment=None):
+    """Single gzip member with a full flush per minute, stitched together from
+    chunks deflated in parallel. Each segment is stored as [compressed
+    offset, first line number, min epoch, max epoch]."""
+    crc = 0
+    size = 0
+
+    def checksum(data):
+        nonlocal crc, size
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+
+    with open(gz_path, 'wb') as f_out:
+        # Gzip header: deflate, no name, mtime, unknown OS
+        f_out.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time())) + b"\x00\xff")
+        segments, line_no = _compress_chunks(src_path, f_out, FLUSH_CHUNK_SIZE, True,
+                                             lambda data, pieces: _deflate_chunk(data, pieces, level),
+                                             workers, progress, checksum, on_segment)
+        # Final empty block, then the gzip trailer
+        f_out.write(b"\x03\x00" + struct.pack("<II", crc, size & 0xffffffff))
+    return _make_index("gzip", line_no, segments)
+
+def _write_blocks(src_path, out_path, block_size, codec, level, workers, progress, on_segment=None):
+    """One compressed member per block of about block_size uncompressed
+    bytes, compressed in parallel. Blocks without any parseable date get no
+    segment of their own and are read as part of the previous one."""
+    compress_member = CODECS[codec][2]
+    with open(out_path, 'wb') as f_out:
+        segments, line_no = _compress_chunks(src_path, f_out, block_size, False,
+                                             lambda data, pieces: (compress_member(data, level), [0] * len(pieces)),
+                                             workers, progress, on_segment=on_segment)
+    return _make_index("blocks", line_no, segments)
+
+def compress_archive(src_path, gz_path, archive_format="gzip", block_size=1024 * 1024, codec=None, level=None,
+                     workers=None, progress=None, on_segment=None):
+    """Compress src_path to gz_path in the given layout and write its sidecar.
+
+    codec defaults to the one of gz_path's suffix; the gzip layout only
+    exists for gzip, other codecs are written as blocks. level defaults to
+    the codec's usual one, workers to one thread per core. progress, if
+    given, is called with (bytes compressed, total bytes) as the work
+    advances. on_segment, if given, is called with (segment number, first
+    line number, lines) for every segment in order as it is written, the
+    lines being those iter_segments will read back, so other sidecars can be
+    built without inflating the archive again."""
+    codec = codec or archive_codec(gz_path) or "gzip"
+    if level is None:
+        level = CODECS[codec][1]
+    workers = workers or os.cpu_count() or 1
+    if codec != "gzip" and archive_format != "blocks":
+        logging.info(f"The {archive_format} layout is gzip only, writing {gz_path} as {codec} blocks")
+        archive_format = "blocks"
+    tmp_path = gz_path + ".tmp"
+    if archive_format == "blocks":
+        index = _write_blocks(src_path, tmp_path, block_size, codec, level, workers, progress, on_segment)
+    else:
+        index = _write_flush_gzip(src_path, tmp_path, level, workers, progress, on_segment)
+    index["codec"] = codec
+    os.replace(tmp_path, gz_path)
+    write_index(gz_path, index)
+    logging.info(f"Indexed {gz_path} ({index['format']}, {codec}): {index['lines']} lines "
+                 f"in {len(index['segments'])} segments")
+    return index
+
+def convert_archive(gz_path, archive_format="gzip", block_size=1024 * 1024):
+    """Rewrite an existing archive (indexed or not) in the given layout,
+    keeping its modification time so retention is unaffected."""
+    stat = os.stat(gz_path)
+    plain_path = gz_path + ".plain"
+    try:
+        with open_archive(gz_path, 'rb') as f_in, open(plain_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        index = compress_archive(plain_path, gz_path, archive_format, block_size)
+    finally:
+        if os.path.exists(plain_path):
+            os.remove(plain_path)
+    os.utime(gz_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return index
+
+def write_index(gz_path, index):
+    tmp_path = index_path(gz_path) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, index_path(gz_path))
+
+@lru_cache(maxsize=256)
+def _load_index(path, mtime_ns):
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable archive index {path}: {e}")
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+def load_index(gz_path):
+    """Return the sidecar index of an archive, or None when it has none."""
+    path = index_path(gz_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_index(path, mtime_ns)
+
+def overlapping_segments(index, file_size, start_ts=None, end_ts=None, allowed=None):
+    """Return (segment number, start, end) compressed byte ranges of the
+    segments overlapping [start_ts, end_ts], oldest first. allowed optionally
+    restricts the result to a set of segment numbers."""
+    segments = index["segments"]
+    selected = []
+    for i, (offset, _, lo, hi) in enumerate(segments):
+        if start_ts is not None and hi < start_ts:
+            continue
+        if end_ts is not None and lo > end_ts:
+            continue
+        if allowed is not None and i not in allowed:
+            continue
+        end = segments[i + 1][0] if i + 1 < len(segments) else file_size
+        selected.append((i, offset, end))
+    return selected
+
+def segment_line_count(index, i):
+    segments = index["segments"]
+    end = segments[i + 1][1] if i + 1 < len(segments) else index["lines"]
+    return end - segments[i][1]
+
+def select_ranges(index, file_size, start_ts=None, end_ts=None):
+    """Merge the segments overlapping [start_ts, end_ts] into contiguous byte ranges."""
+    ranges = []
+    for _, start, end in overlapping_segments(index, file_size, start_ts, end_ts):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+def _decompressor(index):
+    if index["format"] == "blocks":
+        # Indexes written before there was a choice of codec are gzip
+        return CODECS[index.get("codec", "gzip")][3]
+    return lambda: zlib.decompressobj(-zlib.MAX_WBITS)
+
+def _inflate_range(f, start, end, new_inflater, multi_member):
+    """Yield text lines from one contiguous run of segments."""
+    f.seek(start)
+    inflater = new_inflater()
+    remaining = end - start
+    pending = b""
+    while remaining > 0:
+        chunk = f.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        data = pending
+        while chunk:
+            data += inflater.decompress(chunk)
+            chunk = b""
+            if inflater.eof:
+                if not multi_member:
+                    remaining = 0
+                    break
+                # Next block is a new gzip member
+                chunk = inflater.unused_data
+                inflater = new_inflater()
+        head, _, pending = data.rpartition(b"\n")
+        if head:
+            yield from head.decode("utf-8", "ignore").split("\n")
+    if not inflater.eof and hasattr(inflater, "flush"):
+        pending += inflater.flush()
+    if pending:
+        yield from pending.decode("utf-8", "ignore").rstrip("\n").split("\n")
+
+def _read_segment(file_path, start, end, new_inflater, multi_member):
+    with open(file_path, 'rb') as f:
+        return list(_inflate_range(f, start, end, new_inflater, multi_member))
+
+def iter_segments(file_path, start_ts=None, end_ts=None, reverse=False, allowed=None, index=None):
+    """Yield (segment number, lines) for the segments of an archive that may
+    hold lines in [start_ts, end_ts], newest first when reverse is set.
+    Files without an index come back as a single segment numbered None.
+
+    Segments are decompressed a few at a time in parallel (the codecs release
+    the GIL), with a small window so memory stays bounded."""
+    if index is None:
+        index = load_index(file_path) if is_archive(file_path) else None
+    if index is None:
+        with open_archive(file_path) as f:
+            lines = [line.rstrip('\n') for line in f]
+        yield None, (lines[::-1] if reverse else lines)
+        return
+
+    new_inflater = _decompressor(index)
+    multi_member = index["format"] == "blocks"
+    segments = overlapping_segments(index, os.path.getsize(file_path), start_ts, end_ts, allowed)
+    if reverse:
+        segments.reverse()
+    window = DECOMPRESS_THREADS * 2
+    with ThreadPoolExecutor(max_workers=DECOMPRESS_THREADS) as pool:
+        for i in range(0, len(segments), window):
+            batch = segments[i:i + window]
+            decoded = pool.map(lambda seg: _read_segment(file_path, seg[1], seg[2], new_inflater, multi_member), batch)
+            for (seg_no, _, _), lines in zip(batch, decoded):
+                yield seg_no, (lines[::-1] if reverse else lines)
+
+def iter_lines(file_path, start_ts=None, end_ts=None, reverse=False, allowed=None):
+    """Yield the lines of a log file (without newline) that may fall in
+    [start_ts, end_ts], newest segment first when reverse is set. Indexed
+    archives only inflate the overlapping segments; anything else is read in
+    full, so callers still have to check each line's date."""
+    index = load_index(file_path) if is_archive(file_path) else None
+    if index is None:
+        with open_archive(file_path) as f:
+            lines = (line.rstrip('\n') for line in f)
+            if reverse:
+                lines = reversed(list(lines))
+            yield from lines
+        return
+
+    if not reverse and allowed is None and index["format"] != "blocks":
+        # Stream contiguous runs of flush segments
+        with open(file_path, 'rb') as f:
+            for start, end in select_ranges(index, os.path.getsize(file_path), start_ts, end_ts):
+                yield from _inflate_range(f, start, end, _decompressor(index), False)
+        return
+
+    for _, lines in iter_segments(file_path, start_ts, end_ts, reverse, allowed, index):
+        yield from lines
+
+def remove_archive(gz_path):
+    """Delete an archive together with its sidecars."""
+    os.remove(gz_path)
+    for suffix in SIDECAR_SUFFIXES:
+        try:
+            os.remove(gz_path + suffix)
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    import argparse
+    from settings import ROTATED_LOG_PATTERN, ROTATED_LOG_ARCHIVE_FORMAT, ROTATED_LOG_BLOCK_SIZE_KB
+    from text_index import build_text_index
+    from column_index import build_column_index
+    from archive_catalog import add_archive
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [archive_index.py]: %(message)s")
+    parser = argparse.ArgumentParser(description="Convert rotated archives to an indexed layout.")
+    parser.add_argument("--format", choices=ARCHIVE_FORMATS, default=ROTATED_LOG_ARCHIVE_FORMAT)
+    parser.add_argument("--block-size-kb", type=int, default=ROTATED_LOG_BLOCK_SIZE_KB)
+    parser.add_argument("--missing-only", action="store_true", help="only convert archives without a sidecar index")
+    parser.add_argument("archives", nargs="*", help=f"archives to convert (default: {ROTATED_LOG_PATTERN})")
+    args = parser.parse_args()
+
+    for path in args.archives or sorted(archive_glob(ROTATED_LOG_PATTERN)):
+        if args.missing_only and load_index(path) is not None:
+            continue
+        try:
+            index = convert_archive(path, args.format, args.block_size_kb * 1024)
+            build_text_index(path)
+            build_column_index(path)
+            add_archive(path, index)
+        except Exception as e:
+            logging.error(f"Failed to convert {path}: {e}")
@@ -2,10 +2,22 @@ import os
 import time
 import threading
 import pyinotify
-from multiprocessing.connection import Listener, Client
+from multiprocessing.connection import Listener
 import logging
 import signal
-from settings import LOG_FILE, MAX_ARRAY_SIZE, TRIM_SIZE, SOCKET_PATH, LOG_LEVEL
+import sys
+import json
+import atexit
+import itertools
+from sys import intern
+from settings import (
+    LOG_FILE, MAX_ARRAY_SIZE, SOCKET_PATH, LOG_LEVEL, ROTATED_LOG_PATTERN,
+    LIVE_SHARED_MEMORY, LIVE_SHARED_MEMORY_PATH, LIVE_SHARED_MEMORY_MB, LIVE_SNAPSHOT, LIVE_SNAPSHOT_PATH
+)
+from shm_ring import ShmRingWriter
+from rollup import LiveRollups, file_source
+import archive_index
+from archive_catalog import load_catalog
 
 # Map our custom levels to Python's logging
 LOG_LEVELS = {
@@ -20,130 +32,610 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s [back.py]: %(message)s"
 )
 
-def fetch_log_array():
-    try:
-        conn = Client(SOCKET_PATH, 'AF_UNIX')
-        conn.send("get_lines")
-        resp = conn.recv()
-        conn.close()
-        lines = resp.get("lines", [])
-        fill_level = resp.get("fill_level", len(lines))
-        max_size = resp.get("max_size", 1)
-        logging.debug(f"Fetched log buffer from back.py (fill: {fill_level}/{max_size})")
-        return lines, fill_level, max_size
-    except Exception as e:
-        logging.error(f"IPC error fetching log buffer: {e}")
-        return [["Error", "", "", "", "", "", "", f"IPC error: {e}"]], 0, 1
+# The client side lives in back_client.py; kept importable from here
+from back_client import fetch_log_update, fetch_log_array
+
+# Row columns LogBuffer keeps a value -> sequence numbers index for:
+# host, facility, level, program and pid
+INDEXED_COLUMNS = (2, 3, 4, 5, 6)
+# Evicted entries at the head of an index list before it gets compacted
+INDEX_COMPACT_MIN = 1024
+# Bytes read from the log file per read
+TAIL_CHUNK_SIZE = 1024 * 1024
+# Seconds between checks for missed events, rotation and truncation
+TAIL_POLL_SECONDS = 1.0
+# Longest line held back waiting for its newline
+TAIL_MAX_LINE = 1024 * 1024
+# Lines per add_lines call when filling the buffer at startup
+WARM_START_BATCH = 10000
+SNAPSHOT_VERSION = 1
 
 class LogBuffer:
-    def __init__(self, maxlen=MAX_ARRAY_SIZE, trimlen=TRIM_SIZE):
-        self.lines = []
-        self.lock = threading.Lock()
+    """Fixed-capacity ring of parsed log lines.
+
+    Every line gets a sequence number and lives in slot seq % maxlen until
+    maxlen newer lines have overwritten it. Records are 8-tuples whose
+    repetitive fields (date, host, facility, level, program, pid) are
+    interned, so a busy buffer shares one string per distinct value.
+
+    For every INDEXED_COLUMNS value the buffer keeps the ascending sequence
+    numbers of its lines as [list, head], head counting the entries already
+    evicted, so a query on a host only visits that host's lines.
+
+    Only writers take the lock. Readers copy slots without it and then drop
+    whatever a concurrent add_lines may have overwritten meanwhile, so large
+    snapshots never hold up the tailer."""
+
+    def __init__(self, maxlen=MAX_ARRAY_SIZE, start_seq=None):
         self.maxlen = maxlen
-        self.trimlen = trimlen
+        self.slots = [None] * maxlen
+        self.lock = threading.Lock()
+        # Notified whenever lines are added, for IPC requests waiting on new lines
+        self.changed = threading.Condition(self.lock)
+        # Sequence number of the newest published line, and of the newest slot
+        # written (ahead of seq while add_lines runs). Numbering starts at the
+        # startup time in microseconds, so a since from before a restart is
+        # always older than the buffer, unless a snapshot restore continues
+        # the numbering of the previous run (start_seq).
+        if start_seq is None:
+            start_seq = time.time_ns() // 1000
+        self.seq = self.write_seq = self.start_seq = start_seq
+        self.index = {col: {} for col in INDEXED_COLUMNS}
+        # Optional ShmRingWriter mirroring every line, numbered like the buffer
+        self.shm = None
+
+    @property
+    def fill_level(self):
+        return min(self.seq - self.start_seq, self.maxlen)
 
     def parse_log_line(self, line):
         parts = line.rstrip('\n').split('|', 7)
         while len(parts) < 8:
             parts.append("")
-        return tuple(parts)
+        return (intern(parts[0]), parts[1], intern(parts[2]), intern(parts[3]), intern(parts[4]),
+                intern(parts[5]), intern(parts[6]), parts[7])
 
     def add_lines(self, new_lines):
         with self.lock:
+            slots = self.slots
+            index = self.index
             for line in new_lines:
-                self.lines.append(self.parse_log_line(line))
-            if len(self.lines) > self.maxlen:
-                self.lines = self.lines[self.trimlen:]
+                record = self.parse_log_line(line)
+                self.write_seq += 1
+                slot = self.write_seq % self.maxlen
+                evicted = slots[slot]
+                slots[slot] = record
+                if evicted is not None:
+                    self._unindex(evicted)
+                for col in INDEXED_COLUMNS:
+                    entry = index[col].get(record[col])
+                    if entry is None:
+                        index[col][record[col]] = [[self.write_seq], 0]
+                    else:
+                        entry[0].append(self.write_seq)
+            self.seq = self.write_seq
+            if self.shm is not None:
+                try:
+                    self.shm.append(new_lines)
+                except (OSError, ValueError) as e:
+                    logging.error(f"Shared-memory live buffer disabled: {e}")
+                    self.shm = None
+            self.changed.notify_all()
+
+    def _unindex(self, record):
+        """Drop an evicted record, always the oldest line of each of its values."""
+        for col in INDEXED_COLUMNS:
+            values = self.index[col]
+            entry = values[record[col]]
+            entry[1] += 1
+            if entry[1] == len(entry[0]):
+                del values[record[col]]
+            elif entry[1] >= INDEX_COMPACT_MIN and entry[1] * 2 >= len(entry[0]):
+                entry[0] = entry[0][entry[1]:]
+                entry[1] = 0
+
+    def get_lines(self, since=None):
+        """Return (lines, seq, reset): the lines newer than sequence number
+        since, or all lines with reset set when since is no longer (or not
+        yet) in the buffer, and the sequence number of the newest line."""
+        seq = self.seq
+        first = max(seq - self.maxlen, self.start_seq)
+        reset = since is not None and not first <= since <= seq
+        start = first if since is None or reset else since
+        lines = self._copy(start, seq)
+        # Slots up to write_seq - maxlen may have been overwritten while copying
+        lost = self.write_seq - self.maxlen - start
+        if lost > 0:
+            lines = lines[lost:]
+            reset = since is not None
+        return lines, seq, reset
+
+    def query(self, filters, msgonly=None, limit=None, since=None):
+        """Return (rows, seq, reset) like get_lines, keeping only the rows
+        matching filters ({column: value}) and msgonly (case-insensitive
+        substring of the message), at most the newest limit of them.
 
-    def get_lines(self):
+        Lines are visited newest first: through the index of the rarest
+        filter value when there are field filters, through the ring
+        otherwise."""
+        seq = self.seq
+        first = max(seq - self.maxlen, self.start_seq)
+        reset = since is not None and not first <= since <= seq
+        low = first if since is None or reset else since
+
+        candidates = None
+        for col, value in filters.items():
+            entry = self.index[col].get(value)
+            if entry is None:
+                return [], seq, reset
+            if candidates is None or len(entry[0]) - entry[1] < len(candidates[0]) - candidates[1]:
+                candidates = entry
+        if candidates is None:
+            seqs = range(seq, low, -1)
+        else:
+            numbers, head = candidates
+            seqs = (numbers[i] for i in range(len(numbers) - 1, head - 1, -1))
+
+        needle = msgonly.lower() if msgonly else None
+        rows = []
+        for number in seqs:
+            if number > seq:
+                continue
+            if number <= low:
+                break
+            record = self.slots[number % self.maxlen]
+            if number <= self.write_seq - self.maxlen:
+                # Overwritten since the query started, and so is everything older
+                reset = since is not None
+                break
+            if any(record[col] != value for col, value in filters.items()):
+                continue
+            if needle and needle not in record[7].lower():
+                continue
+            rows.append(record)
+            if limit and len(rows) >= limit:
+                break
+        rows.reverse()
+        return rows, seq, reset
+
+    def share(self, path, size_mb):
+        """Start mirroring the buffer into a shared-memory ring at path."""
         with self.lock:
-            return list(self.lines)
+            lines = self.get_lines()[0]
+            self.shm = ShmRingWriter(path, self.maxlen, size_mb, self.seq - len(lines))
+            self.shm.append(["|".join(record) for record in lines])
+
+    def facets(self):
+        """Return {column: {value: line count}} for the INDEXED_COLUMNS, read
+        off the index, so it costs one step per distinct value. Empty values
+        are left out."""
+        with self.lock:
+            return {col: {value: len(entry[0]) - entry[1] for value, entry in values.items() if value}
+                    for col, values in self.index.items()}
+
+    def wait_for_lines(self, since, timeout):
+        """Wait up to timeout seconds for lines newer than since."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.seq != since, timeout)
+
+    def _copy(self, since, seq):
+        """Records of the lines numbered since + 1 to seq, oldest first."""
+        if seq <= since:
+            return []
+        start = (since + 1) % self.maxlen
+        end = seq % self.maxlen + 1
+        if start < end:
+            return self.slots[start:end]
+        lines = self.slots[start:]
+        lines += self.slots[:end]
+        return lines
 
 class InotifyTailer:
-    def __init__(self, logfile, buffer: LogBuffer):
+    """Follow the log file into the buffer.
+
+    The file stays open and is read in binary chunks up to its end whenever
+    inotify reports activity on it, so a burst of events costs a single
+    drain. An incomplete last line is held back until its newline arrives.
+    The directory is watched rather than the file, so rotation does not lose
+    the watch: once a new inode appears at the path, the old file is read to
+    its end and the new one is followed from its start. A file that shrank
+    (truncation) is read again from the start. A poll every TAIL_POLL_SECONDS
+    covers missed events.
+
+    With rollups, every line read is also counted into a Rollup of the file
+    it came from (see rollup.py)."""
+
+    def __init__(self, logfile, buffer: LogBuffer, rollups: LiveRollups = None):
         self.logfile = logfile
         self.buffer = buffer
+        self.rollups = rollups
+        self.rollup = None
         self._stop_event = threading.Event()
-        self._restart_event = threading.Event()
+        self._wake = threading.Event()
         self._thread = threading.Thread(target=self._run, daemon=True)
+        self.fd = None
+        self.inode = None
+        self.offset = 0
+        self.pending = b""
+        self.skip_partial = False
+        # Whether everything read so far ended with a newline
+        self.at_newline = True
 
     def start(self):
         self._thread.start()
 
     def stop(self):
         self._stop_event.set()
-        self._restart_event.set()
-        self._thread.join()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
 
     def refresh(self, signum=None, frame=None):
-        logging.info("Received signal to refresh inotify tailer.")
-        self._restart_event.set()
+        logging.info("Received signal to refresh the log tailer.")
+        self._wake.set()
 
     def _run(self):
-        while not self._stop_event.is_set():
-            self._restart_event.clear()
-            self._tail_logfile()
-            # If restart requested, loop and restart tailing
-            if self._restart_event.is_set():
-                logging.info("Restarting inotify watcher/tailer due to signal.")
-                continue
-            break
-
-    def _tail_logfile(self):
         wm = pyinotify.WatchManager()
-        mask = pyinotify.IN_MODIFY | pyinotify.IN_MOVE_SELF | pyinotify.IN_DELETE_SELF | pyinotify.IN_CREATE
+        mask = (pyinotify.IN_MODIFY | pyinotify.IN_CREATE | pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO
+                | pyinotify.IN_DELETE)
 
         class EventHandler(pyinotify.ProcessEvent):
             def __init__(self, tailer):
                 super().__init__()
                 self.tailer = tailer
-                self.logfile = tailer.logfile
-                self.buffer = tailer.buffer
-                self.last_size = os.path.getsize(self.logfile) if os.path.exists(self.logfile) else 0
+                self.name = os.path.basename(tailer.logfile)
 
             def process_default(self, event):
-                pass
+                # Ignore the other files of the directory (archives being written)
+                if not event.name or event.name == self.name:
+                    self.tailer._wake.set()
 
-            def process_IN_MODIFY(self, event):
-                try:
-                    with open(self.logfile) as f:
-                        f.seek(self.last_size)
-                        new_data = f.read()
-                        self.last_size = f.tell()
-                        new_lines = new_data.splitlines()
-                        if new_lines:
-                            logging.debug(f"Added {len(new_lines)} new log lines from {self.logfile}.")
-                            self.buffer.add_lines(new_lines)
-                except Exception as e:
-                    logging.error(f"Error on inotify event: {e}")
-
-            def process_IN_MOVE_SELF(self, event):
-                # Log was rotated
-                logging.info(f"File moved (rotated): {self.logfile}")
-                self.last_size = 0
-                self.tailer._restart_event.set()
-
-            def process_IN_DELETE_SELF(self, event):
-                # Log was deleted (rotated)
-                logging.info(f"File deleted (rotated): {self.logfile}")
-                self.last_size = 0
-                self.tailer._restart_event.set()
-
-        handler = EventHandler(self)
-        notifier = pyinotify.ThreadedNotifier(wm, handler)
+        notifier = pyinotify.ThreadedNotifier(wm, EventHandler(self))
         notifier.start()
-        wdd = wm.add_watch(self.logfile, mask)
+        wm.add_watch(os.path.dirname(os.path.abspath(self.logfile)), mask)
+        if self.fd is None:
+            self._open(at_end=True)
         logging.info(f"Started log tailing on {self.logfile}.")
-
         try:
-            while not self._stop_event.is_set() and not self._restart_event.is_set():
-                time.sleep(1)
+            while not self._stop_event.is_set():
+                try:
+                    self._check_file()
+                    self._drain()
+                except OSError as e:
+                    logging.error(f"Error tailing {self.logfile}: {e}")
+                self._wake.wait(TAIL_POLL_SECONDS)
+                # Events arriving while draining wake the next round
+                self._wake.clear()
         finally:
             notifier.stop()
-            wm.rm_watch(list(wdd.values()))
-            logging.info("Stopped inotify watcher.")
+            self._close()
+            logging.info("Stopped log tailer.")
+
+    def _open(self, at_end=False, offset=0):
+        """Open the log file at offset, or at the start of its last
+        incomplete line with at_end; False if it does not exist."""
+        try:
+            fd = os.open(self.logfile, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        self._close()
+        self.fd = fd
+        st = os.fstat(fd)
+        self.inode = st.st_ino
+        if self.rollups is not None:
+            self.rollup = self.rollups.start_file(file_source(fd))
+        self.offset = st.st_size if at_end else offset
+        self.pending = b""
+        self.skip_partial = False
+        if self.offset > 0 and os.pread(fd, 1, self.offset - 1) != b"\n":
+            # Back up to the start of the line being written, or drop it
+            # when it is too long to look for
+            size = min(self.offset, TAIL_MAX_LINE)
+            newline = os.pread(fd, size, self.offset - size).rfind(b"\n")
+            if newline >= 0 or size == self.offset:
+                self.offset -= size - newline - 1
+            else:
+                self.skip_partial = True
+        self.at_newline = not self.skip_partial
+        return True
 
-def ipc_server(buffer: LogBuffer, socket_path=SOCKET_PATH):
+    def _close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _drain(self):
+        """Read everything appended since the last call."""
+        while self.fd is not None and not self._stop_event.is_set():
+            data = os.pread(self.fd, TAIL_CHUNK_SIZE, self.offset)
+            if not data:
+                return
+            self.offset += len(data)
+            self._feed(data)
+            if len(data) < TAIL_CHUNK_SIZE:
+                return
+
+    def _feed(self, data):
+        """Add the complete lines of pending + data to the buffer."""
+        if self.pending:
+            data = self.pending + data
+            self.pending = b""
+        if self.skip_partial:
+            newline = data.find(b"\n")
+            if newline < 0:
+                self.at_newline = False
+                return
+            data = data[newline + 1:]
+            self.skip_partial = False
+        end = data.rfind(b"\n") + 1
+        if len(data) - end > TAIL_MAX_LINE:
+            # No newline in sight: pass the runaway line on in pieces
+            end = len(data)
+        self.pending = data[end:]
+        self.at_newline = data.endswith(b"\n")
+        if end:
+            lines = data[:end].decode("utf-8", "replace").split("\n")
+            if lines[-1] == "":
+                lines.pop()
+            self.buffer.add_lines(lines)
+            if self.rollup is not None:
+                if self.rollup.source is None:
+                    self.rollup.source = file_source(self.fd)
+                self.rollups.add_lines(self.rollup, lines)
+
+    def _check_file(self):
+        """Follow rotation and truncation of the log file."""
+        try:
+            st = os.stat(self.logfile)
+        except FileNotFoundError:
+            # Rotated away and not recreated yet: keep the old file
+            return
+        if self.fd is None:
+            if self._open():
+                logging.info(f"Log file {self.logfile} appeared.")
+        elif st.st_ino != self.inode:
+            logging.info(f"Log file {self.logfile} was rotated, following the new file.")
+            self._drain()
+            if self.pending:
+                self._feed(b"\n")
+            self._open()
+        elif st.st_size < self.offset or (self.at_newline and self.offset
+                                          and os.pread(self.fd, 1, self.offset - 1) != b"\n"):
+            # Shorter than what was read, or rewritten past it since
+            logging.warning(f"Log file {self.logfile} was truncated, reading it from the start.")
+            self.offset = 0
+            self.pending = b""
+            self.skip_partial = False
+            self.at_newline = True
+            if self.rollups is not None:
+                self.rollup = self.rollups.start_file(file_source(self.fd), replace=True)
+
+def count_log_head(rollups: LiveRollups, rollup, logfile, inode, end):
+    """Count the lines of logfile before offset end into rollup, for a
+    tailer that started following the file at end. Runs in its own thread
+    at startup."""
+    t0 = time.perf_counter()
+    try:
+        fd = os.open(logfile, os.O_RDONLY)
+    except OSError as e:
+        logging.error(f"Cannot count the lines of {logfile}: {e}")
+        return
+    try:
+        if os.fstat(fd).st_ino != inode:
+            return
+        pos = 0
+        pending = b""
+        while pos < end:
+            data = os.pread(fd, min(TAIL_CHUNK_SIZE, end - pos), pos)
+            if not data:
+                break
+            pos += len(data)
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            rollups.add_lines(rollup, [line.decode("utf-8", "replace") for line in lines])
+    finally:
+        os.close(fd)
+    logging.info(f"Counted {rollup.lines} lines of {logfile} for the rollups in "
+                 f"{1000 * (time.perf_counter() - t0):.0f} ms")
+
+def read_last_lines(fd, end, count):
+    """The last count lines before offset end of an open file, oldest first,
+    read backwards in TAIL_CHUNK_SIZE blocks."""
+    blocks = []
+    newlines = 0
+    pos = end
+    while pos > 0 and newlines <= count:
+        size = min(TAIL_CHUNK_SIZE, pos)
+        pos -= size
+        block = os.pread(fd, size, pos)
+        blocks.append(block)
+        newlines += block.count(b"\n")
+    lines = b"".join(reversed(blocks)).decode("utf-8", "replace").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    if pos > 0:
+        # Stopped inside a line
+        lines = lines[1:]
+    return lines[-count:] if count else []
+
+def archived_lines(count, pattern=ROTATED_LOG_PATTERN):
+    """The newest count lines of the rotated archives, oldest first. Indexed
+    archives are inflated newest segment first, only as far as needed."""
+    lines = []
+    for path in [entry["path"] for entry in reversed(load_catalog(pattern))]:
+        if len(lines) >= count:
+            break
+        try:
+            newest = list(itertools.islice(archive_index.iter_lines(path, reverse=True), count - len(lines)))
+        except (OSError, EOFError, ValueError) as e:
+            logging.error(f"Cannot read {path} to fill the live buffer: {e}")
+            continue
+        newest.reverse()
+        lines = newest + lines
+    return lines
+
+def save_snapshot(buffer: LogBuffer, tailer: InotifyTailer, path=LIVE_SNAPSHOT_PATH):
+    """Stop the tailer and write the buffer to path, with the log file
+    position it was read up to, for load_snapshot on the next start.
+
+    The first line is a JSON header, the rest the buffered lines as they
+    appeared in the log."""
+    tailer.stop()
+    lines, seq, _ = buffer.get_lines()
+    header = {"version": SNAPSHOT_VERSION, "log_file": tailer.logfile, "inode": tailer.inode,
+              "offset": tailer.offset - len(tailer.pending), "seq": seq}
+    tmp_path = f"{path}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.writelines("|".join(record) + "\n" for record in lines)
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {len(lines)} buffered lines to {path}")
+    except OSError as e:
+        logging.error(f"Cannot save live buffer snapshot to {path}: {e}")
+
+def load_snapshot(logfile, path=LIVE_SNAPSHOT_PATH):
+    """Return (header, lines) of the snapshot at path if it was taken from
+    logfile as it still is (same inode, not truncated), else None. The
+    snapshot is removed either way, so it is never restored twice."""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            header = json.loads(f.readline())
+            lines = f.read().split("\n")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.error(f"Ignoring unreadable live buffer snapshot {path}: {e}")
+        return None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if lines[-1] == "":
+        lines.pop()
+    try:
+        st = os.stat(logfile)
+    except FileNotFoundError:
+        return None
+    if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION \
+            or header.get("log_file") != logfile or header.get("inode") != st.st_ino \
+            or not 0 <= header.get("offset", -1) <= st.st_size:
+        logging.info(f"Live buffer snapshot {path} does not match {logfile} any more, not restoring it")
+        return None
+    return header, lines
+
+def warm_start(logfile=LOG_FILE, maxlen=MAX_ARRAY_SIZE, snapshot_path=None, pattern=ROTATED_LOG_PATTERN,
+               rollups: LiveRollups = None):
+    """Return (buffer, tailer) with the buffer already holding the newest
+    lines, so the live view is not blank after a restart. With rollups, the
+    part of logfile before where the tailer starts is counted in the
+    background.
+
+    From the snapshot at snapshot_path when it still matches logfile: its
+    sequence numbers carry on, and the tailer resumes where the previous run
+    stopped, catching up on what was written meanwhile. Otherwise logfile is
+    read backwards from its end, and into the newest archives when it holds
+    fewer than maxlen lines."""
+    t0 = time.perf_counter()
+    restored = load_snapshot(logfile, snapshot_path) if snapshot_path else None
+    if restored:
+        header, lines = restored
+        lines = lines[-maxlen:]
+        buffer = LogBuffer(maxlen, start_seq=header["seq"] - len(lines))
+        tailer = InotifyTailer(logfile, buffer, rollups)
+        tailer._open(offset=header["offset"])
+        source = "snapshot"
+    else:
+        buffer = LogBuffer(maxlen)
+        tailer = InotifyTailer(logfile, buffer, rollups)
+        lines = []
+        if tailer._open(at_end=True):
+            lines = read_last_lines(tailer.fd, tailer.offset, maxlen)
+        if len(lines) < maxlen:
+            lines = archived_lines(maxlen - len(lines), pattern) + lines
+        source = "log file and archives"
+    for i in range(0, len(lines), WARM_START_BATCH):
+        buffer.add_lines(lines[i:i + WARM_START_BATCH])
+    if tailer.rollup is not None and tailer.offset:
+        threading.Thread(target=count_log_head, args=(rollups, tailer.rollup, logfile, tailer.inode, tailer.offset),
+                         daemon=True).start()
+    logging.info(f"Live buffer warm start: {buffer.fill_level}/{maxlen} lines from {source} "
+                 f"in {1000 * (time.perf_counter() - t0):.0f} ms")
+    return buffer, tailer
+
+def handle_request(buffer: LogBuffer, msg, rollups: LiveRollups = None):
+    """Answer one IPC request. get_lines with "wait" set blocks up to that
+    many seconds until lines newer than "since" arrive. Requests with
+    "filters", "msgonly" or "limit" get only the matching rows (see
+    LogBuffer.query), requests with "facets" also the dropdown values and
+    their line counts (see LogBuffer.facets). rollup requests get the
+    counts of the live rollups (see LiveRollups.aggregate)."""
+    if msg == "get_lines":
+        msg = {"cmd": "get_lines"}
+    if isinstance(msg, dict) and msg.get("cmd") == "rollup":
+        if rollups is None:
+            return {"groups": {}}
+        return {"groups": rollups.aggregate(msg["start"], msg["end"], msg.get("filters") or {}, msg.get("group_by"),
+                                            msg.get("bucket") or 1, set(msg.get("exclude") or ()))}
+    if not isinstance(msg, dict) or msg.get("cmd") != "get_lines":
+        return {"lines": [], "fill_level": 0, "max_size": buffer.maxlen}
+    if msg.get("wait"):
+        buffer.wait_for_lines(msg.get("since"), msg["wait"])
+    if msg.get("filters") or msg.get("msgonly") or msg.get("limit"):
+        lines, seq, reset = buffer.query(msg.get("filters") or {}, msg.get("msgonly"), msg.get("limit"),
+                                         msg.get("since"))
+    else:
+        lines, seq, reset = buffer.get_lines(msg.get("since"))
+    resp = {
+        "lines": lines,
+        "fill_level": buffer.fill_level,
+        "max_size": buffer.maxlen,
+        "seq": seq,
+        "reset": reset
+    }
+    if msg.get("facets"):
+        resp["facets"] = buffer.facets()
+    return resp
+
+def serve_connection(conn, buffer: LogBuffer, rollups: LiveRollups = None):
+    """Serve requests on one client connection until it closes.
+
+    Every connection has its own thread, so a slow request only holds up its
+    own client. Responses echo the request's "id"; long polls are answered
+    from a thread of their own, so a client may pipeline other requests
+    behind one and match the responses by id."""
+    send_lock = threading.Lock()
+
+    def reply(msg):
+        try:
+            resp = handle_request(buffer, msg, rollups)
+        except Exception as e:
+            logging.error(f"IPC error: {e}")
+            resp = {"lines": [], "fill_level": 0, "max_size": buffer.maxlen, "error": str(e)}
+        if isinstance(msg, dict) and "id" in msg:
+            resp["id"] = msg["id"]
+        try:
+            with send_lock:
+                conn.send(resp)
+        except OSError as e:
+            logging.debug(f"IPC client went away: {e}")
+
+    try:
+        while True:
+            msg = conn.recv()
+            logging.debug(f"IPC request received: {msg}")
+            if isinstance(msg, dict) and msg.get("wait"):
+                threading.Thread(target=reply, args=(msg,), daemon=True).start()
+            else:
+                reply(msg)
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+def ipc_server(buffer: LogBuffer, socket_path=SOCKET_PATH, rollups: LiveRollups = None):
     if os.path.exists(socket_path):
         os.remove(socket_path)
     listener = Listener(socket_path, 'AF_UNIX')
@@ -151,35 +643,29 @@ def ipc_server(buffer: LogBuffer, socket_path=SOCKET_PATH):
     while True:
         try:
             conn = listener.accept()
-            msg = conn.recv()
-            if msg == "get_lines":
-                logging.debug(f"IPC request received: {msg}")
-                lines = buffer.get_lines()
-                fill_level = len(lines)
-                conn.send({
-                    "lines": lines,
-                    "fill_level": fill_level,
-                    "max_size": buffer.maxlen
-                })
-            else:
-                logging.debug(f"IPC request received: {msg}")
-                conn.send({
-                    "lines": [],
-                    "fill_level": 0,
-                    "max_size": buffer.maxlen
-                })
-            conn.close()
+            threading.Thread(target=serve_connection, args=(conn, buffer, rollups), daemon=True).start()
         except Exception as e:
             logging.error(f"IPC error: {e}")
 
 if __name__ == "__main__":
     logging.info("Starting back.py log buffer and IPC server.")
-    buffer = LogBuffer()
-    tailer = InotifyTailer(LOG_FILE, buffer)
+    rollups = LiveRollups()
+    buffer, tailer = warm_start(snapshot_path=LIVE_SNAPSHOT_PATH if LIVE_SNAPSHOT else None, rollups=rollups)
+    if LIVE_SHARED_MEMORY:
+        try:
+            buffer.share(LIVE_SHARED_MEMORY_PATH, LIVE_SHARED_MEMORY_MB)
+            atexit.register(buffer.shm.close)
+        except OSError as e:
+            logging.error(f"Cannot create shared-memory live buffer at {LIVE_SHARED_MEMORY_PATH}: {e}")
+    if LIVE_SNAPSHOT:
+        atexit.register(save_snapshot, buffer, tailer, LIVE_SNAPSHOT_PATH)
+    # Exit through atexit on SIGTERM, so the shared-memory file is removed
+    # and the snapshot written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     # Write our PID to a file for rotate.py to signal
     with open("/tmp/back.pid", "w") as f:
         f.write(str(os.getpid()))
     # Register SIGHUP to refresh inotify
     signal.signal(signal.SIGHUP, tailer.refresh)
     tailer.start()
-    ipc_server(buffer)
+    ipc_server(buffer, rollups=rollups)
@@ -1,18 +1,148 @@
+import os
 import logging
+import itertools
+import threading
 from multiprocessing.connection import Client
-from settings import SOCKET_PATH
+from settings import SOCKET_PATH, LIVE_SHARED_MEMORY, LIVE_SHARED_MEMORY_PATH
+from shm_ring import ShmRingReader
 
-def fetch_log_array():
+# Idle connections to back.py kept open per front process
+POOL_SIZE = 16
+
+class BackClient:
+    """Pool of persistent connections to back.py.
+
+    A request checks out an idle connection (opening one when there is
+    none), so concurrent requests never queue behind each other on the
+    client side and pay the connect/auth handshake only once per
+    connection. Connections that fail are dropped."""
+
+    def __init__(self, socket_path=SOCKET_PATH, size=POOL_SIZE):
+        self.socket_path = socket_path
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+
+    def request(self, msg):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = Client(self.socket_path, 'AF_UNIX')
+        request_id = next(self.ids)
+        try:
+            conn.send(dict(msg, id=request_id))
+            resp = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+        if resp.get("id") != request_id:
+            conn.close()
+            raise ConnectionError(f"unexpected IPC response id {resp.get('id')} (expected {request_id})")
+        del resp["id"]
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        return resp
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """The BackClient of this process; forked workers get their own."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = BackClient()
+            _client_pid = os.getpid()
+        return _client
+
+_ring = None
+_ring_pid = None
+
+def get_ring():
+    """The ShmRingReader of this process."""
+    global _ring, _ring_pid
+    with _client_lock:
+        if _ring is None or _ring_pid != os.getpid():
+            _ring = ShmRingReader(LIVE_SHARED_MEMORY_PATH)
+            _ring_pid = os.getpid()
+        return _ring
+
+def read_shared_lines(since, limit):
+    """Answer an unfiltered request from the shared-memory ring, or return
+    None when it is not available."""
     try:
-        conn = Client(SOCKET_PATH, 'AF_UNIX')
-        conn.send("get_lines")
-        resp = conn.recv()
-        conn.close()
-        lines = resp.get("lines", [])
-        fill_level = resp.get("fill_level", len(lines))
-        max_size = resp.get("max_size", 1)
-        logging.debug(f"Fetched log buffer from back.py (fill: {fill_level}/{max_size})")
-        return lines, fill_level, max_size
+        lines, seq, reset, fill_level, max_size = get_ring().get_lines(since, limit)
+    except (OSError, ValueError) as e:
+        logging.debug(f"Shared-memory live buffer unavailable, using IPC: {e}")
+        return None
+    return {"lines": lines, "fill_level": fill_level, "max_size": max_size, "seq": seq, "reset": reset,
+            "facets": {}}
+
+def fetch_log_update(since=None, wait=None, filters=None, msgonly=None, limit=None, facets=False):
+    """Fetch the buffered lines newer than sequence number since (all of them
+    when since is None). Returns the IPC response: lines, fill_level,
+    max_size, seq (sequence number of the newest buffered line) and reset,
+    which is set when since could not be honoured (lines already evicted, or
+    back.py restarted) and lines holds the whole buffer instead.
+
+    With wait, back.py holds the request up to wait seconds until there are
+    lines newer than since. filters ({column: value}), msgonly and limit are
+    evaluated by back.py, so only the matching rows are sent over. With
+    facets, the response also holds {column: {value: line count}} of the
+    whole buffer for the filter dropdowns.
+
+    Unfiltered requests that do not wait are read from the shared-memory
+    ring when back.py publishes one (LIVE_SHARED_MEMORY), over IPC otherwise."""
+    if LIVE_SHARED_MEMORY and not (wait or filters or msgonly or facets):
+        resp = read_shared_lines(since, limit)
+        if resp is not None:
+            return resp
+    try:
+        resp = get_client().request({"cmd": "get_lines", "since": since, "wait": wait, "filters": filters,
+                                     "msgonly": msgonly, "limit": limit, "facets": facets})
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        resp.setdefault("lines", [])
+        resp.setdefault("fill_level", len(resp["lines"]))
+        resp.setdefault("max_size", 1)
+        resp.setdefault("seq", None)
+        resp.setdefault("reset", False)
+        resp.setdefault("facets", {})
+        logging.debug(f"Fetched log buffer from back.py (fill: {resp['fill_level']}/{resp['max_size']}, "
+                      f"since: {since}, new: {len(resp['lines'])})")
+        return resp
     except Exception as e:
         logging.error(f"IPC error fetching log buffer: {e}")
-        return [["Error", "", "", "", "", "", "", f"IPC error: {e}"]], 0, 1
+        return {
+            "lines": [["Error", "", "", "", "", "", "", f"IPC error: {e}"]],
+            "fill_level": 0,
+            "max_size": 1,
+            "seq": None,
+            "reset": since is not None,
+            "facets": {},
+        }
+
+def fetch_log_array():
+    resp = fetch_log_update()
+    return resp["lines"], resp["fill_level"], resp["max_size"]
+
+def fetch_rollup(start_minute, end_minute, filters=None, group_by=None, bucket=1, exclude=()):
+    """Per-bucket line counts of the files back.py is counting (see
+    rollup.LiveRollups.aggregate), leaving out the sources in exclude.
+    Returns {group value: {bucket number: count}}, or None when back.py
+    cannot be reached."""
+    try:
+        resp = get_client().request({"cmd": "rollup", "start": start_minute, "end": end_minute, "filters": filters,
+                                     "group_by": group_by, "bucket": bucket, "exclude": list(exclude)})
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        return resp["groups"]
+    except Exception as e:
+        logging.error(f"IPC error fetching live rollups: {e}")
+        return None
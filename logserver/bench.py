@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""Benchmarks for the live buffer, its IPC path and archive compression.
+
+    python3 bench.py buffer --capacity 100000 1000000
+    python3 bench.py query --limit 30
+    python3 bench.py ipc --clients 1 10 100 [--snapshots]
+    python3 bench.py shm --capacity 100000
+    python3 bench.py tail --lines 500000
+    python3 bench.py warm --capacity 100000 1000000
+    python3 bench.py compress --lines 1000000 --codec gzip bz2 --workers 1 4
+    python3 bench.py serve --workers 4 --pollers 20 --scanners 2
+    python3 bench.py scan --days 7 --workers 1 2 4
+"""
+import gc
+import os
+import time
+import random
+import logging
+import argparse
+import threading
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+def synthetic_lines(count, start=None):
+    """Syslog-ng formatted lines: 20 hosts, 5 programs, a few lines per second."""
+    start = start or datetime(2025, 6, 1, tzinfo=timezone(timedelta(hours=2)))
+    hosts = [f"host{i}.example.net" for i in range(20)]
+    programs = ["sshd", "cron", "kernel", "nginx", "postfix"]
+    levels = ["info", "notice", "warning", "err"]
+    rnd = random.Random(1)
+    return [
+        f"{(start + timedelta(seconds=i // 5)).isoformat()}|{i}|{rnd.choice(hosts)}|daemon|{rnd.choice(levels)}|"
+        f"{rnd.choice(programs)}|{rnd.randint(1, 3000)}|session {i} opened for user{rnd.randint(1, 500)} "
+        f"from 10.0.{rnd.randint(0, 255)}.{rnd.randint(0, 255)} port {rnd.randint(1024, 65535)}\n"
+        for i in range(count)
+    ]
+
+class ListLogBuffer:
+    """The previous list-based LogBuffer, for comparison."""
+
+    def __init__(self, maxlen, trimlen=200):
+        self.lines = []
+        self.lock = threading.Lock()
+        self.maxlen = maxlen
+        self.trimlen = trimlen
+
+    def add_lines(self, new_lines):
+        with self.lock:
+            for line in new_lines:
+                parts = line.rstrip('\n').split('|', 7)
+                while len(parts) < 8:
+                    parts.append("")
+                self.lines.append(tuple(parts))
+            if len(self.lines) > self.maxlen:
+                self.lines = self.lines[self.trimlen:]
+
+    def get_lines(self, since=None):
+        with self.lock:
+            return list(self.lines), None, False
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+def bench_buffer(args):
+    from back import LogBuffer
+
+    for capacity in args.capacity:
+        lines = synthetic_lines(capacity + args.batch * args.repeat)
+        fill, extra = lines[:capacity], lines[capacity:]
+        for name, factory in (("ring", lambda: LogBuffer(capacity)), ("list", lambda: ListLogBuffer(capacity))):
+            gc.collect()
+            tracemalloc.start()
+            buffer = factory()
+            for i in range(0, capacity, 10000):
+                buffer.add_lines(fill[i:i + 10000])
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            batches = iter(range(0, len(extra), args.batch))
+            add = timed(lambda: buffer.add_lines(extra[next(batches):][:args.batch]), args.repeat)
+            full = timed(buffer.get_lines, min(args.repeat, 20))
+            if name == "ring":
+                delta = timed(lambda: buffer.get_lines(buffer.seq - args.batch), args.repeat)
+                delta_ms = f"{1000 * percentile(delta, 50):.3f}"
+            else:
+                delta_ms = "-"
+            print(f"{name:>5} {capacity:>9,} lines: {memory / capacity:6.0f} B/line | "
+                  f"add {args.batch} lines p50 {1000 * percentile(add, 50):.3f} ms p99 {1000 * percentile(add, 99):.3f} ms | "
+                  f"full snapshot p50 {1000 * percentile(full, 50):.2f} ms | delta snapshot p50 {delta_ms} ms")
+            del buffer
+            gc.collect()
+
+def bench_query(args):
+    import pickle
+    from back import LogBuffer
+
+    for capacity in args.capacity:
+        buffer = LogBuffer(capacity)
+        lines = synthetic_lines(capacity)
+        for i in range(0, capacity, 10000):
+            buffer.add_lines(lines[i:i + 10000])
+        host = buffer.slots[buffer.seq % capacity][2]
+        program = buffer.slots[buffer.seq % capacity][5]
+        cases = (
+            ("host", {2: host}, None),
+            ("host+level=err", {2: host, 4: "err"}, None),
+            ("program+message", {5: program}, "user42 "),
+            ("message only", {}, "user42 "),
+        )
+        for name, filters, msgonly in cases:
+            def pulled():
+                # What back.py shipped and front.py filtered per poll before
+                rows = pickle.loads(pickle.dumps(buffer.get_lines()[0], pickle.HIGHEST_PROTOCOL))
+                for col, value in filters.items():
+                    rows = [r for r in rows if r[col] == value]
+                if msgonly:
+                    rows = [r for r in rows if msgonly.lower() in r[7].lower()]
+                return rows[-args.limit:]
+
+            def pushed():
+                rows = buffer.query(filters, msgonly, args.limit)[0]
+                return pickle.loads(pickle.dumps(rows, pickle.HIGHEST_PROTOCOL))
+
+            assert pulled() == pushed()
+            before = timed(pulled, args.repeat)
+            after = timed(pushed, args.repeat)
+            print(f"{capacity:>9,} lines, {name:>16}, last {args.limit}: "
+                  f"pull whole buffer + filter p50 {1000 * percentile(before, 50):8.2f} ms | "
+                  f"query in buffer p50 {1000 * percentile(after, 50):6.3f} ms")
+        del buffer
+        gc.collect()
+
+def run_ipc_server(socket_path, capacity, serial, ready, shm_path=None):
+    import back
+    buffer = back.LogBuffer(capacity)
+    if shm_path:
+        buffer.share(shm_path, capacity // 2500 + 16)
+    lines = synthetic_lines(capacity)
+    for i in range(0, capacity, 10000):
+        buffer.add_lines(lines[i:i + 10000])
+    if not serial:
+        ready.set()
+        back.ipc_server(buffer, socket_path)
+        return
+    # The previous server: one request per connection, one connection at a time
+    from multiprocessing.connection import Listener
+    listener = Listener(socket_path, 'AF_UNIX')
+    ready.set()
+    while True:
+        conn = listener.accept()
+        conn.send(back.handle_request(buffer, conn.recv()))
+        conn.close()
+
+def bench_ipc(args):
+    import multiprocessing
+    from multiprocessing.connection import Client
+    from concurrent.futures import ThreadPoolExecutor
+    import back_client
+
+    socket_path = f"/tmp/logbuffer-bench-{os.getpid()}.sock"
+    request = {"cmd": "get_lines", "filters": {2: "host3.example.net"}, "limit": 30}
+    ctx = multiprocessing.get_context("fork")
+    for server, client in (("serial", "connect per request"), ("concurrent", "connect per request"),
+                           ("concurrent", "pooled")):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        ready = ctx.Event()
+        proc = ctx.Process(target=run_ipc_server, args=(socket_path, args.capacity, server == "serial", ready),
+                           daemon=True)
+        proc.start()
+        ready.wait()
+        time.sleep(0.2)
+        pool = back_client.BackClient(socket_path)
+
+        def one_request():
+            t0 = time.perf_counter()
+            if client == "pooled":
+                pool.request(request)
+            else:
+                conn = Client(socket_path, 'AF_UNIX')
+                conn.send(request)
+                conn.recv()
+                conn.close()
+            return time.perf_counter() - t0
+
+        def full_snapshots(stop):
+            # A page load pulling the whole buffer, next to the small polls
+            while not stop.is_set():
+                conn = Client(socket_path, 'AF_UNIX')
+                conn.send({"cmd": "get_lines"})
+                conn.recv()
+                conn.close()
+
+        for clients in args.clients:
+            total = clients * args.requests
+            stop = threading.Event()
+            snapshots = threading.Thread(target=full_snapshots, args=(stop,), daemon=True)
+            if args.snapshots:
+                snapshots.start()
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                t0 = time.perf_counter()
+                samples = list(executor.map(lambda _: one_request(), range(total)))
+                elapsed = time.perf_counter() - t0
+            stop.set()
+            if args.snapshots:
+                snapshots.join()
+            print(f"{server:>10} server, {client:>19}, {clients:>3} clients: "
+                  f"p50 {1000 * percentile(samples, 50):7.2f} ms  p99 {1000 * percentile(samples, 99):7.2f} ms  "
+                  f"{total / elapsed:7.0f} req/s")
+        proc.terminate()
+        proc.join()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+def bench_shm(args):
+    import multiprocessing
+    import back_client
+    from shm_ring import ShmRingReader
+
+    socket_path = f"/tmp/logbuffer-bench-{os.getpid()}.sock"
+    shm_path = f"/dev/shm/logbuffer-bench-{os.getpid()}"
+    ctx = multiprocessing.get_context("fork")
+    ready = ctx.Event()
+    proc = ctx.Process(target=run_ipc_server, args=(socket_path, args.capacity, False, ready, shm_path), daemon=True)
+    proc.start()
+    ready.wait()
+    time.sleep(0.2)
+    client = back_client.BackClient(socket_path)
+    ring = ShmRingReader(shm_path)
+    seq = ring.get_lines(None, 1)[1]
+    for name, since, limit in (("full buffer", None, None), ("last 30", None, 30), ("100 new lines", seq - 100, None)):
+        ipc = client.request({"cmd": "get_lines", "since": since, "limit": limit})
+        shm = ring.get_lines(since, limit)
+        assert [list(r) for r in ipc["lines"]] == [list(r) for r in shm[0]]
+        repeat = 10 if since is None and limit is None else args.repeat
+        before = timed(lambda: client.request({"cmd": "get_lines", "since": since, "limit": limit}), repeat)
+        after = timed(lambda: ring.get_lines(since, limit), repeat)
+        print(f"{args.capacity:>9,} lines, {name:>13}: IPC socket p50 {1000 * percentile(before, 50):8.3f} ms | "
+              f"shared memory p50 {1000 * percentile(after, 50):8.3f} ms")
+    proc.terminate()
+    proc.join()
+    for path in (socket_path, shm_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+class LegacyTailer:
+    """The previous tailer: reopen, read and splitlines on every IN_MODIFY."""
+
+    def __init__(self, logfile, buffer):
+        import pyinotify
+
+        class EventHandler(pyinotify.ProcessEvent):
+            def __init__(self):
+                super().__init__()
+                self.last_size = os.path.getsize(logfile)
+
+            def process_IN_MODIFY(self, event):
+                with open(logfile) as f:
+                    f.seek(self.last_size)
+                    new_data = f.read()
+                    self.last_size = f.tell()
+                    new_lines = new_data.splitlines()
+                    if new_lines:
+                        buffer.add_lines(new_lines)
+
+        self.wm = pyinotify.WatchManager()
+        self.notifier = pyinotify.ThreadedNotifier(self.wm, EventHandler())
+        self.wm.add_watch(logfile, pyinotify.IN_MODIFY)
+
+    def start(self):
+        self.notifier.start()
+
+    def stop(self):
+        self.notifier.stop()
+
+def bench_tail(args):
+    import tempfile
+    import back
+
+    lines = synthetic_lines(args.lines)
+    data = "".join(lines).encode()
+    expected = [back.LogBuffer.parse_log_line(None, line) for line in lines]
+    rnd = random.Random(2)
+    # Writes cut lines at random points, like a busy syslog-ng flushing its buffer
+    writes = []
+    pos = 0
+    while pos < len(data):
+        size = rnd.randint(args.write_size // 2, args.write_size * 3 // 2)
+        writes.append(data[pos:pos + size])
+        pos += size
+
+    for name, factory in (("legacy", LegacyTailer), ("InotifyTailer", back.InotifyTailer)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "messages")
+            open(path, "wb").close()
+            buffer = back.LogBuffer(args.lines)
+            tailer = factory(path, buffer)
+            tailer.start()
+            time.sleep(0.2)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+            t0 = time.perf_counter()
+            for chunk in writes:
+                os.write(fd, chunk)
+            written = time.perf_counter() - t0
+            # Until every line is in, or the buffer stopped growing for 5 s
+            last_seq, last_change = buffer.seq, time.perf_counter()
+            while buffer.seq - buffer.start_seq < args.lines and time.perf_counter() - last_change < 5:
+                time.sleep(0.001)
+                if buffer.seq != last_seq:
+                    last_seq, last_change = buffer.seq, time.perf_counter()
+            elapsed = last_change - t0
+            os.close(fd)
+            tailer.stop()
+            got = buffer.get_lines()[0]
+            intact = len(set(got) & set(expected))
+            print(f"{name:>13}: {args.lines:,} lines in {len(writes):,} writes ({written:.2f} s to write), "
+                  f"{len(got):,} records buffered, {intact:,} intact, {len(got) / elapsed:,.0f} records/s")
+    # Throughput of the drain alone, on a file written beforehand
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "messages")
+        open(path, "wb").close()
+        buffer = back.LogBuffer(args.lines)
+        tailer = back.InotifyTailer(path, buffer)
+        tailer._open()
+        with open(path, "wb") as f:
+            f.write(data)
+        t0 = time.perf_counter()
+        tailer._drain()
+        elapsed = time.perf_counter() - t0
+        tailer._close()
+        print(f"InotifyTailer drain: {args.lines / elapsed:,.0f} lines/s "
+              f"({len(data) / elapsed / 1e6:.0f} MB/s) into the buffer")
+
+def bench_warm(args):
+    import tempfile
+    import archive_index
+    import back
+
+    for capacity in args.capacity:
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, "messages")
+            pattern = os.path.join(tmp, "messages.*.gz")
+            lines = synthetic_lines(capacity * 2)
+            # Older half in an indexed archive, the rest in the log file
+            rotated = os.path.join(tmp, "messages.1-to-2")
+            with open(rotated, "w") as f:
+                f.writelines(lines[:capacity + capacity // 2])
+            archive_index.compress_archive(rotated, rotated + ".gz", "blocks")
+            os.remove(rotated)
+            with open(log, "w") as f:
+                f.writelines(lines[capacity + capacity // 2:])
+            snapshot = os.path.join(tmp, "snapshot")
+            cases = (("backwards from the log file only", None, os.path.join(tmp, "none")),
+                     ("backwards from the log file and archive", None, pattern),
+                     ("from the exit snapshot", snapshot, pattern))
+            for name, snapshot_path, archives in cases:
+                t0 = time.perf_counter()
+                buffer, tailer = back.warm_start(log, capacity, snapshot_path, archives)
+                elapsed = time.perf_counter() - t0
+                print(f"{capacity:>9,} lines, {name:>40}: {buffer.fill_level:>9,} lines in {1000 * elapsed:7.0f} ms")
+                # What the next case restores
+                back.save_snapshot(buffer, tailer, snapshot)
+                tailer._close()
+                del buffer
+                gc.collect()
+
+def bench_compress(args):
+    import tempfile
+    import archive_index
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "messages.1-to-2")
+        with open(log, "w") as f:
+            f.writelines(synthetic_lines(args.lines))
+        size = os.path.getsize(log)
+        for codec in args.codec:
+            for archive_format in args.format:
+                for workers in args.workers:
+                    out = log + archive_index.CODECS[codec][0]
+                    t0 = time.perf_counter()
+                    index = archive_index.compress_archive(log, out, archive_format, codec=codec, level=args.level,
+                                                           workers=workers)
+                    elapsed = time.perf_counter() - t0
+                    print(f"{codec:>5} {index['format']:>6}, {workers:>2} threads: {size / elapsed / 1e6:6.1f} MB/s, "
+                          f"ratio {size / os.path.getsize(out):4.1f}")
+                    archive_index.remove_archive(out)
+
+def bench_scan(args):
+    import tempfile
+    import settings
+    import archive_index
+    from text_index import build_text_index, MessageQuery
+    from column_index import build_column_index
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.ROTATED_LOG_PATTERN = os.path.join(tmp, "messages.*-to-*.gz")
+        import search_archive
+        search_archive.ARCHIVE_RESULT_CACHE_MB = 0
+
+        # One indexed archive per day, as rotate.py writes them
+        start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        files = []
+        for day in range(args.days):
+            lines = synthetic_lines(args.lines_per_day, start + timedelta(days=day))
+            first, last = (datetime.fromisoformat(line.split("|", 1)[0]) for line in (lines[0], lines[-1]))
+            log = os.path.join(tmp, f"messages.{first:%Y-%m-%d_%H-%M-%S}-to-{last:%Y-%m-%d_%H-%M-%S}")
+            with open(log, "w") as f:
+                f.writelines(lines)
+            archive_index.compress_archive(log, log + ".gz", args.format)
+            build_text_index(log + ".gz")
+            build_column_index(log + ".gz")
+            os.remove(log)
+            files.append(log + ".gz")
+        date_args = (start.replace(tzinfo=None), (start + timedelta(days=args.days)).replace(tzinfo=None))
+        cases = (
+            ("newest 100", None, {}, 100),
+            ("host, newest 100", None, {2: "host3.example.net"}, 100),
+            ("message, newest 100", MessageQuery("user77 "), {}, 100),
+            ("regex + program, all rows", MessageQuery(r"port 6\d{3}$", True), {5: "cron"}, None),
+        )
+        print(f"{args.days} archives of {args.lines_per_day:,} lines ({args.format}), {os.cpu_count()} CPU cores")
+        for name, msg_query, field_filters, limit in cases:
+            results = []
+            for workers in args.workers:
+                search_archive.ARCHIVE_SCAN_WORKERS = workers
+
+                def scan():
+                    results.append(search_archive.scan_files(search_archive.parse_log_file_lines, files, date_args,
+                                                             msg_query, field_filters, limit=limit,
+                                                             collect_facets=False)[0])
+
+                # The first scan starts the pool and loads the indexes
+                scan()
+                samples = timed(scan, args.repeat)
+                print(f"{name:>26}, {workers} workers: p50 {percentile(samples, 50):6.3f} s  "
+                      f"({len(results[-1])} rows)")
+                if search_archive._scan_pool is not None:
+                    search_archive._scan_pool.shutdown()
+                    search_archive._scan_pool = None
+            assert all(rows == results[0] for rows in results)
+
+def run_front(log_dir, socket_path, port, fd, threads, ready):
+    """front.py against a test log directory: the development server on
+    port, or with fd a worker on that listening socket."""
+    import settings
+    settings.SOCKET_PATH = socket_path
+    settings.LOG_FILE = os.path.join(log_dir, "messages")
+    settings.ROTATED_LOG_PATTERN = os.path.join(log_dir, "messages.*-to-*.gz")
+    # Scans run in the front process and are not served from the cache
+    settings.ARCHIVE_SCAN_WORKERS = 1
+    settings.ARCHIVE_RESULT_CACHE_MB = 0
+    import front
+    import front_server
+    logging.getLogger().setLevel(logging.WARNING)
+    ready.set()
+    if fd is None:
+        front.app.run(host="127.0.0.1", port=port)
+    else:
+        front_server.serve_worker(front.app, fd, threads, unlimited_paths=['/api/live/stream'])
+
+def bench_serve(args):
+    import tempfile
+    import http.client
+    import multiprocessing
+    import urllib.parse
+    import front_server
+    from settings import AUTH_USERNAME, AUTH_PASSWORD
+
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmp:
+        lines = synthetic_lines(args.lines)
+        with open(os.path.join(tmp, "messages"), "w") as f:
+            f.writelines(lines)
+        first, last = lines[0].split("|", 1)[0], lines[-1].split("|", 1)[0]
+        # The whole live file, in UTC
+        start = datetime.fromisoformat(first).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M")
+        end = (datetime.fromisoformat(last).astimezone(timezone.utc) + timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M")
+        scan_path = "/api/archive?" + urllib.parse.urlencode(
+            {"start_date": start, "end_date": end, "msgonly_filter": "user77 ", "num_lines": 100})
+
+        socket_path = os.path.join(tmp, "logbuffer.sock")
+        ready = ctx.Event()
+        ipc = ctx.Process(target=run_ipc_server, args=(socket_path, args.capacity, False, ready), daemon=True)
+        ipc.start()
+        ready.wait()
+
+        for workers in (0, args.workers):
+            name = "dev server" if workers == 0 else f"{workers} workers x {args.threads} threads"
+            sock = None if workers == 0 else front_server.listen_socket("127.0.0.1", args.port)
+            servers = []
+            for _ in range(max(1, workers)):
+                ready = ctx.Event()
+                servers.append(ctx.Process(target=run_front, daemon=True, args=(
+                    tmp, socket_path, args.port, sock and sock.fileno(), args.threads, ready)))
+                servers[-1].start()
+                ready.wait()
+            time.sleep(1)
+            conn = http.client.HTTPConnection("127.0.0.1", args.port)
+            conn.request("POST", "/login", urllib.parse.urlencode({"username": AUTH_USERNAME, "password": AUTH_PASSWORD}),
+                         {"Content-Type": "application/x-www-form-urlencoded"})
+            resp = conn.getresponse()
+            resp.read()
+            cookie = resp.getheader("Set-Cookie").split(";", 1)[0]
+            conn.close()
+
+            stop = threading.Event()
+            polls, scans = [], []
+
+            def client(path, samples):
+                # A browser tab: one keep-alive connection, a request at a time
+                conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=120)
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    conn.request("GET", path, headers={"Cookie": cookie})
+                    resp = conn.getresponse()
+                    resp.read()
+                    if resp.status != 200:
+                        raise RuntimeError(f"{path}: HTTP {resp.status}")
+                    samples.append(time.perf_counter() - t0)
+                conn.close()
+
+            threads = [threading.Thread(target=client, args=("/api/live?since=0&host=host3.example.net", polls))
+                       for _ in range(args.pollers)]
+            threads += [threading.Thread(target=client, args=(scan_path, scans)) for _ in range(args.scanners)]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            print(f"{name:>24}: live polls {len(polls) / args.seconds:7.0f} req/s  "
+                  f"p50 {1000 * percentile(polls, 50):7.1f} ms  p99 {1000 * percentile(polls, 99):7.1f} ms  |  "
+                  f"archive scans {len(scans) / args.seconds:5.2f} req/s"
+                  + (f"  p50 {percentile(scans, 50):5.2f} s" if scans else ""))
+            for server in servers:
+                server.terminate()
+            for server in servers:
+                server.join()
+            if sock is not None:
+                sock.close()
+        ipc.terminate()
+        ipc.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("buffer", help="LogBuffer memory per line and add/get latency")
+    p.add_argument("--capacity", type=int, nargs="+", default=[100000, 1000000])
+    p.add_argument("--batch", type=int, default=100, help="lines per add_lines call")
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_buffer)
+    p = sub.add_parser("query", help="filtered last-N queries: pulling the buffer vs LogBuffer.query")
+    p.add_argument("--capacity", type=int, nargs="+", default=[100000, 1000000])
+    p.add_argument("--limit", type=int, default=30)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_query)
+    p = sub.add_parser("ipc", help="IPC latency: serial vs concurrent server, per-request vs pooled connections")
+    p.add_argument("--capacity", type=int, default=100000)
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    p.add_argument("--requests", type=int, default=50, help="requests per client")
+    p.add_argument("--snapshots", action="store_true", help="pull the whole buffer in the background meanwhile")
+    p.set_defaults(func=bench_ipc)
+    p = sub.add_parser("tail", help="log tailer throughput and partial-line safety")
+    p.add_argument("--lines", type=int, default=500000)
+    p.add_argument("--write-size", type=int, default=4096, help="average bytes per write")
+    p.set_defaults(func=bench_tail)
+    p = sub.add_parser("warm", help="back.py startup time to a full live buffer")
+    p.add_argument("--capacity", type=int, nargs="+", default=[100000, 1000000])
+    p.set_defaults(func=bench_warm)
+    p = sub.add_parser("shm", help="unfiltered live reads: IPC socket vs shared-memory ring")
+    p.add_argument("--capacity", type=int, default=100000)
+    p.add_argument("--repeat", type=int, default=200)
+    p.set_defaults(func=bench_shm)
+    p = sub.add_parser("compress", help="archive compression throughput per codec, layout and thread count")
+    p.add_argument("--lines", type=int, default=1000000)
+    p.add_argument("--codec", nargs="+", default=["gzip"], choices=["gzip", "bz2", "xz"])
+    p.add_argument("--format", nargs="+", default=["gzip", "blocks"], choices=["gzip", "blocks"])
+    p.add_argument("--level", type=int, default=None)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    p.set_defaults(func=bench_compress)
+    p = sub.add_parser("serve", help="web throughput: development server vs front.py workers, with archive scans running")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--pollers", type=int, default=20, help="clients polling /api/live")
+    p.add_argument("--scanners", type=int, default=2, help="clients running archive searches meanwhile")
+    p.add_argument("--capacity", type=int, default=100000)
+    p.add_argument("--lines", type=int, default=300000, help="lines of the log file the searches scan")
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--port", type=int, default=17321)
+    p.set_defaults(func=bench_serve)
+    p = sub.add_parser("scan", help="archive search wall-clock time over a week of archives: sequential vs scan pool")
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--lines-per-day", type=int, default=150000)
+    p.add_argument("--format", default="gzip", choices=["gzip", "blocks"])
+    p.add_argument("--workers", type=int, nargs="+", default=[1, min(4, os.cpu_count() or 1)])
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_scan)
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,192 @@
+"""Dictionary-encoded column sidecar for the dropdown filters of rotated archives.
+
+For FULLHOST, FACILITY, LEVEL, PROGRAM and PID, rotate.py stores every
+distinct value of an archive with its row count, a bitmap of the segments
+(see archive_index.py) holding it and a zlib-compressed bitmap of the row
+numbers holding it (``<archive>.gz.cols``). A host+level filter is then an
+AND of two row bitmaps: only the segments with a selected row are inflated
+and only the selected lines get split. Dropdown values for a time range come
+from the segment bitmaps without reading any rows.
+
+summarize_columns boils the FULLHOST and PROGRAM values down to a small
+membership summary that the archive catalog keeps per archive, so archive
+search can drop a whole file for a host or program it never saw without
+loading any of its sidecars.
+"""
+import os
+import json
+import zlib
+import gzip
+import base64
+import hashlib
+import logging
+from functools import lru_cache
+import archive_index
+
+COLUMN_INDEX_VERSION = 1
+# (name, column in the 8-field row)
+FIELDS = (("host", 2), ("facility", 3), ("level", 4), ("program", 5), ("pid", 6))
+# Fields of the membership summary; up to SUMMARY_EXACT_LIMIT distinct values
+# are kept as a sorted list, more as a bloom filter of about 1% false positives
+SUMMARY_FIELDS = ("host", "program")
+SUMMARY_EXACT_LIMIT = 256
+BLOOM_BITS_PER_VALUE = 10
+BLOOM_HASHES = 7
+
+def column_index_path(gz_path):
+    return gz_path + archive_index.COLUMN_INDEX_SUFFIX
+
+def _encode_rows(rows, line_count):
+    bitmap = bytearray((line_count + 7) // 8)
+    for row in rows:
+        bitmap[row >> 3] |= 1 << (row & 7)
+    return base64.b64encode(zlib.compress(bytes(bitmap))).decode("ascii")
+
+def _decode_rows(encoded):
+    return int.from_bytes(zlib.decompress(base64.b64decode(encoded)), "little")
+
+class ColumnIndexBuilder:
+    """Column values of an archive, fed segment by segment."""
+
+    def __init__(self):
+        self.rows = {name: {} for name, _ in FIELDS}
+        self.segs = {name: {} for name, _ in FIELDS}
+
+    def add_segment(self, seg_no, first_line, lines):
+        bit = 1 << seg_no
+        for k, line in enumerate(lines):
+            parts = line.split("|", 7)
+            if len(parts) < 7:
+                continue
+            for name, col in FIELDS:
+                value = parts[col]
+                self.rows[name].setdefault(value, []).append(first_line + k)
+                self.segs[name][value] = self.segs[name].get(value, 0) | bit
+
+    def write(self, gz_path, index):
+        fields = {}
+        for name, _ in FIELDS:
+            segs = self.segs[name]
+            fields[name] = {
+                value: [len(value_rows), format(segs[value], "x"), _encode_rows(value_rows, index["lines"])]
+                for value, value_rows in self.rows[name].items()
+            }
+        tmp_path = column_index_path(gz_path) + ".tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({"version": COLUMN_INDEX_VERSION, "lines": index["lines"], "fields": fields}, f,
+                      separators=(",", ":"))
+        os.replace(tmp_path, column_index_path(gz_path))
+        logging.info(f"Built column index for {gz_path}: " + ", ".join(f"{len(fields[n])} {n}" for n, _ in FIELDS))
+        return fields
+
+def build_column_index(gz_path):
+    """Build the column sidecar of an indexed archive."""
+    index = archive_index.load_index(gz_path)
+    if index is None:
+        logging.warning(f"No time index for {gz_path}, skipping column index")
+        return None
+    builder = ColumnIndexBuilder()
+    for seg_no, lines in archive_index.iter_segments(gz_path, index=index):
+        builder.add_segment(seg_no, index["segments"][seg_no][1], lines)
+    return builder.write(gz_path, index)
+
+@lru_cache(maxsize=32)
+def _load_columns(path, mtime_ns):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable column index {path}: {e}")
+        return None
+    if data.get("version") != COLUMN_INDEX_VERSION:
+        return None
+    fields = data["fields"]
+    for values in fields.values():
+        for entry in values.values():
+            entry[1] = int(entry[1], 16)
+    return fields
+
+def load_columns(gz_path):
+    """Return {field: {value: [count, segment bitmap, encoded row bitmap]}} or None."""
+    path = column_index_path(gz_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_columns(path, mtime_ns)
+
+@lru_cache(maxsize=256)
+def _row_bitmap(encoded):
+    return _decode_rows(encoded)
+
+def select_rows(columns, field_filters):
+    """AND the row bitmaps of {column: value} filters.
+    Returns (segment bitmap, row bitmap); both are 0 when nothing matches."""
+    seg_bits = -1
+    row_bits = -1
+    names = dict((col, name) for name, col in FIELDS)
+    for col, value in field_filters.items():
+        entry = columns[names[col]].get(value)
+        if entry is None:
+            return 0, 0
+        seg_bits &= entry[1]
+        row_bits &= _row_bitmap(entry[2])
+        if not row_bits:
+            return 0, 0
+    return seg_bits, row_bits
+
+def segment_rows(index, seg_no, row_bits):
+    """Offsets within a segment of the rows set in row_bits."""
+    first = index["segments"][seg_no][1]
+    local = (row_bits >> first) & ((1 << archive_index.segment_line_count(index, seg_no)) - 1)
+    return [k for k, c in enumerate(reversed(bin(local)[2:])) if c == "1"]
+
+def add_facets(columns, segment_mask, facets):
+    """Add to facets ({column: set}) the values present in the segments of segment_mask."""
+    for name, col in FIELDS:
+        facet = facets.setdefault(col, set())
+        for value, entry in columns[name].items():
+            if value and entry[1] & segment_mask:
+                facet.add(value)
+
+def _bloom_positions(value, bits):
+    digest = hashlib.blake2b(value.encode("utf-8", "replace"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(BLOOM_HASHES)]
+
+def summarize_columns(columns):
+    """{field: sorted values, or {"bits", "filter"} bloom filter} for the
+    SUMMARY_FIELDS of a loaded column index."""
+    summary = {}
+    for name in SUMMARY_FIELDS:
+        values = list(columns[name])
+        if len(values) <= SUMMARY_EXACT_LIMIT:
+            summary[name] = sorted(values)
+            continue
+        bits = len(values) * BLOOM_BITS_PER_VALUE
+        bloom = 0
+        for value in values:
+            for pos in _bloom_positions(value, bits):
+                bloom |= 1 << pos
+        summary[name] = {"bits": bits, "filter": format(bloom, "x")}
+    return summary
+
+def may_contain(summary, field_filters):
+    """False only when the summary proves that no row matches field_filters
+    ({column: value}); archives without a summary may always match."""
+    if not summary or not field_filters:
+        return True
+    names = dict((col, name) for name, col in FIELDS)
+    for col, value in field_filters.items():
+        members = summary.get(names.get(col))
+        if members is None:
+            continue
+        if isinstance(members, list):
+            if value not in members:
+                return False
+        else:
+            bloom = int(members["filter"], 16)
+            if not all(bloom >> pos & 1 for pos in _bloom_positions(value, members["bits"])):
+                return False
+    return True
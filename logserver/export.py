@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Bulk export of archive search results as NDJSON or CSV.
+
+/api/archive/export takes the same dates and filters as /api/archive and
+streams every matching row of the range instead of the last num_lines:
+files oldest first, each in the order its lines were logged. Rows are
+produced segment by segment as the archives are read, encoded and sent in
+chunks of about EXPORT_CHUNK_BYTES (gzipped on the fly with gzip=1), so
+memory stays flat however long the range is. When the client goes away the
+generator is closed at its next chunk and no further segments are read.
+"""
+import io
+import csv
+import json
+import time
+import zlib
+import logging
+from datetime import timezone
+from flask import request, jsonify, Response
+import archive_index
+from isodate import IsoDateDecoder
+from search_archive import api_query, find_relevant_log_files, file_lower_bound, files_without_members, match_rows
+from utils import is_authenticated
+
+EXPORT_FIELDS = ("isodate", "rcptid", "host", "facility", "level", "program", "pid", "message")
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_GZIP_LEVEL = 6
+
+def export_order(file_path):
+    """Sort key putting files oldest first: archives by the oldest epoch they
+    can hold, then the live log file, which holds the newest lines."""
+    return file_lower_bound(file_path) if archive_index.is_archive(file_path) else float("inf")
+
+def export_rows(files, start_date, end_date, msg_query=None, field_filters=None):
+    """Yield the rows (lists) of files dated in [start_date, end_date)
+    matching the filters, oldest file first. Dates and naive log dates are
+    taken as UTC."""
+    start_ts = archive_index.datetime_to_epoch(start_date)
+    end_ts = archive_index.datetime_to_epoch(end_date)
+    decoder = IsoDateDecoder(timezone.utc)
+    if field_filters:
+        excluded = files_without_members(files, field_filters)
+        files = [f for f in files if f not in excluded]
+    for file_path in sorted(files, key=export_order):
+        try:
+            for _, _, row in match_rows(file_path, start_ts, end_ts, decoder, msg_query, field_filters=field_filters):
+                yield row
+        except Exception as e:
+            logging.error(f"Error exporting log file {file_path}: {e}")
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n"
+
+def csv_lines(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def encode_chunks(texts, compress=False):
+    """Join texts into UTF-8 chunks of about EXPORT_CHUNK_BYTES, gzipped
+    as one stream with compress."""
+    gz = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    parts = []
+    size = 0
+    for text in texts:
+        parts.append(text)
+        size += len(text)
+        if size >= EXPORT_CHUNK_BYTES:
+            data = "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+            if gz is not None:
+                data = gz.compress(data)
+            if data:
+                yield data
+    data = "".join(parts).encode("utf-8")
+    if gz is not None:
+        data = gz.compress(data) + gz.flush()
+    if data:
+        yield data
+
+def export_archive():
+    if not is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    compress = request.args.get('gzip', '') == '1'
+    try:
+        start_date, end_date, msg_query, field_filters = api_query()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    files = find_relevant_log_files(start_date, end_date)
+    filename = f"logs-{start_date:%Y%m%dT%H%M%S}-{end_date:%Y%m%dT%H%M%S}.{fmt}{'.gz' if compress else ''}"
+    logging.info(f"Exporting {start_date} to {end_date} from {len(files)} files as {filename}")
+
+    def generate():
+        count = 0
+        started = time.monotonic()
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        rows = counted(export_rows(files, start_date, end_date, msg_query, field_filters))
+        texts = ndjson_lines(rows) if fmt == "ndjson" else csv_lines(rows)
+        try:
+            yield from encode_chunks(texts, compress)
+        except GeneratorExit:
+            logging.info(f"Export {filename} stopped by the client after {count} rows")
+            raise
+        logging.info(f"Exported {count} rows as {filename} in {time.monotonic() - started:.1f}s")
+
+    return Response(generate(), mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"',
+                             "X-Accel-Buffering": "no"})
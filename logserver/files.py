@@ -1,45 +1,79 @@
 #!/usr/bin/env python3
 import os
 import logging
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
 from datetime import datetime
-from settings import LOG_FILE
-from rotate import rotate_log
+from settings import LOG_FILE, ROTATED_LOG_PATTERN
+from rotate import request_rotation, read_status
+from archive_index import is_sidecar
+from archive_catalog import load_catalog, is_catalog
+from utils import is_authenticated
+
+def format_size(size):
+    """Human readable size."""
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size/1024:.1f} KB"
+    return f"{size/(1024*1024):.1f} MB"
+
+def format_time(epoch):
+    return datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S') if epoch is not None else ''
 
 def files_view():
-    """Display the files list page."""
+    """Display the files list page. Archives come from the archive catalog;
+    only the other files of the log directory are statted."""
     log_dir = os.path.dirname(LOG_FILE)
     files_list = []
-    
-    for filename in os.listdir(log_dir):
-        filepath = os.path.join(log_dir, filename)
-        if os.path.isfile(filepath):
-            stat = os.stat(filepath)
-            size = stat.st_size
-            # Convert size to human readable format
-            if size < 1024:
-                size_str = f"{size} B"
-            elif size < 1024 * 1024:
-                size_str = f"{size/1024:.1f} KB"
-            else:
-                size_str = f"{size/(1024*1024):.1f} MB"
-            
-            modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+    catalogued = set()
+
+    for entry in load_catalog(ROTATED_LOG_PATTERN):
+        catalogued.add(entry["path"])
+        files_list.append({
+            'name': entry["name"],
+            'size': format_size(entry["size"]),
+            'modified': format_time(entry["mtime"]),
+            'mtime': entry["mtime"],
+            'lines': entry["lines"],
+            'codec': entry["codec"],
+            'range': f"{format_time(entry['first'])} to {format_time(entry['last'])}" if entry["first"] is not None else '',
+        })
+
+    with os.scandir(log_dir) as it:
+        for dir_entry in it:
+            if dir_entry.path in catalogued or is_sidecar(dir_entry.name) or is_catalog(dir_entry.name) \
+                    or not dir_entry.is_file():
+                continue
+            stat = dir_entry.stat()
             files_list.append({
-                'name': filename,
-                'size': size_str,
-                'modified': modified
+                'name': dir_entry.name,
+                'size': format_size(stat.st_size),
+                'modified': format_time(stat.st_mtime),
+                'mtime': stat.st_mtime,
+                'lines': None,
+                'codec': '',
+                'range': '',
             })
-    
+
     # Sort by modification time, newest first
-    files_list.sort(key=lambda x: x['modified'], reverse=True)
-    return render_template('files.html', files=files_list)
+    files_list.sort(key=lambda x: x['mtime'], reverse=True)
+    return render_template('files.html', files=files_list, rotation=read_status())
 
 def rotate_now():
-    """Manually trigger log rotation."""
+    """Manually trigger log rotation. The rotation (mostly compression) runs
+    in the background; the files page polls api_rotation for its progress."""
     try:
-        rotate_log()
-        flash('Log rotation triggered successfully', 'success')
+        if request_rotation():
+            flash('Log rotation started', 'success')
+        else:
+            flash('A log rotation is already in progress', 'info')
     except Exception as e:
         flash(f'Failed to trigger log rotation: {str(e)}', 'danger')
-    return redirect(url_for('files_route')) 
\ No newline at end of file
+    return redirect(url_for('files_route'))
+
+def api_rotation():
+    """Status of the current or last rotation: state, file, and while
+    compressing done/total bytes."""
+    if not is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(read_status()) 
\ No newline at end of file
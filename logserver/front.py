@@ -3,7 +3,7 @@ import logging
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from functools import wraps
 from settings import (
-    SECRET_KEY, LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD, settings
+    SECRET_KEY, LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD, FRONT_THREADS, settings
 )
 
 # Map our custom levels to Python's logging
@@ -23,7 +23,10 @@ logging.getLogger('werkzeug').setLevel(logging.ERROR)
 import search_live
 import search_archive
 import files
+import export
+import histogram
 from utils import is_authenticated
+from front_server import WEB_HOST, WEB_PORT, serve_worker
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = SECRET_KEY
@@ -63,10 +66,22 @@ def archive():
 def api_live():
     return search_live.api_live()
 
+@app.route('/api/live/stream')
+def api_live_stream():
+    return search_live.live_stream()
+
 @app.route('/api/archive')
 def api_archive():
     return search_archive.api_archive()
 
+@app.route('/api/archive/export')
+def api_archive_export():
+    return export.export_archive()
+
+@app.route('/api/histogram')
+def api_histogram():
+    return histogram.api_histogram()
+
 @app.route('/files')
 def files_route():
     return files.files_view()
@@ -75,6 +90,10 @@ def files_route():
 def rotate_now():
     return files.rotate_now()
 
+@app.route('/api/rotation')
+def api_rotation():
+    return files.api_rotation()
+
 @app.route('/configure', methods=['GET', 'POST'])
 def configure():
     if not is_authenticated():
@@ -93,5 +112,12 @@ def configure():
     return render_template('configure.html', config=config)
 
 if __name__ == '__main__':
-    logging.info("Starting Flask frontend.")
-    app.run(host='0.0.0.0', port=7321)
+    import argparse
+    parser = argparse.ArgumentParser(description="Web interface of the log server.")
+    parser.add_argument("--fd", type=int, help="serve as a worker on this listening socket inherited from main.py")
+    args = parser.parse_args()
+    if args.fd is None:
+        logging.info("Starting Flask frontend.")
+        app.run(host=WEB_HOST, port=WEB_PORT)
+    else:
+        serve_worker(app, args.fd, FRONT_THREADS, unlimited_paths=['/api/live/stream'])
@@ -0,0 +1,103 @@
+"""Multi-process serving of the web interface.
+
+With ``workers`` > 0 in ``[front]`` main.py binds the web port once and
+starts that many ``front.py --fd N`` processes on the listening socket,
+restarting any that exits. The kernel hands each new connection to one of
+them, so a slow archive search only holds up its own worker (and its own
+GIL) while the others keep answering live refreshes. main.py keeps the
+socket open across restarts: connections arriving while workers restart wait
+in the listen backlog instead of being refused.
+
+Each worker runs Werkzeug's threaded server with a connection per thread and
+lets at most ``threads`` requests run at once; the rest wait for a free slot.
+Live streams stay open as long as their page does and are not counted, or a
+few open live pages would take every slot. On SIGTERM a worker stops
+accepting and exits once its running requests are done, at most
+DRAIN_TIMEOUT seconds later.
+
+Everything a worker caches (archive search results, the catalog, rollups,
+the IPC connections to back.py) is its own; workers share nothing but the
+socket.
+"""
+import os
+import signal
+import socket
+import logging
+import threading
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 7321
+# Pending connections the shared listening socket queues for the workers
+LISTEN_BACKLOG = 128
+# Seconds a stopping worker waits for its running requests
+DRAIN_TIMEOUT = 5
+
+def listen_socket(host, port):
+    """The listening socket main.py passes on to the workers."""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    # Workers that lose the race for a connection go back to waiting instead
+    # of blocking in accept
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+class RequestLimiter:
+    """WSGI middleware running at most limit requests at once, except those
+    for unlimited_paths."""
+
+    def __init__(self, app, limit, unlimited_paths=()):
+        self.app = app
+        self.limit = max(1, limit)
+        self.unlimited_paths = frozenset(unlimited_paths)
+        self.active = 0
+        self.cond = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") in self.unlimited_paths:
+            return self.app(environ, start_response)
+        with self.cond:
+            self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        # Streamed responses hold their slot until the server closes them
+        return ClosingIterator(result, self._done)
+
+    def _done(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def drain(self, timeout):
+        """Wait until no counted request runs; False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.active == 0, timeout)
+
+def serve_worker(app, fd, threads, unlimited_paths=()):
+    """Serve app on the inherited listening socket fd until SIGTERM."""
+    sock = socket.socket(fileno=fd)
+    host, port = sock.getsockname()[:2]
+    limiter = RequestLimiter(app, threads, unlimited_paths)
+    # The server works on its own duplicate of the socket
+    server = make_server(host, port, limiter, threaded=True, fd=fd)
+    sock.close()
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, which runs in this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    logging.info(f"Front worker {os.getpid()} serving on {host}:{port} with {limiter.limit} threads")
+    # Closes only this worker's copy of the socket when it returns
+    server.serve_forever()
+    if not limiter.drain(DRAIN_TIMEOUT):
+        logging.warning(f"Front worker {os.getpid()} exits with {limiter.active} requests still running")
+    logging.info(f"Front worker {os.getpid()} stopped")
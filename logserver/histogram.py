@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Line counts over time, answered from the rollups (see rollup.py).
+
+The rollup sidecars of the archives in range and the live counters of
+back.py are added up into buckets of a few minutes to a day, so a count
+over days costs a walk over per-minute counters and never reads a log line.
+Live counters of a file that already has an archive rollup are left out.
+"""
+import logging
+from flask import request, jsonify
+import archive_index
+from settings import ROTATED_LOG_PATTERN
+from archive_catalog import load_catalog
+from back_client import fetch_rollup
+from rollup import FIELDS, load_rollup
+from search_archive import api_query
+from utils import is_authenticated
+
+# Bucket sizes in minutes, the smallest one giving at most MAX_BUCKETS is used
+BUCKET_MINUTES = (1, 5, 10, 15, 30, 60, 180, 360, 720, 1440)
+MAX_BUCKETS = 120
+FIELD_NAMES = tuple(name for name, _ in FIELDS)
+
+def choose_bucket(minutes):
+    return next((b for b in BUCKET_MINUTES if minutes <= b * MAX_BUCKETS), BUCKET_MINUTES[-1])
+
+def histogram(start_ts, end_ts, filters=None, group_by=None, bucket_minutes=None):
+    """Line counts of [start_ts, end_ts) matching filters ({field: value}
+    on FIELD_NAMES) per bucket, one series per group_by value ("" without
+    group_by)."""
+    filters = filters or {}
+    start_minute = int(start_ts // 60)
+    end_minute = max(int(-(-end_ts // 60)), start_minute + 1)
+    bucket_minutes = bucket_minutes or choose_bucket(end_minute - start_minute)
+
+    groups = {}
+    sources = set()
+    missing = 0
+    for entry in load_catalog(ROTATED_LOG_PATTERN):
+        if entry["first"] is not None and (entry["last"] < start_minute * 60 or entry["first"] >= end_minute * 60):
+            continue
+        rollup = load_rollup(entry["path"])
+        if rollup is None:
+            missing += 1
+            continue
+        rollup.aggregate(start_minute, end_minute, filters, group_by, bucket_minutes, groups)
+        if rollup.source:
+            sources.add(rollup.source)
+
+    live = fetch_rollup(start_minute, end_minute, filters, group_by, bucket_minutes, sources)
+    for group, buckets in (live or {}).items():
+        merged = groups.setdefault(group, {})
+        for bucket, count in buckets.items():
+            merged[bucket] = merged.get(bucket, 0) + count
+
+    count = -(-(end_minute - start_minute) // bucket_minutes)
+    series = {group: [buckets.get(i, 0) for i in range(count)] for group, buckets in sorted(groups.items())}
+    return {
+        "start": start_minute * 60,
+        "bucket_seconds": bucket_minutes * 60,
+        "series": series,
+        "total": sum(sum(counts) for counts in series.values()),
+        "archives_without_rollup": missing,
+        "live": live is not None,
+    }
+
+def api_histogram():
+    if not is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    if request.args.get('pid') or request.args.get('msgonly_filter'):
+        return jsonify({"error": f"counts can only be filtered by {', '.join(FIELD_NAMES)}"}), 400
+    group_by = request.args.get('group_by') or None
+    if group_by is not None and group_by not in FIELD_NAMES:
+        return jsonify({"error": f"group_by must be one of {', '.join(FIELD_NAMES)}"}), 400
+    try:
+        bucket_minutes = int(request.args['bucket']) if request.args.get('bucket') else None
+        if bucket_minutes is not None and bucket_minutes < 1:
+            raise ValueError("bucket must be a positive number of minutes")
+        start_date, end_date, _, _ = api_query()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filters = {name: request.args[name] for name in FIELD_NAMES if request.args.get(name)}
+    start_ts = archive_index.datetime_to_epoch(start_date)
+    end_ts = archive_index.datetime_to_epoch(end_date)
+    if bucket_minutes is not None and (end_ts - start_ts) / 60 / bucket_minutes > MAX_BUCKETS * 10:
+        return jsonify({"error": "too many buckets, use a larger bucket"}), 400
+    result = histogram(start_ts, end_ts, filters, group_by, bucket_minutes)
+    logging.debug(f"Histogram {start_date} to {end_date} {filters}: {result['total']} lines")
+    return jsonify(result)
@@ -0,0 +1,158 @@
+"""Fast decoding of syslog-ng ${ISODATE} timestamps into epoch seconds.
+
+Every archive and buffer line starts with a timestamp such as
+``2025-06-01T12:34:56+02:00``. Going through ``datetime.fromisoformat`` and a
+timezone conversion per line dominates archive scans, so IsoDateDecoder
+slices the fixed-width fields, caches the epoch of the current minute and the
+offset of each suffix it has seen, and only falls back to datetime for
+anything else (naive dates, fractional seconds, odd spacing, the old
+``%Y-%m-%d %H:%M:%S`` format).
+"""
+import time
+from datetime import datetime, date, timezone, timedelta
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+CACHE_LIMIT = 4096
+
+class IsoDateDecoder:
+    """Decode ISODATE strings to epoch seconds (None when they do not parse).
+
+    naive_tz is used for dates without an offset: a pytz or zoneinfo
+    timezone, or None for server local time. Keep one decoder per file or
+    reader: busy logs repeat the same timestamp many times, which then costs
+    a single dict lookup, and consecutive seconds share the cached minute and
+    offset."""
+
+    def __init__(self, naive_tz=None):
+        self.naive_tz = naive_tz
+        self._seen = {}
+        self._days = {}
+        self._offsets = {}
+        self._minute = None
+        self._suffix = None
+        self._base = 0
+
+    def epoch(self, text):
+        epoch = self._seen.get(text)
+        if epoch is None:
+            epoch = self._decode(text)
+            if len(self._seen) >= CACHE_LIMIT:
+                self._seen.clear()
+            self._seen[text] = epoch
+        return epoch
+
+    def _decode(self, text):
+        if text[:16] != self._minute or text[19:] != self._suffix:
+            if not self._set_minute(text):
+                return self._slow(text)
+        try:
+            return self._base + int(text[17:19])
+        except ValueError:
+            return self._slow(text)
+
+    def _set_minute(self, text):
+        """Cache the epoch of the minute of text; False if it is not a plain
+        YYYY-MM-DDTHH:MM:SS+HH:MM (or Z) timestamp."""
+        if len(text) < 20 or text[4] != "-" or text[7] != "-" or text[10] not in "T " \
+                or text[13] != ":" or text[16] != ":":
+            return False
+        suffix = text[19:]
+        offset = self._offsets.get(suffix)
+        if offset is None:
+            offset = self._parse_offset(suffix)
+            if offset is None:
+                return False
+            if len(self._offsets) >= CACHE_LIMIT:
+                self._offsets.clear()
+            self._offsets[suffix] = offset
+        try:
+            day = self._days.get(text[:10])
+            if day is None:
+                day = (date(int(text[:4]), int(text[5:7]), int(text[8:10])).toordinal() - EPOCH_ORDINAL) * 86400
+                if len(self._days) >= CACHE_LIMIT:
+                    self._days.clear()
+                self._days[text[:10]] = day
+            self._base = day + int(text[11:13]) * 3600 + int(text[14:16]) * 60 - offset
+        except ValueError:
+            return False
+        self._minute = text[:16]
+        self._suffix = suffix
+        return True
+
+    @staticmethod
+    def _parse_offset(suffix):
+        """Seconds east of UTC for a "Z" or "+HH:MM" suffix, None otherwise."""
+        suffix = suffix.strip()
+        if suffix == "Z":
+            return 0
+        if len(suffix) != 6 or suffix[0] not in "+-" or suffix[3] != ":":
+            return None
+        try:
+            offset = int(suffix[1:3]) * 3600 + int(suffix[4:6]) * 60
+        except ValueError:
+            return None
+        return -offset if suffix[0] == "-" else offset
+
+    def _slow(self, text):
+        text = text.strip()
+        try:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                dt = datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return None
+        if dt.tzinfo is None and self.naive_tz is not None:
+            if hasattr(self.naive_tz, "localize"):
+                dt = self.naive_tz.localize(dt)
+            else:
+                dt = dt.replace(tzinfo=self.naive_tz)
+        return dt.timestamp()
+
+if __name__ == "__main__":
+    # Microbenchmark: the per-line work of an archive reader, datetime based
+    # (as read_log_file used to do it) against IsoDateDecoder
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare per-line timestamp decoding and range checks.")
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--lines-per-second", type=int, default=5)
+    args = parser.parse_args()
+
+    tz = timezone(timedelta(hours=2))
+    base = datetime(2025, 6, 1, tzinfo=tz)
+    lines = [f"{(base + timedelta(seconds=i // args.lines_per_second)).isoformat()}|{i}|host{i % 20}|daemon|info|"
+             f"sshd|{i}|message {i}" for i in range(args.lines)]
+    # Half of the lines fall in range
+    span = args.lines // args.lines_per_second
+    start = (base + timedelta(seconds=span // 4)).astimezone(timezone.utc)
+    end = (base + timedelta(seconds=span * 3 // 4)).astimezone(timezone.utc)
+
+    def datetime_path():
+        rows = []
+        for line in lines:
+            parts = line.split("|", 7)
+            dt = datetime.fromisoformat(parts[0]).astimezone(timezone.utc)
+            if start <= dt <= end:
+                rows.append((dt.timestamp(), parts))
+        return rows
+
+    def decoder_path():
+        decoder = IsoDateDecoder()
+        low, high = start.timestamp(), end.timestamp()
+        rows = []
+        for line in lines:
+            epoch = decoder.epoch(line[:line.find("|")])
+            if epoch is not None and low <= epoch <= high:
+                rows.append((epoch, line.split("|", 7)))
+        return rows
+
+    import gc
+    gc.disable()
+    results = []
+    for name, fn in (("datetime", datetime_path), ("IsoDateDecoder", decoder_path)):
+        t0 = time.perf_counter()
+        results.append(fn())
+        elapsed = time.perf_counter() - t0
+        print(f"{name:>15}: {len(lines) / elapsed:12,.0f} lines/s ({len(results[-1])} in range)")
+    assert results[0] == results[1]
@@ -2,20 +2,96 @@
 import subprocess
 import sys
 import os
+import time
 import signal
 import logging
 from settings import settings
+import front_server
 
-# Global variable to store process references
-processes = []
+# Child processes by name (FrontWorkers for front.py workers) and when each
+# was last started
+processes = {}
+started = {}
+# Seconds back.py gets to exit on a restart before it is killed
+BACK_EXIT_TIMEOUT = 10
+# Seconds front.py workers get to finish their requests before they are killed
+FRONT_EXIT_TIMEOUT = front_server.DRAIN_TIMEOUT + 2
+# A child (or front.py worker) that exits is restarted, but no sooner than
+# this many seconds after its previous start
+RESTART_DELAY = 5
+# Seconds between checks of the child processes
+SUPERVISE_INTERVAL = 1
+# Listening socket of the front.py workers, kept open across their restarts
+front_socket = None
 
 def script_path(filename):
     # Get the directory where main.py is located and join it with filename
     base_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(base_dir, filename)
 
+class FrontWorkers:
+    """The front.py worker processes serving the shared listening socket.
+    Takes the place of the single front.py Popen in processes, and restarts
+    its workers itself."""
+
+    def __init__(self, sock, count):
+        self.sock = sock
+        self.procs = [None] * count
+        self.started = [0.0] * count
+        self.stopping = False
+        for i in range(count):
+            self._start(i)
+
+    def _start(self, i):
+        fd = self.sock.fileno()
+        self.procs[i] = subprocess.Popen([sys.executable, script_path("front.py"), "--fd", str(fd)], pass_fds=(fd,))
+        self.started[i] = time.monotonic()
+
+    def supervise(self):
+        """Restart the workers that exited."""
+        if self.stopping:
+            return
+        for i, proc in enumerate(self.procs):
+            code = proc.poll()
+            if code is not None and time.monotonic() - self.started[i] >= RESTART_DELAY:
+                logging.warning(f"front.py worker {proc.pid} exited with {code}, restarting it")
+                self._start(i)
+
+    def poll(self):
+        if not self.stopping or any(proc.poll() is None for proc in self.procs):
+            return None
+        return 0
+
+    def terminate(self):
+        self.stopping = True
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.terminate()
+
+    def kill(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for proc in self.procs:
+            proc.wait(None if deadline is None else max(0, deadline - time.monotonic()))
+        return 0
+
 def start_front():
-    return subprocess.Popen([sys.executable, script_path("front.py")])
+    """front.py workers on the web port, or its development server when
+    workers is 0."""
+    global front_socket
+    if settings.FRONT_WORKERS <= 0:
+        if front_socket is not None:
+            front_socket.close()
+            front_socket = None
+        return subprocess.Popen([sys.executable, script_path("front.py")])
+    if front_socket is None:
+        front_socket = front_server.listen_socket(front_server.WEB_HOST, front_server.WEB_PORT)
+    logging.info(f"Starting {settings.FRONT_WORKERS} front.py workers with {settings.FRONT_THREADS} threads each")
+    return FrontWorkers(front_socket, settings.FRONT_WORKERS)
 
 def start_back():
     return subprocess.Popen([sys.executable, script_path("back.py")])
@@ -29,44 +105,69 @@ def start_syslog_ng():
         "/usr/sbin/syslog-ng", "-F", "--no-caps", "--verbose"
     ])
 
+STARTERS = {
+    "syslog-ng": start_syslog_ng,
+    "back.py": start_back,
+    "front.py": start_front,
+    "rotate.py": start_rotate,
+}
+# Seconds a child gets to exit on a restart before it is killed; the others
+# are not waited for
+EXIT_TIMEOUTS = {
+    # Let it write its buffer snapshot before the new one looks for it
+    "back.py": BACK_EXIT_TIMEOUT,
+    # While it is down, connections wait in the backlog of the listening
+    # socket kept by start_front
+    "front.py": FRONT_EXIT_TIMEOUT,
+}
+
+def start(name):
+    processes[name] = STARTERS[name]()
+    started[name] = time.monotonic()
+
+def restart(name):
+    proc = processes[name]
+    proc.terminate()
+    timeout = EXIT_TIMEOUTS.get(name)
+    if timeout is not None:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    start(name)
+
+def supervise():
+    """Restart the children that exited."""
+    for name, proc in processes.items():
+        if isinstance(proc, FrontWorkers):
+            proc.supervise()
+            continue
+        code = proc.poll()
+        if code is not None and time.monotonic() - started[name] >= RESTART_DELAY:
+            logging.warning(f"{name} exited with {code}, restarting it")
+            try:
+                start(name)
+            except Exception as e:
+                logging.error(f"Failed to restart {name}: {e}")
+
 def signal_handler(signum, frame):
     """Handle SIGHUP to reload configuration."""
-    global processes
     if signum == signal.SIGHUP:
         logging.info("Received SIGHUP, reloading configuration...")
         settings.load_config()
-        
+
         # Restart child processes to pick up new configuration
         logging.info("Restarting child processes to apply new configuration...")
-        
-        # Restart back.py
-        try:
-            with open('/tmp/back.pid', 'r') as f:
-                back_pid = int(f.read().strip())
-            os.kill(back_pid, signal.SIGTERM)
-            processes[1] = start_back()  # Restart back.py
-            logging.info("Restarted back.py")
-        except Exception as e:
-            logging.error(f"Failed to restart back.py: {e}")
-        
-        # Restart front.py
-        try:
-            processes[2].terminate()
-            processes[2] = start_front()  # Restart front.py
-            logging.info("Restarted front.py")
-        except Exception as e:
-            logging.error(f"Failed to restart front.py: {e}")
-        
-        # Restart rotate.py
-        try:
-            processes[3].terminate()
-            processes[3] = start_rotate()  # Restart rotate.py
-            logging.info("Restarted rotate.py")
-        except Exception as e:
-            logging.error(f"Failed to restart rotate.py: {e}")
+        for name in ("back.py", "front.py", "rotate.py"):
+            try:
+                restart(name)
+                logging.info(f"Restarted {name}")
+            except Exception as e:
+                logging.error(f"Failed to restart {name}: {e}")
 
 def main():
-    global processes
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [main.py]: %(message)s")
     # Write PID to file
     with open('/tmp/logserver.pid', 'w') as f:
         f.write(str(os.getpid()))
@@ -75,30 +176,22 @@ def main():
     signal.signal(signal.SIGHUP, signal_handler)
     
     try:
-        print("Starting syslog-ng...")
-        processes.append(start_syslog_ng())
-        print("Starting back.py...")
-        processes.append(start_back())
-        print("Starting front.py...")
-        processes.append(start_front())
-        print("Starting rotate.py...")
-        processes.append(start_rotate())
+        for name in STARTERS:
+            print(f"Starting {name}...")
+            start(name)
         print("All services started. Press Ctrl+C to stop.")
-        for p in processes:
-            p.wait()
+        while True:
+            supervise()
+            time.sleep(SUPERVISE_INTERVAL)
     except KeyboardInterrupt:
         print("Shutting down...")
-        for p in processes:
-            p.terminate()
-        for p in processes:
-            p.wait()
     except Exception as e:
         print(f"Error: {e}")
-        for p in processes:
+    finally:
+        for p in processes.values():
             p.terminate()
-        for p in processes:
+        for p in processes.values():
             p.wait()
-    finally:
         # Clean up PID file on exit
         try:
             os.remove('/tmp/logserver.pid')
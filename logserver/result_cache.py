@@ -0,0 +1,84 @@
+"""Byte-bounded LRU cache of per-file archive search results.
+
+Rotated archives never change once rotate.py has written them, so the rows a
+query finds in one of them can be kept in the front process and reused by
+the next page load, refresh or API call with the same query. Keys include
+the archive's (path, size, mtime_ns), so a rewritten archive (converter,
+restore) simply misses; the live log file is never cached. Entries are
+evicted least recently used first once their estimated size exceeds the
+byte budget. Each front worker process has a cache of its own.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Rough per-object overhead of a cached row and of each of its strings
+ROW_OVERHEAD = 120
+VALUE_OVERHEAD = 50
+
+def estimate_size(items, facets):
+    """Approximate memory held by a scan_file result."""
+    size = 0
+    for _, row in items:
+        size += ROW_OVERHEAD + sum(len(value) + VALUE_OVERHEAD for value in row)
+    for values in facets.values():
+        size += sum(len(value) + VALUE_OVERHEAD for value in values)
+    return size
+
+class ResultCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # A forked child keeps the entries, but not a lock another thread
+        # may have held at the fork
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,212 @@
+"""Per-minute line counts by host, facility, level and program.
+
+back.py counts every line it reads from the log file into a Rollup as it is
+ingested, and rotate.py stores the counts of each archive it writes in a
+sidecar (``<archive>.gz.rollup``). Count queries over any range (see
+histogram) then add up these counters instead of reading log lines.
+
+A Rollup maps (host, facility, level, program) to {minute: line count},
+minutes being epoch seconds // 60. Its source, the inode and first ISODATE
+of the log file it counts, goes into the sidecar of the archive made from
+that file, so the live counters of a file that was just rotated are left out
+as soon as its archive has a rollup of its own.
+
+    {"version": 1, "source": "<inode>:<first ISODATE>",
+     "series": [[host, facility, level, program, [minutes], [counts]], ...]}
+"""
+import os
+import json
+import gzip
+import bisect
+import itertools
+import logging
+import threading
+from functools import lru_cache
+import archive_index
+from isodate import IsoDateDecoder
+
+ROLLUP_VERSION = 1
+# (name, column in the 8-field row) of the rollup key
+FIELDS = (("host", 2), ("facility", 3), ("level", 4), ("program", 5))
+# Bytes read from the head of a log file for its first ISODATE
+HEAD_READ_SIZE = 64 * 1024
+
+def rollup_path(gz_path):
+    return gz_path + archive_index.ROLLUP_SUFFIX
+
+def source_id(inode, first_isodate):
+    return f"{inode}:{first_isodate}" if first_isodate else None
+
+def file_source(fd):
+    """Source id of the log file open at fd, from its first dated line like
+    rotate.py's; None while there is none in its first HEAD_READ_SIZE bytes."""
+    lines = os.pread(fd, HEAD_READ_SIZE, 0).split(b"\n")
+    lines.pop()
+    for line in lines:
+        isodate = line.split(b"|", 1)[0].decode("utf-8", "ignore").strip() if b"|" in line else None
+        if isodate:
+            return source_id(os.fstat(fd).st_ino, isodate)
+    return None
+
+class Rollup:
+    """Counters of one log file."""
+
+    def __init__(self, source=None):
+        self.source = source
+        self.series = {}
+        self.lines = 0
+        self.decoder = IsoDateDecoder()
+
+    def add_lines(self, lines):
+        """Count raw log lines (without newline); undated ones are skipped."""
+        series = self.series
+        epoch_of = self.decoder.epoch
+        for line in lines:
+            parts = line.split("|", 6)
+            if len(parts) < 6:
+                continue
+            epoch = epoch_of(parts[0])
+            if epoch is None:
+                continue
+            key = (parts[2], parts[3], parts[4], parts[5])
+            minutes = series.get(key)
+            if minutes is None:
+                minutes = series[key] = {}
+            minute = int(epoch // 60)
+            minutes[minute] = minutes.get(minute, 0) + 1
+            self.lines += 1
+
+    def add_segment(self, seg_no, first_line, lines):
+        """add_lines for the segments of an archive being written."""
+        self.add_lines(lines)
+
+    def write(self, gz_path, index=None):
+        write_rollup(gz_path, self)
+        logging.info(f"Built rollup for {gz_path}: {self.lines} lines, {len(self.series)} series")
+        return self
+
+    def aggregate(self, start_minute, end_minute, filters, group_by, bucket_minutes, out):
+        """Add the counts of [start_minute, end_minute) matching filters
+        ({field: value}) to out: {group value: {bucket number: count}},
+        grouped by the group_by field ("" for everything), buckets counted
+        from start_minute."""
+        positions = [(i, filters[name]) for i, (name, _) in enumerate(FIELDS) if name in filters]
+        group_pos = next((i for i, (name, _) in enumerate(FIELDS) if name == group_by), None)
+        for key, minutes in self.series.items():
+            if any(key[i] != value for i, value in positions):
+                continue
+            buckets = out.setdefault(key[group_pos] if group_pos is not None else "", {})
+            if isinstance(minutes, dict):
+                for minute, count in minutes.items():
+                    if start_minute <= minute < end_minute:
+                        bucket = (minute - start_minute) // bucket_minutes
+                        buckets[bucket] = buckets.get(bucket, 0) + count
+                continue
+            # Sorted minutes and running totals of an archive: a bucket
+            # costs a bisect instead of a step per minute
+            times, totals = minutes
+            lo = bisect.bisect_left(times, start_minute)
+            hi = bisect.bisect_left(times, end_minute)
+            before = totals[lo - 1] if lo else 0
+            while lo < hi:
+                bucket = (times[lo] - start_minute) // bucket_minutes
+                lo = bisect.bisect_left(times, start_minute + (bucket + 1) * bucket_minutes, lo, hi)
+                buckets[bucket] = buckets.get(bucket, 0) + totals[lo - 1] - before
+                before = totals[lo - 1]
+
+    def to_json(self):
+        series = []
+        for key, minutes in self.series.items():
+            times = sorted(minutes)
+            series.append(list(key) + [times, [minutes[m] for m in times]])
+        return {"version": ROLLUP_VERSION, "source": self.source, "series": series}
+
+class LiveRollups:
+    """The Rollups of the log file back.py follows and of the files it
+    followed before, newest last, at most keep of them: a rotated file stays
+    until its archive got its own rollup."""
+
+    def __init__(self, keep=2):
+        self.keep = keep
+        self.rollups = []
+        self.lock = threading.Lock()
+
+    def start_file(self, source=None, replace=False):
+        """Count into a new Rollup from now on and return it. With replace
+        it takes the place of the current one (the file was truncated)."""
+        rollup = Rollup(source)
+        with self.lock:
+            if replace and self.rollups:
+                self.rollups[-1] = rollup
+            else:
+                self.rollups.append(rollup)
+                del self.rollups[:-self.keep]
+        return rollup
+
+    def add_lines(self, rollup, lines):
+        with self.lock:
+            rollup.add_lines(lines)
+
+    def aggregate(self, start_minute, end_minute, filters, group_by, bucket_minutes, exclude=()):
+        """Rollup.aggregate over the live files, leaving out those whose
+        source is in exclude."""
+        out = {}
+        with self.lock:
+            for rollup in self.rollups:
+                if rollup.source is None or rollup.source not in exclude:
+                    rollup.aggregate(start_minute, end_minute, filters, group_by, bucket_minutes, out)
+        return out
+
+def build_rollup(gz_path, source=None):
+    """Count the lines of an archive into its rollup sidecar."""
+    rollup = Rollup(source)
+    for _, lines in archive_index.iter_segments(gz_path):
+        rollup.add_lines(lines)
+    return rollup.write(gz_path)
+
+def write_rollup(gz_path, rollup):
+    tmp_path = rollup_path(gz_path) + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(rollup.to_json(), f, separators=(",", ":"))
+    os.replace(tmp_path, rollup_path(gz_path))
+
+@lru_cache(maxsize=64)
+def _load_rollup(path, mtime_ns):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable rollup {path}: {e}")
+        return None
+    if data.get("version") != ROLLUP_VERSION:
+        return None
+    rollup = Rollup(data.get("source"))
+    rollup.series = {tuple(entry[:4]): (entry[4], list(itertools.accumulate(entry[5]))) for entry in data["series"]}
+    rollup.lines = sum(sum(entry[5]) for entry in data["series"])
+    return rollup
+
+def load_rollup(gz_path):
+    """Return the Rollup of an archive, or None when it has no sidecar."""
+    path = rollup_path(gz_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_rollup(path, mtime_ns)
+
+if __name__ == "__main__":
+    import argparse
+    from settings import ROTATED_LOG_PATTERN
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [rollup.py]: %(message)s")
+    parser = argparse.ArgumentParser(description="Build the rollup sidecars of rotated archives.")
+    parser.add_argument("--missing-only", action="store_true", help="only archives without a rollup")
+    parser.add_argument("archives", nargs="*", help=f"archives to count (default: {ROTATED_LOG_PATTERN})")
+    args = parser.parse_args()
+    for path in args.archives or sorted(archive_index.archive_glob(ROTATED_LOG_PATTERN)):
+        if args.missing_only and load_rollup(path) is not None:
+            continue
+        try:
+            build_rollup(path)
+        except (OSError, EOFError, ValueError) as e:
+            logging.error(f"Failed to build the rollup of {path}: {e}")
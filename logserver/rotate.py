@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 import sys
 import os
+import json
 import time
 import subprocess
-import gzip
-import shutil
 import logging
+import threading
 from datetime import datetime, timedelta
-import glob
 import signal
+from archive_index import compress_archive, remove_archive, CODECS
+from archive_catalog import load_catalog, add_archive, remove_archives
+from text_index import TextIndexBuilder
+from column_index import ColumnIndexBuilder
+from rollup import Rollup, source_id
 
 print("rotate.py: Starting...")  # DEBUG
 
@@ -17,7 +21,9 @@ try:
         LOG_FILE, 
         ROTATED_LOG_PATTERN, ROTATED_LOG_DELETE_OLDEST, ROTATED_LOG_DELETE_MIN_COUNT,
         ROTATED_LOG_TOTAL_MAX_MB, ROTATED_LOG_MAX_DAYS,
-        LOG_ROTATE_MAX_AGE_DAYS, LOG_ROTATE_MAX_SIZE_MB, LOG_ROTATE_CHECK_INTERVAL_SECONDS
+        LOG_ROTATE_MAX_AGE_DAYS, LOG_ROTATE_MAX_SIZE_MB, LOG_ROTATE_CHECK_INTERVAL_SECONDS,
+        ROTATED_LOG_ARCHIVE_FORMAT, ROTATED_LOG_BLOCK_SIZE_KB,
+        ROTATED_LOG_CODEC, ROTATED_LOG_COMPRESS_LEVEL, ROTATED_LOG_COMPRESS_WORKERS
     )
 except Exception as e:
     print(f"rotate.py: Error importing conf.py: {e}")
@@ -29,6 +35,14 @@ logging.basicConfig(
 )
 
 SYSLOG_NG_CTL = "/usr/sbin/syslog-ng-ctl"
+ROTATE_PID_PATH = "/tmp/rotate.pid"
+# Progress of the current or last rotation, read by the files page
+ROTATE_STATUS_PATH = "/tmp/rotate.status"
+# Minimum seconds between two progress updates of the status file
+STATUS_INTERVAL = 0.5
+RUNNING_STATES = ("rotating", "compressing", "indexing")
+
+_rotate_lock = threading.Lock()
 
 def run_cmd(cmd):
     logging.info(f"Running: {' '.join(cmd)}")
@@ -37,25 +51,124 @@ def run_cmd(cmd):
     except Exception as e:
         logging.error(f"Failed to run {' '.join(cmd)}: {e}")
 
+# Bytes read at a time from either end of the log when looking for dates
+EDGE_READ_SIZE = 64 * 1024
+
+# (st_dev, st_ino) -> (size, earliest, latest) of the files looked at
+_isodate_cache = {}
+
+def _line_isodate(line):
+    if b"|" not in line:
+        return None
+    return line.split(b"|", 1)[0].decode("utf-8", "ignore").strip() or None
+
+def _first_isodate(f):
+    """The date of the first dated line, reading forward from the start."""
+    pos = 0
+    pending = b""
+    while True:
+        chunk = os.pread(f.fileno(), EDGE_READ_SIZE, pos)
+        if not chunk:
+            return _line_isodate(pending)
+        pos += len(chunk)
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            isodate = _line_isodate(line)
+            if isodate:
+                return isodate
+
+def _last_isodate(f, size):
+    """The date of the last dated line, reading backwards from size."""
+    pos = size
+    pending = b""
+    while pos > 0:
+        read = min(EDGE_READ_SIZE, pos)
+        pos -= read
+        lines = (os.pread(f.fileno(), read, pos) + pending).split(b"\n")
+        # Unless the start of the file was reached, the first piece may be
+        # the tail of a longer line
+        pending = lines.pop(0) if pos > 0 else b""
+        for line in reversed(lines):
+            isodate = _line_isodate(line)
+            if isodate:
+                return isodate
+    return None
+
 def get_isodate_range_from_log(logfile):
+    """Return the first and last ISODATE of logfile (None, None if it has
+    none). Only the head and the tail of the file are read. The head is read
+    on every call, since the inode of a rotated file is often reused by the
+    next one; the last date is cached per inode while the size and the first
+    date stay the same."""
     if not os.path.exists(logfile):
         logging.warning(f"Log file does not exist: {logfile}")
         return None, None
-    earliest = None
-    latest = None
     try:
-        with open(logfile, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                if "|" in line:
-                    isodate = line.split("|", 1)[0].strip()
-                    if not earliest:
-                        earliest = isodate
-                    latest = isodate
+        with open(logfile, "rb") as f:
+            st = os.fstat(f.fileno())
+            key = (st.st_dev, st.st_ino)
+            earliest = _first_isodate(f)
+            cached = _isodate_cache.get(key)
+            if cached and cached[:2] == (st.st_size, earliest):
+                return earliest, cached[2]
+            latest = _last_isodate(f, st.st_size) if earliest else None
+        if len(_isodate_cache) >= 64:
+            _isodate_cache.clear()
+        _isodate_cache[key] = (st.st_size, earliest, latest)
         return earliest, latest
     except Exception as e:
         logging.error(f"Failed to parse {logfile}: {e}")
         return None, None
 
+def write_status(**status):
+    """Replace the rotation status file with status, plus the pid of the
+    process doing the rotation (this one by default)."""
+    status.setdefault("pid", os.getpid())
+    tmp_path = f"{ROTATE_STATUS_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_path, ROTATE_STATUS_PATH)
+    except OSError as e:
+        logging.warning(f"Could not write rotation status: {e}")
+
+def read_status():
+    """The last rotation status, {"state": "idle"} when there is none. A
+    running state left behind by a process that no longer exists reads as
+    "failed"."""
+    try:
+        with open(ROTATE_STATUS_PATH) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {"state": "idle"}
+    if status.get("state") in RUNNING_STATES:
+        try:
+            os.kill(status["pid"], 0)
+        except (KeyError, TypeError, OSError):
+            status.update(state="failed", error="rotation was interrupted")
+    return status
+
+def request_rotation():
+    """Start a rotation without waiting for it: rotate.py is asked to rotate
+    through SIGUSR1, and when it is not running the rotation runs on a
+    background thread of this process. Returns False if one is already in
+    progress."""
+    if read_status().get("state") in RUNNING_STATES:
+        return False
+    try:
+        with open(ROTATE_PID_PATH) as f:
+            pid = int(f.read().strip())
+        # Shown until rotate.py reports its own progress
+        write_status(state="rotating", started=time.time(), pid=pid)
+        os.kill(pid, signal.SIGUSR1)
+        logging.info(f"Asked rotate.py (PID {pid}) to rotate now")
+    except (OSError, ValueError) as e:
+        logging.info(f"rotate.py not reachable ({e}), rotating in the background")
+        write_status(state="rotating", started=time.time())
+        threading.Thread(target=rotate_log, daemon=True).start()
+    return True
+
 def format_isodate_str(isodate):
     try:
         dt = datetime.fromisoformat(isodate.replace("T", " ").replace("Z", ""))
@@ -64,55 +177,51 @@ def format_isodate_str(isodate):
         s = isodate.replace("T", "_").replace(":", "-").replace(" ", "_")
         return s[:19].replace(":", "-")
 
+def archive_bytes(entry):
+    """Disk space of a catalogued archive and its sidecars."""
+    return entry["size"] + entry["sidecars"]
+
 def delete_oldest_gz_if_needed():
-    pattern = ROTATED_LOG_PATTERN
-    min_count = ROTATED_LOG_DELETE_MIN_COUNT
-    max_mb = ROTATED_LOG_TOTAL_MAX_MB
-    max_days = ROTATED_LOG_MAX_DAYS
-    now = time.time()
-
-    gz_files = sorted(glob.glob(pattern), key=os.path.getmtime)
-    # 1. Delete if count exceeds
-    while len(gz_files) > min_count:
-        oldest = gz_files[0]
-        try:
-            os.remove(oldest)
-            logging.info(f"Deleted oldest rotated log file (count limit): {oldest}")
-        except Exception as e:
-            logging.error(f"Failed to delete {oldest}: {e}")
-        gz_files = sorted(glob.glob(pattern), key=os.path.getmtime)
-
-    # 2. Delete if total size exceeds
-    def total_mb(files):
-        return sum(os.path.getsize(f) for f in files) / (1024*1024)
-    while gz_files and total_mb(gz_files) > max_mb:
-        oldest = gz_files[0]
+    """Delete the oldest archives while there are more than the count limit,
+    they take more than the size limit, or they are older than the age
+    limit. Archives are sized with their sidecars, which are deleted with
+    them. Works on the archive catalog, so every archive is looked at once
+    instead of globbing and statting them all after each deletion."""
+    max_count = ROTATED_LOG_DELETE_MIN_COUNT
+    max_bytes = ROTATED_LOG_TOTAL_MAX_MB * 1024 * 1024
+    cutoff = time.time() - (ROTATED_LOG_MAX_DAYS * 86400)
+
+    archives = load_catalog(ROTATED_LOG_PATTERN)
+    total_bytes = sum(archive_bytes(entry) for entry in archives)
+    kept = []
+    removed = []
+    # Oldest first; all three limits only ever delete a run of the oldest
+    for i, entry in enumerate(archives):
+        if len(kept) + len(archives) - i > max_count:
+            reason = "count limit"
+        elif total_bytes > max_bytes:
+            reason = "size limit"
+        elif entry["mtime"] < cutoff:
+            reason = "age limit"
+        else:
+            kept.extend(archives[i:])
+            break
         try:
-            os.remove(oldest)
-            logging.info(f"Deleted oldest rotated log file (size limit): {oldest}")
+            remove_archive(entry["path"])
+            logging.info(f"Deleted oldest rotated log file ({reason}): {entry['path']}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            logging.error(f"Failed to delete {oldest}: {e}")
-        gz_files = sorted(glob.glob(pattern), key=os.path.getmtime)
-
-    # 3. Delete if file is older than max_days
-    cutoff = now - (max_days * 86400)
-    deleted_due_to_age = False
-    for f in gz_files:
-        mtime = os.path.getmtime(f)
-        if mtime < cutoff:
-            try:
-                os.remove(f)
-                logging.info(f"Deleted rotated log file (age limit): {f}")
-                deleted_due_to_age = True
-            except Exception as e:
-                logging.error(f"Failed to delete {f}: {e}")
-    if deleted_due_to_age:
-        gz_files = sorted(glob.glob(pattern), key=os.path.getmtime)
+            logging.error(f"Failed to delete {entry['path']}: {e}")
+            kept.append(entry)
+            continue
+        removed.append(entry["path"])
+        total_bytes -= archive_bytes(entry)
+    remove_archives(removed, ROTATED_LOG_PATTERN)
 
     # Log the final stats
-    final_count = len(gz_files)
-    final_mb = total_mb(gz_files)
-    logging.info(f"Rotated logs retained: {final_count} files, total {final_mb:.1f} MB")
+    final_mb = sum(archive_bytes(entry) for entry in kept) / (1024 * 1024)
+    logging.info(f"Rotated logs retained: {len(kept)} files, total {final_mb:.1f} MB")
 
 def signal_backpy():
     try:
@@ -124,42 +233,96 @@ def signal_backpy():
         print(f"Could not signal back.py: {e}")
 
 def rotate_log():
+    """Rotate LOG_FILE now, reporting progress in ROTATE_STATUS_PATH. Returns
+    at once when a rotation is already running in this process."""
+    if not _rotate_lock.acquire(blocking=False):
+        logging.info("Rotation already in progress")
+        return
+    try:
+        _rotate_log()
+    finally:
+        _rotate_lock.release()
+
+def _rotate_log():
     earliest, latest = get_isodate_range_from_log(LOG_FILE)
     if not earliest or not latest:
         logging.warning(f"No valid isodate found in {LOG_FILE}, skipping rotation.")
+        write_status(state="skipped", error=f"no valid isodate in {LOG_FILE}", finished=time.time())
         return
     earliest_fmt = format_isodate_str(earliest)
     latest_fmt = format_isodate_str(latest)
     rotated_name = f"{LOG_FILE}.{earliest_fmt}-to-{latest_fmt}"
     logging.info(f"Rotating log: {LOG_FILE} -> {rotated_name}")
+    started = time.time()
+    write_status(state="rotating", file=rotated_name, started=started)
 
     # Step 1: Rename the log file
     try:
         os.rename(LOG_FILE, rotated_name)
         logging.info(f"Renamed {LOG_FILE} to {rotated_name}")
+        # Names the live counters back.py kept for the file (see rollup.py)
+        source = source_id(os.stat(rotated_name).st_ino, earliest)
     except Exception as e:
         logging.error(f"Failed to rename {LOG_FILE}: {e}")
+        write_status(state="failed", file=rotated_name, started=started, finished=time.time(), error=str(e))
         return
 
     # Step 2: syslog-ng-ctl reload, then reopen again
     run_cmd([SYSLOG_NG_CTL, "reopen"])
 
-    # Step 3: gzip the rotated file
-    gz_name = rotated_name + ".gz"
+    # Step 3: compress the rotated file on all cores, with a time index
+    # sidecar for archive search
+    codec = ROTATED_LOG_CODEC if ROTATED_LOG_CODEC in CODECS else "gzip"
+    gz_name = rotated_name + CODECS[codec][0]
+    last_update = 0
+
+    def progress(done, total):
+        nonlocal last_update
+        if time.monotonic() - last_update >= STATUS_INTERVAL or done >= total:
+            last_update = time.monotonic()
+            write_status(state="compressing", file=gz_name, started=started, done=done, total=total)
+
+    # The message and dropdown filter indexes and the per-minute counts are
+    # fed each segment as it is compressed, instead of inflating it again
+    builders = [TextIndexBuilder(), ColumnIndexBuilder(), Rollup(source)]
+
+    def on_segment(seg_no, first_line, lines):
+        for builder in builders:
+            builder.add_segment(seg_no, first_line, lines)
+
+    error = None
+    index = None
     try:
-        with open(rotated_name, 'rb') as f_in, gzip.open(gz_name, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
+        index = compress_archive(rotated_name, gz_name, ROTATED_LOG_ARCHIVE_FORMAT, ROTATED_LOG_BLOCK_SIZE_KB * 1024,
+                         codec, ROTATED_LOG_COMPRESS_LEVEL, ROTATED_LOG_COMPRESS_WORKERS, progress, on_segment)
         os.remove(rotated_name)
-        logging.info(f"Compressed {rotated_name} to {gz_name}")
+        logging.info(f"Compressed {rotated_name} to {gz_name} ({time.time() - started:.1f}s)")
     except Exception as e:
-        logging.error(f"Failed to gzip {rotated_name}: {e}")
+        logging.error(f"Failed to compress {rotated_name}: {e}")
+        error = str(e)
 
-    # Step 4: Optionally delete old logs by count, size, and age
+    # Step 4: Write the search index and rollup sidecars
+    write_status(state="indexing", file=gz_name, started=started)
+    if index is not None:
+        for builder in builders:
+            try:
+                builder.write(gz_name, index)
+            except Exception as e:
+                logging.error(f"Failed to write {type(builder).__name__} sidecar for {gz_name}: {e}")
+    if index is not None:
+        try:
+            add_archive(gz_name, index, ROTATED_LOG_PATTERN)
+        except OSError as e:
+            logging.error(f"Failed to add {gz_name} to the archive catalog: {e}")
+
+    # Step 5: Optionally delete old logs by count, size, and age
     if ROTATED_LOG_DELETE_OLDEST:
         delete_oldest_gz_if_needed()
 
-    # Step 5: Signal back.py to re-open inotify
+    # Step 6: Signal back.py to re-open inotify
     signal_backpy()
+    write_status(state="failed" if error else "done", file=gz_name, started=started, finished=time.time(),
+                 error=error)
 
 def should_rotate(logfile):
     # Check log age (from first ISODATE)
@@ -194,22 +357,28 @@ def main():
     print("rotate.py: Running main loop...")  # DEBUG
     
     # Write PID to file
-    with open('/tmp/rotate.pid', 'w') as f:
+    with open(ROTATE_PID_PATH, 'w') as f:
         f.write(str(os.getpid()))
-    
+
+    # The files page asks for an immediate rotation through SIGUSR1
+    rotate_requested = threading.Event()
+    signal.signal(signal.SIGUSR1, lambda signum, frame: rotate_requested.set())
+
     logging.info(f"Checking log for rotation every {LOG_ROTATE_CHECK_INTERVAL_SECONDS} seconds.")
     while True:
         try:
-            if os.path.exists(LOG_FILE) and should_rotate(LOG_FILE):
+            if rotate_requested.is_set() or (os.path.exists(LOG_FILE) and should_rotate(LOG_FILE)):
+                # A request that comes in meanwhile is served by this rotation
+                rotate_requested.clear()
                 rotate_log()
             else:
-                time.sleep(LOG_ROTATE_CHECK_INTERVAL_SECONDS)
+                rotate_requested.wait(LOG_ROTATE_CHECK_INTERVAL_SECONDS)
         except KeyboardInterrupt:
             print("rotate.py: Received keyboard interrupt, exiting...")
             break
         except Exception as e:
             logging.error(f"Error in main loop: {e}")
-            time.sleep(LOG_ROTATE_CHECK_INTERVAL_SECONDS)
+            rotate_requested.wait(LOG_ROTATE_CHECK_INTERVAL_SECONDS)
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,26 @@
 from flask import request, render_template, session, redirect, url_for, jsonify
 import logging
 import os
-import glob
 from settings import (
     LOG_FILE, ROTATED_LOG_PATTERN, NUM_LINES_OPTIONS, DEFAULT_NUM_LINES,
-    LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD
+    LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD, ARCHIVE_SCAN_WORKERS, ARCHIVE_RESULT_CACHE_MB, FRONT_WORKERS
 )
-import gzip
+import threading
+import heapq
+import itertools
+import json
+import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
-from back import fetch_log_array
-from utils import is_authenticated, get_unique_values, parse_log_date
+from back_client import fetch_log_array
+from utils import is_authenticated, get_unique_values
+import archive_index
+from archive_catalog import load_catalog
+from result_cache import ResultCache, estimate_size
+from text_index import MessageQuery
+import column_index
+from isodate import IsoDateDecoder
 import pytz
 import re
 
@@ -56,34 +67,30 @@ def get_file_date_range(filename):
             return None
     
     # If no date range found, check if it's the current log file
-    if filename.endswith('messages') and not filename.endswith('.gz'):
+    if filename.endswith('messages') and not archive_index.is_archive(filename):
         return None
     
     return None
 
 def find_relevant_log_files(start_date_utc, end_date_utc):
-    """Find log files that might contain entries within the date range."""
-    log_dir = os.path.dirname(LOG_FILE)
-    log_base = os.path.basename(LOG_FILE)
-    pattern = os.path.join(log_dir, f"{log_base}*")
-    all_files = sorted(glob.glob(pattern))
-    
-    relevant_files = []
-    for file_path in all_files:
-        filename = os.path.basename(file_path)
-        
-        # Always include the current messages file
-        if filename == "messages":
-            relevant_files.append(file_path)
-            continue
-            
-        # For rotated files, check if they might contain relevant dates
-        if not filename.endswith('.gz'):
+    """Find log files that might contain entries within the date range: the
+    current log file, and the archives whose catalog entry overlaps it."""
+    start_ts = archive_index.datetime_to_epoch(start_date_utc)
+    end_ts = archive_index.datetime_to_epoch(end_date_utc)
+
+    # Always include the current messages file
+    relevant_files = [LOG_FILE] if os.path.exists(LOG_FILE) else []
+    for entry in load_catalog(ROTATED_LOG_PATTERN):
+        # The time index has the exact UTC bounds of the archive
+        if entry["lines"] is not None:
+            if entry["first"] is not None and entry["first"] <= end_ts and entry["last"] >= start_ts:
+                relevant_files.append(entry["path"])
             continue
-            
+
         # Extract dates from filename like messages.2025-06-09_12-10-21-to-2025-06-09_23-48-40.gz
+        filename = entry["name"]
         try:
-            date_part = filename.split('.', 1)[1].replace('.gz', '')
+            date_part = archive_index.strip_archive_suffix(filename).split('.', 1)[1]
             start_str, end_str = date_part.split('-to-')
             
             # Convert filename dates to datetime objects
@@ -92,70 +99,750 @@ def find_relevant_log_files(start_date_utc, end_date_utc):
             
             # Check if date ranges overlap
             if file_start <= end_date_utc and file_end >= start_date_utc:
-                relevant_files.append(file_path)
+                relevant_files.append(entry["path"])
         except Exception as e:
             logging.error(f"Error parsing dates from filename {filename}: {e}")
             # If we can't parse the dates, include the file to be safe
-            relevant_files.append(file_path)
+            relevant_files.append(entry["path"])
     
-    return relevant_files
+    return sorted(relevant_files)
 
-def parse_log_file_lines(filepath, start_date=None, end_date=None):
-    rows = []
-    open_fn = gzip.open if filepath.endswith('.gz') else open
-    try:
-        with open_fn(filepath, 'rt', encoding="utf-8", errors="ignore") as f:
+FACET_COLUMNS = (2, 3, 4, 5, 6)
+# Lines read at a time from files without a time index
+UNINDEXED_CHUNK_LINES = 10000
+# Bytes read at a time when reading a plain log file backwards
+UNINDEXED_BLOCK_SIZE = 1024 * 1024
+# Seconds a line of a log file without time index may be dated after lines
+# written later (skewed sender clocks) before a newest-first read misses it
+UNINDEXED_CLOCK_SKEW = 300
+
+def new_scan_stats():
+    return {
+        "rows_in_range": 0,
+        "files_skipped_early": 0,
+        "files_skipped_members": 0,
+        "files_cached": 0,
+        "segments_read": 0,
+        "segments_skipped_text": 0,
+        "segments_skipped_columns": 0,
+        "segments_skipped_early": 0,
+        "text_candidates": 0,
+        "text_false_positives": 0,
+    }
+
+def text_false_positive_rate(stats):
+    if not stats["text_candidates"]:
+        return 0.0
+    return stats["text_false_positives"] / stats["text_candidates"]
+
+class TopRows:
+    """The newest `limit` rows seen so far (the oldest ones with oldest set),
+    kept in a heap on a (UTC epoch, file rank, line number) key, or every row
+    when limit is None. Rows whose (epoch, line number) is not strictly
+    between low and high are dropped on arrival."""
+
+    def __init__(self, limit=None, low=None, high=None, rank=0, oldest=False):
+        self.limit = limit
+        self.low = low
+        self.high = high
+        self.rank = rank
+        self.oldest = oldest
+        # Heap keys are negated when keeping the oldest rows
+        self.sign = -1 if oldest else 1
+        self.heap = []
+
+    def epoch_range(self):
+        return (None if self.low is None else self.low[0], None if self.high is None else self.high[0])
+
+    def cutoff(self):
+        """Epoch below which (above which with oldest set) a row can no
+        longer make it in, or None."""
+        edge = self.epoch_range()[1 if self.oldest else 0]
+        if self.limit is not None and len(self.heap) >= self.limit:
+            worst = self.sign * self.heap[0][0][0]
+            if edge is None:
+                return worst
+            return min(worst, edge) if self.oldest else max(worst, edge)
+        return edge
+
+    def push(self, epoch, line_no, row):
+        if self.low is not None and (epoch, line_no) <= self.low:
+            return
+        if self.high is not None and (epoch, line_no) >= self.high:
+            return
+        sign = self.sign
+        item = ((sign * epoch, sign * self.rank, sign * line_no), row)
+        if self.limit is None:
+            self.heap.append(item)
+        elif len(self.heap) < self.limit:
+            heapq.heappush(self.heap, item)
+        elif item[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, item)
+
+    def items(self):
+        """(key, row) pairs, oldest first."""
+        sign = self.sign
+        items = [((sign * epoch, sign * rank, sign * line_no), row) for (epoch, rank, line_no), row in self.heap]
+        return sorted(items, key=lambda item: item[0])
+
+    def rows(self):
+        return [row for _, row in self.items()]
+
+# Files without a time index only grow until they are rotated away: their
+# lines are counted once per (path, inode, naive timezone) into per-second
+# counters, which then answer any range. Each entry is an UnindexedCounts.
+_unindexed_counts = {}
+UNINDEXED_COUNTS_MAX = 16
+
+def in_range_test(start_ts, end_ts, end_inclusive=False):
+    low = float("-inf") if start_ts is None else start_ts
+    high = float("inf") if end_ts is None else end_ts
+    if end_inclusive:
+        return lambda epoch: low <= epoch <= high
+    return lambda epoch: low <= epoch < high
+
+class UnindexedCounts:
+    """Lines of the first `counted` bytes of a file without time index, by
+    minute: {minute: line count}, and per minute the counts of each second
+    and the epochs of the lines dated with fractional seconds, for the
+    minutes a range bound falls in."""
+
+    def __init__(self, mtime_ns=None):
+        self.counted = 0
+        self.mtime_ns = mtime_ns
+        self.totals = {}
+        self.seconds = {}
+        self.fractional = {}
+
+    def add(self, epoch):
+        second = int(epoch // 1)
+        minute = second // 60
+        if minute not in self.totals:
+            self.totals[minute] = 0
+            self.seconds[minute] = [0] * 60
+        self.totals[minute] += 1
+        if second == epoch:
+            self.seconds[minute][second % 60] += 1
+        else:
+            self.fractional.setdefault(minute, []).append(epoch)
+
+    def rows(self, start_ts, end_ts, end_inclusive=False):
+        in_range = in_range_test(start_ts, end_ts, end_inclusive)
+        rows = 0
+        # Only the minutes of the bounds can be partly in range
+        edges = {int(ts // 60) for ts in (start_ts, end_ts) if ts is not None}
+        for minute, total in self.totals.items():
+            first = minute * 60
+            if minute in edges:
+                rows += sum(n for k, n in enumerate(self.seconds[minute]) if n and in_range(first + k))
+                rows += sum(1 for epoch in self.fractional.get(minute, ()) if in_range(epoch))
+            elif in_range(first):
+                rows += total
+        return rows
+
+def count_rows(file_path, start_ts, end_ts, decoder, end_inclusive=False):
+    """Exact number of lines of a file dated in [start_ts, end_ts) (or
+    [start_ts, end_ts] with end_inclusive), whatever a query then reads of it.
+
+    Indexed archives add up the line counts of the segments entirely in range
+    and only decode the segments straddling a bound. Other files are counted
+    per second (see UnindexedCounts) in full once, and after that only what
+    was appended to them since, whatever the range."""
+    in_range = in_range_test(start_ts, end_ts, end_inclusive)
+    index = archive_index.load_index(file_path) if archive_index.is_archive(file_path) else None
+    if index is not None:
+        segments = index["segments"]
+        rows = 0
+        edges = set()
+        for seg_no, _, _ in archive_index.overlapping_segments(index, os.path.getsize(file_path), start_ts, end_ts):
+            lo, hi = segments[seg_no][2], segments[seg_no][3]
+            # hi is one past the newest second in the segment
+            if (start_ts is None or lo >= start_ts) and (end_ts is None or hi <= end_ts):
+                rows += archive_index.segment_line_count(index, seg_no)
+            else:
+                edges.add(seg_no)
+        if edges:
+            for _, lines in archive_index.iter_segments(file_path, start_ts, end_ts, allowed=edges, index=index):
+                rows += sum(1 for line in lines if _line_in_range(line, decoder, in_range))
+        return rows
+
+    st = os.stat(file_path)
+    compressed = archive_index.archive_codec(file_path) is not None
+    key = (file_path, st.st_ino, decoder.naive_tz)
+    counts = _unindexed_counts.get(key)
+    if counts is None or st.st_size < counts.counted or \
+            (compressed and (st.st_size, st.st_mtime_ns) != (counts.counted, counts.mtime_ns)):
+        if len(_unindexed_counts) >= UNINDEXED_COUNTS_MAX:
+            _unindexed_counts.clear()
+        counts = _unindexed_counts[key] = UnindexedCounts(st.st_mtime_ns if compressed else None)
+    if compressed:
+        if not counts.counted:
+            with archive_index.open_archive(file_path) as f:
+                for line in f:
+                    epoch = _line_epoch(line, decoder)
+                    if epoch is not None:
+                        counts.add(epoch)
+            counts.counted = st.st_size
+    elif st.st_size > counts.counted:
+        with open(file_path, 'rb') as f:
+            f.seek(counts.counted)
             for line in f:
-                if "|" in line:
-                    isodate = line.split("|", 1)[0].strip()
-                    try:
-                        dt = datetime.fromisoformat(isodate.replace("Z", "+00:00"))
-                        if dt.tzinfo is not None:
-                            dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
-                        line_dt = dt
-                    except Exception:
-                        continue
-                    if start_date and line_dt < start_date:
-                        continue
-                    if end_date and line_dt >= end_date:
-                        continue
-                    rows.append(line.strip().split("|"))
-    except Exception as e:
-        logging.error(f"Failed to parse archive file {filepath}: {e}")
-    return rows
+                # A line still being written is counted once it is complete
+                if not line.endswith(b"\n"):
+                    break
+                counts.counted += len(line)
+                epoch = _line_epoch(line.decode("utf-8", "ignore"), decoder)
+                if epoch is not None:
+                    counts.add(epoch)
+    return counts.rows(start_ts, end_ts, end_inclusive)
 
-def read_log_file(file_path, start_date_utc, end_date_utc, local_tz, utc):
-    """Read and filter log entries from a single file."""
-    rows = []
-    open_fn = gzip.open if file_path.endswith('.gz') else open
-    
+def _line_epoch(line, decoder):
+    bar = line.find("|")
+    return decoder.epoch(line[:bar]) if bar >= 0 else None
+
+def _line_in_range(line, decoder, in_range):
+    epoch = _line_epoch(line, decoder)
+    return epoch is not None and in_range(epoch)
+
+def plan_segments(file_path, start_ts, end_ts, msg_query=None, stats=None, field_filters=None, facets=None):
+    """Work out which segments of an indexed archive a query has to read.
+
+    The text index drops segments that cannot match the message query and the
+    column index drops segments without a row matching field_filters
+    ({column: value}). Dropdown values are added to facets straight from the
+    column index; rows in range are counted by count_rows.
+    Returns (index, allowed segments, row bitmap or None, text_pruned,
+    has_columns), or None for files without an index."""
+    if stats is None:
+        stats = new_scan_stats()
+    index = archive_index.load_index(file_path) if archive_index.is_archive(file_path) else None
+    if index is None:
+        return None
+
+    in_range = archive_index.overlapping_segments(index, os.path.getsize(file_path), start_ts, end_ts)
+    allowed = {seg[0] for seg in in_range}
+
+    text_pruned = False
+    if msg_query is not None:
+        candidates = msg_query.candidate_segments(file_path)
+        if candidates is not None:
+            text_pruned = True
+            stats["segments_skipped_text"] += len(allowed - candidates)
+            allowed &= candidates
+
+    columns = column_index.load_columns(file_path) if facets is not None or field_filters else None
+    row_bits = None
+    if columns is not None:
+        if facets is not None:
+            column_index.add_facets(columns, sum(1 << seg[0] for seg in in_range), facets)
+        if field_filters:
+            seg_bits, row_bits = column_index.select_rows(columns, field_filters)
+            selected = {i for i in allowed if seg_bits >> i & 1}
+            stats["segments_skipped_columns"] += len(allowed - selected)
+            allowed = selected
+    return index, allowed, row_bits, text_pruned, columns is not None
+
+def scan_segments(file_path, start_ts, end_ts, msg_query=None, stats=None, field_filters=None, facets=None,
+                  reverse=False, cutoff=None, within=(None, None)):
+    """Yield (segment number, line numbers, lines, text_pruned,
+    collect_facets) for the segments of a log file a query has to read (see
+    plan_segments). Line numbers count from the start of the file (byte
+    offsets of the lines in plain files without index). With a column index
+    the lines are already narrowed down to the rows matching field_filters;
+    collect_facets tells the caller to gather dropdown values itself.
+
+    Only segments overlapping the within (low, high) epochs are read, while
+    dropdown values still cover [start_ts, end_ts]. When
+    reverse is set segments come newest first, and reading stops once no
+    remaining segment holds a line at or after cutoff() (at or before it
+    when reading forward)."""
+    if stats is None:
+        stats = new_scan_stats()
+    plan = plan_segments(file_path, start_ts, end_ts, msg_query, stats, field_filters, facets)
+    if plan is None:
+        stats["segments_read"] += 1
+        if archive_index.archive_codec(file_path) is None:
+            yield from _plain_chunks(file_path, reverse, cutoff)
+            return
+        # Compressed files cannot be read backwards: read forward in chunks,
+        # so the whole file is never held in memory, whatever the order
+        with archive_index.open_archive(file_path) as f:
+            line_no = 0
+            while True:
+                lines = [line.rstrip('\n') for line in itertools.islice(f, UNINDEXED_CHUNK_LINES)]
+                if not lines:
+                    return
+                yield None, range(line_no, line_no + len(lines)), lines, False, True
+                line_no += len(lines)
+    index, allowed, row_bits, text_pruned, has_columns = plan
+    segments = index["segments"]
+
+    low, high = within
+    outside = {i for i in allowed if (low is not None and segments[i][3] < low)
+               or (high is not None and segments[i][2] > high)}
+    stats["segments_skipped_early"] += len(outside)
+    allowed -= outside
+
+    # Newest line any segment up to this one can hold, or oldest line any
+    # segment from this one on can hold when reading forward
+    reach = {}
+    edge = None
+    for seg_no in sorted(allowed, reverse=not reverse):
+        bound = segments[seg_no][3] if reverse else segments[seg_no][2]
+        edge = bound if edge is None else (max(edge, bound) if reverse else min(edge, bound))
+        reach[seg_no] = edge
+
+    remaining = len(allowed)
+    for seg_no, lines in archive_index.iter_segments(file_path, start_ts, end_ts, reverse, allowed, index):
+        if cutoff is not None:
+            limit_ts = cutoff()
+            if limit_ts is not None and (reach[seg_no] < limit_ts if reverse else reach[seg_no] > limit_ts):
+                stats["segments_skipped_early"] += remaining
+                break
+        remaining -= 1
+        stats["segments_read"] += 1
+        first = segments[seg_no][1]
+        if row_bits is not None:
+            offsets = [k for k in column_index.segment_rows(index, seg_no, row_bits) if k < len(lines)]
+            if reverse:
+                # Reversed segments come newest line first
+                offsets.reverse()
+                lines = [lines[len(lines) - 1 - k] for k in offsets]
+            else:
+                lines = [lines[k] for k in offsets]
+            line_nos = [first + k for k in offsets]
+        else:
+            line_nos = range(first + len(lines) - 1, first - 1, -1) if reverse else range(first, first + len(lines))
+        yield seg_no, line_nos, lines, text_pruned, not has_columns
+
+def _plain_chunks(file_path, reverse=False, cutoff=None):
+    """scan_segments for a plain file without time index (the live log
+    file): chunks of lines numbered by the byte offset they start at, so
+    both directions number them the same. Read forward UNINDEXED_CHUNK_LINES
+    at a time, or backwards in UNINDEXED_BLOCK_SIZE blocks (newest line
+    first), stopping once a block starts more than UNINDEXED_CLOCK_SKEW
+    before cutoff()."""
+    with open(file_path, 'rb') as f:
+        if not reverse:
+            offset = 0
+            while True:
+                chunk = list(itertools.islice(f, UNINDEXED_CHUNK_LINES))
+                if not chunk:
+                    return
+                offsets = []
+                for line in chunk:
+                    offsets.append(offset)
+                    offset += len(line)
+                yield None, offsets, [line.rstrip(b"\n").decode("utf-8", "ignore") for line in chunk], False, True
+
+        decoder = IsoDateDecoder()
+        pos = os.fstat(f.fileno()).st_size
+        tail = b""
+        while pos > 0:
+            size = min(UNINDEXED_BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            data = f.read(size) + tail
+            if pos > 0:
+                # The first line of the block may start in the previous one
+                cut = data.find(b"\n") + 1
+                if not cut:
+                    tail = data
+                    continue
+                tail, data = data[:cut], data[cut:]
+            else:
+                tail, cut = b"", 0
+            raw = data.split(b"\n")
+            if raw[-1] == b"":
+                raw.pop()
+            offsets = []
+            offset = pos + cut
+            for line in raw:
+                offsets.append(offset)
+                offset += len(line) + 1
+            lines = [line.decode("utf-8", "ignore") for line in raw]
+            offsets.reverse()
+            lines.reverse()
+            yield None, offsets, lines, False, True
+            if cutoff is not None:
+                limit_ts = cutoff()
+                # Lines come newest first: look for the oldest dated one
+                oldest = None
+                for line in reversed(lines):
+                    oldest = _line_epoch(line, decoder)
+                    if oldest is not None:
+                        break
+                if limit_ts is not None and oldest is not None and oldest < limit_ts - UNINDEXED_CLOCK_SKEW:
+                    return
+
+def match_fields(parts, field_filters, facets=None):
+    """Check a row against field_filters, adding its values to facets first."""
+    if facets is not None:
+        for col in FACET_COLUMNS:
+            if parts[col]:
+                facets.setdefault(col, set()).add(parts[col])
+    if field_filters:
+        for col, value in field_filters.items():
+            if parts[col] != value:
+                return False
+    return True
+
+def count_text_candidate(stats, text_pruned, in_range, matched):
+    """A candidate segment is a false positive when it had rows in range but
+    none of them matched the message query."""
+    if text_pruned and in_range:
+        stats["text_candidates"] += 1
+        if not matched:
+            stats["text_false_positives"] += 1
+
+def match_rows(file_path, start_ts, end_ts, decoder, msg_query=None, stats=None, field_filters=None, facets=None,
+               end_inclusive=False, reverse=False, cutoff=None, within=(None, None)):
+    """Yield (epoch, line number, row) for the rows of a file dated in
+    [start_ts, end_ts) (or [start_ts, end_ts] with end_inclusive) that match
+    the filters, segment by segment as scan_segments reads them. Timestamps
+    are only decoded to epochs, and lines out of range are dropped before
+    they get split. Rows in range are counted into stats when it is given."""
+    if stats is None:
+        stats = new_scan_stats()
+    else:
+        stats["rows_in_range"] += count_rows(file_path, start_ts, end_ts, decoder, end_inclusive)
+    low = float("-inf") if start_ts is None else start_ts
+    high = float("inf") if end_ts is None else end_ts
+    for seg_no, line_nos, lines, text_pruned, collect_facets in scan_segments(
+            file_path, start_ts, end_ts, msg_query, stats, field_filters, facets, reverse, cutoff, within):
+        in_range = matched = 0
+        for line_no, line in zip(line_nos, lines):
+            bar = line.find("|")
+            if bar < 0:
+                continue
+            epoch = decoder.epoch(line[:bar])
+            if epoch is None or epoch < low or epoch > high or (epoch == high and not end_inclusive):
+                continue
+            row = line.split("|", 7)
+            while len(row) < 8:
+                row.append("")
+            if not match_fields(row, field_filters, facets if collect_facets else None):
+                continue
+            in_range += 1
+            if msg_query is not None and not msg_query.matches(row[7]):
+                continue
+            matched += 1
+            yield epoch, line_no, row
+        count_text_candidate(stats, text_pruned, in_range, matched)
+
+def scan_rows(file_path, start_ts, end_ts, decoder, msg_query=None, stats=None, field_filters=None, facets=None,
+              top=None, end_inclusive=False, row_type=list, count_only=False):
+    """Push the rows of a file dated in [start_ts, end_ts) (or [start_ts,
+    end_ts] with end_inclusive) that match the filters into top and return
+    its rows, oldest first. Timestamps are only decoded to epochs, and lines
+    out of range are dropped before they get split.
+
+    With a bounded top only its newest rows are kept and the file is read
+    newest segment first (oldest rows and oldest segment first when top
+    keeps the oldest ones).
+
+    With count_only nothing is read beyond the row count (see count_rows)
+    and the dropdown values a column index holds: for files a search skips."""
+    if count_only:
+        if stats is not None:
+            stats["rows_in_range"] += count_rows(file_path, start_ts, end_ts, decoder, end_inclusive)
+        plan_segments(file_path, start_ts, end_ts, stats=stats, facets=facets)
+        return []
+    if top is None:
+        top = TopRows()
+    reverse = top.limit is not None and not top.oldest
+    cutoff = top.cutoff if top.limit is not None else None
     try:
-        with open_fn(file_path, 'rt', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                if "|" in line:
-                    try:
-                        parts = line.rstrip('\n').split('|', 7)
-                        while len(parts) < 8:
-                            parts.append("")
-                        
-                        # Parse log date and convert to UTC if needed
-                        log_date = parse_log_date(parts[0])
-                        if log_date.tzinfo is None:
-                            # If date is naive, assume it's in local time and convert to UTC
-                            log_date = local_tz.localize(log_date).astimezone(utc)
-                        else:
-                            # If date already has timezone, just convert to UTC
-                            log_date = log_date.astimezone(utc)
-                        
-                        # Check if date is in range
-                        if start_date_utc <= log_date <= end_date_utc:
-                            rows.append(tuple(parts))
-                    except ValueError as e:
-                        logging.error(f"Error parsing log line: {e}")
-                        continue
+        for epoch, line_no, row in match_rows(file_path, start_ts, end_ts, decoder, msg_query, stats, field_filters,
+                                              facets, end_inclusive, reverse, cutoff, top.epoch_range()):
+            top.push(epoch, line_no, row_type(row))
     except Exception as e:
         logging.error(f"Error reading log file {file_path}: {e}")
-    return rows
+    return top.rows()
+
+def parse_log_file_lines(filepath, start_date=None, end_date=None, msg_query=None, stats=None,
+                         field_filters=None, facets=None, top=None, count_only=False):
+    """Rows (lists) of a file in [start_date, end_date) matching the filters,
+    oldest first. Bounds and naive log dates are taken as UTC."""
+    return scan_rows(filepath, archive_index.datetime_to_epoch(start_date), archive_index.datetime_to_epoch(end_date),
+                     IsoDateDecoder(timezone.utc), msg_query, stats, field_filters, facets, top,
+                     count_only=count_only)
+
+def read_log_file(file_path, start_date_utc, end_date_utc, local_tz, utc, msg_query=None, stats=None,
+                  field_filters=None, facets=None, top=None, count_only=False):
+    """Read and filter log entries from a single file.
+    Only rows (tuples) in [start_date_utc, end_date_utc] matching
+    field_filters ({column: value}) and msg_query are returned, oldest first;
+    the values of every row in range are added to facets. Naive log dates are
+    taken as local_tz."""
+    return scan_rows(file_path, archive_index.datetime_to_epoch(start_date_utc),
+                     archive_index.datetime_to_epoch(end_date_utc), IsoDateDecoder(local_tz), msg_query, stats,
+                     field_filters, facets, top, end_inclusive=True, row_type=tuple, count_only=count_only)
+
+_scan_pool = None
+_scan_pool_pid = None
+_scan_pool_lock = threading.Lock()
+
+# Most scan workers archive_workers = 0 starts per front process
+SCAN_WORKERS_AUTO_MAX = 4
+
+def scan_worker_count():
+    if ARCHIVE_SCAN_WORKERS > 0:
+        return ARCHIVE_SCAN_WORKERS
+    # Every front worker process has a pool of its own: with fewer cores than
+    # front workers there is no pool, scans run sequentially
+    return max(1, min(SCAN_WORKERS_AUTO_MAX, (os.cpu_count() or 1) // max(1, FRONT_WORKERS)))
+
+def get_scan_pool():
+    """Process pool shared by all archive searches of this front process.
+    Workers come from a forkserver so they do not inherit Flask's threads; a
+    forked front process starts its own instead of using its parent's."""
+    global _scan_pool, _scan_pool_pid
+    with _scan_pool_lock:
+        if _scan_pool is None or _scan_pool_pid != os.getpid():
+            workers = scan_worker_count()
+            logging.info(f"Starting archive scan pool with {workers} workers")
+            _scan_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+            _scan_pool_pid = os.getpid()
+        return _scan_pool
+
+def file_upper_bound(file_path):
+    """Newest epoch a log file can hold, used to scan files newest first."""
+    if archive_index.is_archive(file_path):
+        index = archive_index.load_index(file_path)
+        if index is not None:
+            return index["last"] if index["last"] is not None else float("-inf")
+        date_range = get_file_date_range(os.path.basename(file_path))
+        if date_range:
+            # Filename dates are wall-clock time in the log's own offset
+            return date_range[1].replace(tzinfo=timezone.utc).timestamp() + 14 * 3600 + 1
+    return float("inf")
+
+def file_lower_bound(file_path):
+    """Oldest epoch a log file can hold, used to scan files oldest first."""
+    if archive_index.is_archive(file_path):
+        index = archive_index.load_index(file_path)
+        if index is not None:
+            return index["first"] if index["first"] is not None else float("inf")
+        date_range = get_file_date_range(os.path.basename(file_path))
+        if date_range:
+            return date_range[0].replace(tzinfo=timezone.utc).timestamp() - 14 * 3600 - 1
+    return float("-inf")
+
+def encode_cursor(name, line_no, epoch):
+    """Opaque page cursor for the row at line line_no of log file name."""
+    data = json.dumps([name, line_no, epoch], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """(file name, line number, epoch) of a page cursor, ValueError when it
+    is not one."""
+    try:
+        name, line_no, epoch = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(name, str) or not isinstance(line_no, int) or not isinstance(epoch, (int, float)):
+        raise ValueError("Invalid cursor")
+    return name, line_no, epoch
+
+def scan_file(reader, file_path, date_args, msg_query, field_filters, limit=None, low=None, high=None, rank=0,
+              collect_facets=True, oldest=False):
+    """Run reader on one file and return (items, stats, facets), items being
+    TopRows (key, row) pairs. Runs in a scan pool worker, so only the
+    matching rows travel back to the front process."""
+    stats = new_scan_stats()
+    facets = {} if collect_facets else None
+    top = TopRows(limit, low, high, rank, oldest)
+    reader(file_path, *date_args, msg_query=msg_query, stats=stats, field_filters=field_filters,
+           facets=facets, top=top)
+    return top.items(), stats, facets or {}
+
+_result_cache = ResultCache(ARCHIVE_RESULT_CACHE_MB * 1024 * 1024)
+
+def result_cache_key(reader, file_path, date_args, msg_query, field_filters, limit, low, high, rank, collect_facets,
+                     oldest):
+    """Cache key of a scan_file task, None when its result must not be
+    cached: the live log file, or the cache is disabled. The rank is left
+    out, scan_files sets it when merging."""
+    if not ARCHIVE_RESULT_CACHE_MB or not archive_index.is_archive(file_path):
+        return None
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (file_path, st.st_size, st.st_mtime_ns, reader.__name__, date_args,
+            msg_query.key if msg_query is not None else None, tuple(sorted(field_filters.items())), limit, low, high,
+            collect_facets, oldest)
+
+def files_without_members(files, field_filters):
+    """The archives whose catalog entry shows that they hold no row for the
+    host or program of field_filters."""
+    members = {entry["path"]: entry["members"] for entry in load_catalog(ROTATED_LOG_PATTERN)}
+    return {f for f in files if not column_index.may_contain(members.get(f), field_filters)}
+
+def cursor_bounds(cursor, cursor_rank, rank, newer):
+    """(low, high) TopRows bounds of the file with rank for the rows older
+    than cursor (newer than it with newer set). Rows of the cursor's own
+    second go by file rank, then line number, as in TopRows keys."""
+    name, line_no, epoch = cursor
+    if rank == cursor_rank:
+        bound = (epoch, line_no)
+    elif cursor_rank is not None and (rank < cursor_rank) != newer:
+        # Rows of this second all come before (after) the cursor row
+        bound = (epoch, float("inf") if not newer else float("-inf"))
+    else:
+        bound = (epoch, float("-inf") if not newer else float("inf"))
+    return (bound, None) if newer else (None, bound)
+
+def scan_files(reader, files, date_args, msg_query, field_filters, limit=None, collect_facets=True, cursor=None,
+               newer=False):
+    """Scan files with reader (read_log_file or parse_log_file_lines) and
+    return (rows oldest first, summed stats, merged facets, cursors).
+
+    Archives whose catalog entry shows that they hold no row for the host or
+    program of field_filters are dropped first. The other files are scanned
+    newest first, one file per scan pool task when more than one worker is
+    configured, and their rows are merged into a single TopRows bounded by
+    limit. Once it is full, files that cannot hold a newer row are not read
+    at all. Files left out either way still add their dropdown values (with
+    collect_facets) and row counts from their index. Archive results are
+    reused from the result cache when the same query ran before.
+
+    With a cursor (see decode_cursor) only the rows older than its row are
+    returned, or the rows newer than it with newer set; newer without a
+    cursor pages from the start of the range. Newer pages keep the oldest
+    limit rows and scan files and segments oldest first. Segments entirely
+    on the far side of the cursor are never read, so every page costs about
+    the same however deep into the range it is. cursors holds the "older"
+    and "newer" cursors of the neighbouring pages, None where there are no
+    more rows. Cursors are exact while the files stay the same; a rotation
+    in between can repeat or skip rows of the cursor's second."""
+    stats = new_scan_stats()
+    facets = {}
+    # Ranks come from the full file list, so they are the same for every
+    # page of a search whatever the filters drop
+    upper = {f: file_upper_bound(f) for f in files}
+    by_rank = sorted(files, key=upper.get)
+    ranks = {f: i + 1 for i, f in enumerate(by_rank)}
+    cursor_rank = None
+    if cursor is not None:
+        cursor_rank = next((ranks[f] for f in files if os.path.basename(f) == cursor[0]), None)
+    if field_filters:
+        excluded = files_without_members(files, field_filters)
+        for f in excluded:
+            reader(f, *date_args, stats=stats, facets=facets if collect_facets else None, count_only=True)
+        stats["files_skipped_members"] = len(excluded)
+        files = [f for f in files if f not in excluded]
+    if newer:
+        bounds = {f: file_lower_bound(f) for f in files}
+        ordered = sorted(files, key=bounds.get)
+    else:
+        bounds = upper
+        ordered = sorted(files, key=bounds.get, reverse=True)
+    workers = scan_worker_count() if len(files) > 1 else 1
+
+    top = TopRows(limit, oldest=newer)
+    pending = ordered
+    while pending:
+        cutoff = top.cutoff()
+        if cutoff is not None and (bounds[pending[0]] > cutoff if newer else bounds[pending[0]] < cutoff):
+            for f in pending:
+                reader(f, *date_args, stats=stats, facets=facets if collect_facets else None, count_only=True)
+            stats["files_skipped_early"] += len(pending)
+            break
+        wave, pending = pending[:workers], pending[workers:]
+        tasks = []
+        for f in wave:
+            low, high = cursor_bounds(cursor, cursor_rank, ranks[f], newer) if cursor else (None, None)
+            if cutoff is not None:
+                if newer:
+                    high = min(high or (cutoff, float("inf")), (cutoff, float("inf")))
+                else:
+                    low = max(low or (cutoff, float("-inf")), (cutoff, float("-inf")))
+            tasks.append((reader, f, date_args, msg_query, field_filters, limit, low, high, ranks[f], collect_facets,
+                          newer))
+        keys = [result_cache_key(*task) for task in tasks]
+        results = [_result_cache.get(key) if key is not None else None for key in keys]
+        todo = [i for i, result in enumerate(results) if result is None]
+        if workers > 1 and len(todo) > 1:
+            try:
+                pool = get_scan_pool()
+                futures = [pool.submit(scan_file, *tasks[i]) for i in todo]
+                for i, future in zip(todo, futures):
+                    results[i] = future.result()
+            except Exception as e:
+                logging.error(f"Parallel archive scan failed, scanning sequentially: {e}")
+                for i in todo:
+                    results[i] = scan_file(*tasks[i])
+        else:
+            for i in todo:
+                results[i] = scan_file(*tasks[i])
+        for i in todo:
+            if keys[i] is not None:
+                _result_cache.put(keys[i], results[i], estimate_size(results[i][0], results[i][2]))
+
+        for i, (f, (items, file_stats, file_facets)) in enumerate(zip(wave, results)):
+            # Cached items may carry the rank the file had in another search
+            top.rank = ranks[f]
+            for (epoch, _, line_no), row in items:
+                top.push(epoch, line_no, row)
+            if i in todo:
+                for key, value in file_stats.items():
+                    stats[key] += value
+            else:
+                stats["files_cached"] += 1
+                stats["rows_in_range"] += file_stats["rows_in_range"]
+            for col, values in file_facets.items():
+                facets.setdefault(col, set()).update(values)
+
+    stats["files_scanned"] = len(files) - stats["files_skipped_early"]
+    stats["text_false_positive_rate"] = text_false_positive_rate(stats)
+    stats["result_cache"] = _result_cache.stats()
+
+    items = top.items()
+    def page_cursor(key):
+        epoch, rank, line_no = key
+        return encode_cursor(os.path.basename(by_rank[rank - 1]), line_no, epoch)
+    full = limit is not None and len(items) >= limit
+    cursors = {"older": None, "newer": None}
+    if (full and not newer) or (newer and cursor is not None):
+        cursors["older"] = page_cursor(items[0][0]) if items else encode_cursor(*cursor)
+    if (full and newer) or (not newer and cursor is not None):
+        cursors["newer"] = page_cursor(items[-1][0]) if items else encode_cursor(*cursor)
+    return [row for _, row in items], stats, facets, cursors
+
+def request_cursor():
+    """(cursor, newer) of the page asked for: older=<cursor> or
+    newer=<cursor>, or an empty newer= for the oldest page of the range.
+    Raises ValueError for a malformed cursor."""
+    if request.args.get('older'):
+        return decode_cursor(request.args['older']), False
+    if 'newer' in request.args:
+        return (decode_cursor(request.args['newer']) if request.args['newer'] else None), True
+    return None, False
+
+def page_urls(cursors, paged):
+    """Links to the newest, newer, older and oldest pages of the search."""
+    args = {k: v for k, v in request.args.items() if k not in ('older', 'newer')}
+    return {
+        "newest": url_for('archive', **args) if paged else None,
+        "newer": url_for('archive', **args, newer=cursors["newer"]) if cursors["newer"] else None,
+        "older": url_for('archive', **args, older=cursors["older"]) if cursors["older"] else None,
+        "oldest": url_for('archive', **args, newer='') if cursors["older"] else None,
+    }
+
+def range_args(start_date_utc, end_date_utc, names):
+    """API arguments for the range of the search and its filters in names."""
+    args = {k: v for k, v in request.args.items() if v and k in names}
+    args["start_date"] = start_date_utc.strftime('%Y-%m-%dT%H:%M:%S')
+    args["end_date"] = end_date_utc.strftime('%Y-%m-%dT%H:%M:%S')
+    return args
+
+def export_urls(start_date_utc, end_date_utc):
+    """Links exporting the whole range and filters of the search."""
+    args = range_args(start_date_utc, end_date_utc,
+                      ('host', 'facility', 'level', 'program', 'pid', 'msgonly_filter', 'msgonly_regex'))
+    return {fmt: url_for('api_archive_export', **args, format=fmt, gzip=1) for fmt in ('ndjson', 'csv')}
 
 def archive_search():
     if not is_authenticated():
@@ -168,6 +855,8 @@ def archive_search():
     selected_program = request.args.get('program', '')
     selected_pid = request.args.get('pid', '')
     msgonly_filter = request.args.get('msgonly_filter', '')
+    msgonly_regex = request.args.get('msgonly_regex', '') == '1'
+    msg_query = MessageQuery(msgonly_filter, msgonly_regex) if msgonly_filter else None
 
     # Get timezone offset from request
     tz_offset = request.args.get('timezone_offset', '0')
@@ -219,49 +908,40 @@ def archive_search():
     if num_lines not in NUM_LINES_OPTIONS:
         num_lines = DEFAULT_NUM_LINES
 
-    # Find and read only relevant log files
-    all_rows = []
+    field_filters = {col: value for col, value in (
+        (2, selected_host), (3, selected_facility), (4, selected_level),
+        (5, selected_program), (6, selected_pid)) if value}
+
+    try:
+        cursor, newer = request_cursor()
+    except ValueError as e:
+        logging.warning(f"Ignoring archive page cursor: {e}")
+        cursor, newer = None, False
+
+    # Find and read only relevant log files; filters are applied while reading
     relevant_files = find_relevant_log_files(start_date_utc, end_date_utc)
     logging.debug(f"Found {len(relevant_files)} relevant log files")
-    
-    for log_file in relevant_files:
-        logging.debug(f"Reading log file: {log_file}")
-        rows = read_log_file(log_file, start_date_utc, end_date_utc, local_tz, utc)
-        all_rows.extend(rows)
-
-    # Get unique values for filters
-    hosts = get_unique_values(all_rows, 2)
-    facilities = get_unique_values(all_rows, 3)
-    levels = get_unique_values(all_rows, 4)
-    programs = get_unique_values(all_rows, 5)
-    pids = get_unique_values(all_rows, 6)
-
-    # Apply filters
-    log_rows = all_rows
-    if selected_host:
-        log_rows = [r for r in log_rows if r[2] == selected_host]
-    if selected_facility:
-        log_rows = [r for r in log_rows if r[3] == selected_facility]
-    if selected_level:
-        log_rows = [r for r in log_rows if r[4] == selected_level]
-    if selected_program:
-        log_rows = [r for r in log_rows if r[5] == selected_program]
-    if selected_pid:
-        log_rows = [r for r in log_rows if r[6] == selected_pid]
-    if msgonly_filter:
-        log_rows = [r for r in log_rows if msgonly_filter.lower() in r[7].lower()]
-
-    # Sort by date and get the last N lines
-    log_rows.sort(key=lambda x: x[0])
-    log_rows = log_rows[-num_lines:]
+    log_rows, scan_stats, facets, cursors = scan_files(
+        read_log_file, relevant_files, (start_date_utc, end_date_utc, local_tz, utc), msg_query, field_filters,
+        limit=num_lines, cursor=cursor, newer=newer)
+    logging.debug(f"Archive scan stats: {scan_stats}")
+
+    # Unique values for filters
+    hosts = sorted(facets.get(2, ()))
+    facilities = sorted(facets.get(3, ()))
+    levels = sorted(facets.get(4, ()))
+    programs = sorted(facets.get(5, ()))
+    pids = sorted(facets.get(6, ()))
+    total_rows = scan_stats["rows_in_range"]
+
     logging.debug(f"After filtering: {len(log_rows)} rows")
 
     return render_template(
         'logtable_archive.html',
         rows=log_rows,
-        total_rows=len(all_rows),
-        fill_level=len(all_rows),
-        max_size=len(all_rows),
+        total_rows=total_rows,
+        fill_level=total_rows,
+        max_size=total_rows,
         hosts=hosts,
         facilities=facilities,
         levels=levels,
@@ -275,29 +955,28 @@ def archive_search():
         num_lines=num_lines,
         num_lines_options=NUM_LINES_OPTIONS,
         msgonly_filter=msgonly_filter,
+        msgonly_regex=msgonly_regex,
+        scan_stats=scan_stats,
+        pages=page_urls(cursors, cursor is not None or newer),
+        exports=export_urls(start_date_utc, end_date_utc),
+        histogram_args=range_args(start_date_utc, end_date_utc, ('host', 'facility', 'level', 'program')),
         start_date=start_date_str,
         end_date=end_date_str,
         timezone_offset=tz_offset,
         request=request
     )
 
-def api_archive():
-    if not is_authenticated():
-        return jsonify({"error": "unauthorized"}), 401
-
+def api_query():
+    """(start_date, end_date, msg_query, field_filters) of an API request.
+    Dates are naive UTC, the last five minutes by default."""
     selected_host = request.args.get('host', '')
     selected_facility = request.args.get('facility', '')
     selected_level = request.args.get('level', '')
     selected_program = request.args.get('program', '')
     selected_pid = request.args.get('pid', '')
     msgonly_filter = request.args.get('msgonly_filter', '')
-    num_lines = request.args.get('num_lines', str(DEFAULT_NUM_LINES))
-    try:
-        num_lines = int(num_lines)
-    except Exception:
-        num_lines = DEFAULT_NUM_LINES
-    if num_lines not in NUM_LINES_OPTIONS:
-        num_lines = DEFAULT_NUM_LINES
+    msgonly_regex = request.args.get('msgonly_regex', '') == '1'
+    msg_query = MessageQuery(msgonly_filter, msgonly_regex) if msgonly_filter else None
 
     now_utc = datetime.utcnow().replace(second=0, microsecond=0)
     now_utc_minus_5m = now_utc - timedelta(minutes=5)
@@ -320,28 +999,40 @@ def api_archive():
     else:
         end_date = now_utc
 
-    files = find_files_for_dates(start_date, end_date)
+    field_filters = {col: value for col, value in (
+        (2, selected_host), (3, selected_facility), (4, selected_level),
+        (5, selected_program), (6, selected_pid)) if value}
+    return start_date, end_date, msg_query, field_filters
+
+def api_archive():
+    if not is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+
+    start_date, end_date, msg_query, field_filters = api_query()
+    num_lines = request.args.get('num_lines', str(DEFAULT_NUM_LINES))
+    try:
+        num_lines = int(num_lines)
+    except Exception:
+        num_lines = DEFAULT_NUM_LINES
+    if num_lines not in NUM_LINES_OPTIONS:
+        num_lines = DEFAULT_NUM_LINES
+
+    try:
+        cursor, newer = request_cursor()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    files = find_relevant_log_files(start_date, end_date)
     logging.info(f"Archive search selected files: {files}")
-    all_rows = []
-    for f in files:
-        all_rows.extend(parse_log_file_lines(f, start_date, end_date))
-
-    log_rows = all_rows
-    if selected_host:
-        log_rows = [r for r in log_rows if r[2] == selected_host]
-    if selected_facility:
-        log_rows = [r for r in log_rows if r[3] == selected_facility]
-    if selected_level:
-        log_rows = [r for r in log_rows if r[4] == selected_level]
-    if selected_program:
-        log_rows = [r for r in log_rows if r[5] == selected_program]
-    if selected_pid:
-        log_rows = [r for r in log_rows if r[6] == selected_pid]
-    if msgonly_filter:
-        log_rows = [r for r in log_rows if msgonly_filter.lower() in r[7].lower()]
-    log_rows = log_rows[-num_lines:]
+
+    log_rows, scan_stats, _, cursors = scan_files(parse_log_file_lines, files, (start_date, end_date), msg_query,
+                                                  field_filters, limit=num_lines, collect_facets=False, cursor=cursor,
+                                                  newer=newer)
 
     return jsonify({
         "rows": log_rows,
-        "total_rows": len(all_rows)
+        "total_rows": scan_stats["rows_in_range"],
+        "older": cursors["older"],
+        "newer": cursors["newer"],
+        "scan_stats": scan_stats
     })
@@ -1,64 +1,72 @@
-from flask import request, render_template, session, redirect, url_for, jsonify
+from flask import request, render_template, session, redirect, url_for, jsonify, Response, stream_with_context
+import json
+import time
 import logging
 from settings import (
     NUM_LINES_OPTIONS, DEFAULT_NUM_LINES, DEFAULT_REFRESH_INTERVAL, REFRESH_INTERVAL_OPTIONS,
-    LOG_FILE, LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD
+    LIVE_PUSH, STREAM_HEARTBEAT_SECONDS, LOG_FILE, LOG_LEVEL, AUTH_USERNAME, AUTH_PASSWORD
 )
-from back import fetch_log_array
-from utils import is_authenticated, get_unique_values
+from back_client import fetch_log_update
+from rollup import FIELDS as ROLLUP_FIELDS
+from utils import is_authenticated
+
+# Request argument -> row column of the dropdown filters
+FILTER_COLUMNS = (("host", 2), ("facility", 3), ("level", 4), ("program", 5), ("pid", 6))
+# Minimum seconds between two row events of a live stream, to batch bursts
+STREAM_MIN_INTERVAL = 0.25
+# Minutes of line counts charted above the live table
+HISTOGRAM_MINUTES = 60
+
+def get_num_lines():
+    try:
+        num_lines = int(request.args.get('num_lines', str(DEFAULT_NUM_LINES)))
+    except Exception:
+        num_lines = DEFAULT_NUM_LINES
+    if num_lines not in NUM_LINES_OPTIONS:
+        num_lines = DEFAULT_NUM_LINES
+    return num_lines
+
+def request_filters():
+    """The dropdown filters ({column: value}) and message filter of the current request."""
+    filters = {}
+    for name, col in FILTER_COLUMNS:
+        value = request.args.get(name, '')
+        if value:
+            filters[col] = value
+    return filters, request.args.get('msgonly_filter', '')
+
+def facet_options(facets, col):
+    """(value, line count) pairs of a dropdown, sorted by value."""
+    return sorted(facets.get(col, {}).items())
 
 def live_search():
     if not is_authenticated():
         return redirect(url_for('login'))
     logging.debug(f"HTTP GET /live request: args={request.args}, remote_addr={request.remote_addr}")
-    buffer_rows, fill_level, max_size = fetch_log_array()
-    hosts = get_unique_values(buffer_rows, 2)
-    facilities = get_unique_values(buffer_rows, 3)
-    levels = get_unique_values(buffer_rows, 4)
-    programs = get_unique_values(buffer_rows, 5)
-    pids = get_unique_values(buffer_rows, 6)
+    num_lines = get_num_lines()
+    filters, msgonly_filter = request_filters()
+    # back.py filters the rows and counts the dropdown values from its index
+    resp = fetch_log_update(filters=filters, msgonly=msgonly_filter, limit=num_lines, facets=True)
+    fill_level, max_size, facets = resp["fill_level"], resp["max_size"], resp["facets"]
 
     selected_host = request.args.get('host', '')
     selected_facility = request.args.get('facility', '')
     selected_level = request.args.get('level', '')
     selected_program = request.args.get('program', '')
     selected_pid = request.args.get('pid', '')
-    refresh = request.args.get('refresh', str(DEFAULT_REFRESH_INTERVAL))
-    msgonly_filter = request.args.get('msgonly_filter', '')
-
-    try:
-        num_lines = int(request.args.get('num_lines', str(DEFAULT_NUM_LINES)))
-    except Exception:
-        num_lines = DEFAULT_NUM_LINES
-    if num_lines not in NUM_LINES_OPTIONS:
-        num_lines = DEFAULT_NUM_LINES
-
-    log_rows = buffer_rows
-    if selected_host:
-        log_rows = [r for r in log_rows if r[2] == selected_host]
-    if selected_facility:
-        log_rows = [r for r in log_rows if r[3] == selected_facility]
-    if selected_level:
-        log_rows = [r for r in log_rows if r[4] == selected_level]
-    if selected_program:
-        log_rows = [r for r in log_rows if r[5] == selected_program]
-    if selected_pid:
-        log_rows = [r for r in log_rows if r[6] == selected_pid]
-    if msgonly_filter:
-        log_rows = [r for r in log_rows if msgonly_filter.lower() in r[7].lower()]
-    log_rows = log_rows[-num_lines:]
+    refresh = request.args.get('refresh', "push" if LIVE_PUSH else str(DEFAULT_REFRESH_INTERVAL))
 
     return render_template(
         'logtable_live.html',
-        rows=log_rows,
-        total_rows=len(buffer_rows),
+        rows=resp["lines"],
+        total_rows=fill_level,
         fill_level=fill_level,
         max_size=max_size,
-        hosts=hosts,
-        facilities=facilities,
-        levels=levels,
-        programs=programs,
-        pids=pids,
+        hosts=facet_options(facets, 2),
+        facilities=facet_options(facets, 3),
+        levels=facet_options(facets, 4),
+        programs=facet_options(facets, 5),
+        pids=facet_options(facets, 6),
         selected_host=selected_host,
         selected_facility=selected_facility,
         selected_level=selected_level,
@@ -69,45 +77,90 @@ def live_search():
         num_lines_options=NUM_LINES_OPTIONS,
         refresh_interval_options=REFRESH_INTERVAL_OPTIONS,
         msgonly_filter=msgonly_filter,
+        seq=resp["seq"],
+        histogram_args={name: request.args[name] for name, _ in ROLLUP_FIELDS if request.args.get(name)},
+        histogram_minutes=HISTOGRAM_MINUTES,
         request=request
     )
 
 def api_live():
     if not is_authenticated():
         return jsonify({"error": "unauthorized"}), 401
-    buffer_rows, fill_level, max_size = fetch_log_array()
-    selected_host = request.args.get('host', '')
-    selected_facility = request.args.get('facility', '')
-    selected_level = request.args.get('level', '')
-    selected_program = request.args.get('program', '')
-    selected_pid = request.args.get('pid', '')
-    msgonly_filter = request.args.get('msgonly_filter', '')
-
     try:
-        num_lines = int(request.args.get('num_lines', str(DEFAULT_NUM_LINES)))
-    except Exception:
-        num_lines = DEFAULT_NUM_LINES
-    if num_lines not in NUM_LINES_OPTIONS:
-        num_lines = DEFAULT_NUM_LINES
+        since = int(request.args['since'])
+    except (KeyError, ValueError):
+        since = None
+    filters, msgonly_filter = request_filters()
+    # Dropdown values come with full responses; delta polls stay cheap
+    resp = fetch_log_update(since, filters=filters, msgonly=msgonly_filter, limit=get_num_lines(),
+                            facets=since is None)
+    fill_level, max_size = resp["fill_level"], resp["max_size"]
+    log_rows = resp["lines"]
 
-    log_rows = buffer_rows
-    if selected_host:
-        log_rows = [r for r in log_rows if r[2] == selected_host]
-    if selected_facility:
-        log_rows = [r for r in log_rows if r[3] == selected_facility]
-    if selected_level:
-        log_rows = [r for r in log_rows if r[4] == selected_level]
-    if selected_program:
-        log_rows = [r for r in log_rows if r[5] == selected_program]
-    if selected_pid:
-        log_rows = [r for r in log_rows if r[6] == selected_pid]
-    if msgonly_filter:
-        log_rows = [r for r in log_rows if msgonly_filter.lower() in r[7].lower()]
-    log_rows = log_rows[-num_lines:]
-
-    return jsonify({
+    # With a valid since only rows newer than it are returned; the client
+    # appends them and asks again with the new seq
+    data = {
         "rows": log_rows,
-        "total_rows": len(buffer_rows),
+        "total_rows": fill_level,
         "fill_level": fill_level,
-        "max_size": max_size
-    })
+        "max_size": max_size,
+        "seq": resp["seq"],
+        "delta": since is not None and not resp["reset"]
+    }
+    if since is None:
+        data["facets"] = {name: resp["facets"].get(col, {}) for name, col in FILTER_COLUMNS}
+    return jsonify(data)
+
+def sse_event(event, seq, data):
+    lines = [f"event: {event}"]
+    if seq is not None:
+        lines.append(f"id: {seq}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def live_stream():
+    """Server-sent events with the filtered rows of the live buffer.
+
+    Each event carries the buffer sequence number as its id, so a reconnecting
+    EventSource resumes through Last-Event-ID (or since=) where it left off.
+    "rows" events hold new rows to append, "reset" events the last num_lines
+    rows to replace the table with, and "heartbeat" events keep idle
+    connections open and report the buffer fill level."""
+    if not is_authenticated():
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.args['since'])
+    except (KeyError, ValueError):
+        since = None
+    num_lines = get_num_lines()
+    filters, msgonly_filter = request_filters()
+
+    def events():
+        nonlocal since
+        yield "retry: 3000\n\n"
+        last_sent = time.monotonic()
+        while True:
+            resp = fetch_log_update(since, wait=STREAM_HEARTBEAT_SECONDS, filters=filters, msgonly=msgonly_filter,
+                                    limit=num_lines)
+            if resp["seq"] is None:
+                yield sse_event("error", None, {"message": resp["lines"][0][7]})
+                return
+            stats = {"total_rows": resp["fill_level"], "fill_level": resp["fill_level"], "max_size": resp["max_size"]}
+            rows = resp["lines"]
+            if since is None or resp["reset"]:
+                yield sse_event("reset", resp["seq"], dict(stats, rows=rows))
+            elif rows:
+                yield sse_event("rows", resp["seq"], dict(stats, rows=rows))
+            elif time.monotonic() - last_sent >= STREAM_HEARTBEAT_SECONDS:
+                yield sse_event("heartbeat", resp["seq"], stats)
+            else:
+                # Only lines the client filters out; keep waiting
+                since = resp["seq"]
+                time.sleep(STREAM_MIN_INTERVAL)
+                continue
+            since = resp["seq"]
+            last_sent = time.monotonic()
+            time.sleep(STREAM_MIN_INTERVAL)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
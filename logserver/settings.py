@@ -11,11 +11,11 @@ class Settings:
         self.config_path = config_path
         self.config = configparser.ConfigParser()
         self.load_config()
-        self._load_settings()
 
     def load_config(self) -> None:
-        """Load configuration from file."""
+        """Load configuration from file into the settings attributes."""
         self.config.read(self.config_path)
+        self._load_settings()
 
     def save_config(self, form_data: Dict[str, Any]) -> None:
         """Save configuration from form data."""
@@ -68,7 +68,11 @@ class Settings:
 
         # Buffer settings
         self.MAX_ARRAY_SIZE = self.config.getint('buffer', 'max_array_size')
-        self.TRIM_SIZE = self.config.getint('buffer', 'trim_size')
+        self.LIVE_SHARED_MEMORY = self.config.getboolean('buffer', 'shared_memory', fallback=False)
+        self.LIVE_SHARED_MEMORY_PATH = self.config.get('buffer', 'shared_memory_path', fallback='/dev/shm/logbuffer')
+        self.LIVE_SHARED_MEMORY_MB = self.config.getint('buffer', 'shared_memory_mb', fallback=64)
+        self.LIVE_SNAPSHOT = self.config.getboolean('buffer', 'snapshot', fallback=True)
+        self.LIVE_SNAPSHOT_PATH = self.config.get('buffer', 'snapshot_path', fallback='/tmp/logbuffer.snapshot')
 
         # Display settings
         self.NUM_LINES_OPTIONS = [int(x) for x in self.config.get('display', 'num_lines_options').split(',')]
@@ -80,6 +84,8 @@ class Settings:
             [pair.split(':') for pair in self.config.get('refresh', 'refresh_interval_options').split(',')]
         ]
         self.DEFAULT_REFRESH_INTERVAL = self.config.getint('refresh', 'default_refresh_interval')
+        self.LIVE_PUSH = self.config.getboolean('refresh', 'live_push', fallback=True)
+        self.STREAM_HEARTBEAT_SECONDS = self.config.getint('refresh', 'stream_heartbeat_seconds', fallback=15)
 
         # Authentication
         self.AUTH_USERNAME = self.config.get('auth', 'username')
@@ -95,6 +101,19 @@ class Settings:
         self.LOG_ROTATE_MAX_AGE_DAYS = self.config.getint('rotation', 'max_age_days')
         self.LOG_ROTATE_MAX_SIZE_MB = self.config.getint('rotation', 'max_size_mb')
         self.LOG_ROTATE_CHECK_INTERVAL_SECONDS = self.config.getint('rotation', 'check_interval_seconds')
+        self.ROTATED_LOG_ARCHIVE_FORMAT = self.config.get('rotation', 'archive_format', fallback='gzip')
+        self.ROTATED_LOG_BLOCK_SIZE_KB = self.config.getint('rotation', 'block_size_kb', fallback=1024)
+        self.ROTATED_LOG_CODEC = self.config.get('rotation', 'compress_codec', fallback='gzip')
+        self.ROTATED_LOG_COMPRESS_LEVEL = self.config.getint('rotation', 'compress_level', fallback=6)
+        self.ROTATED_LOG_COMPRESS_WORKERS = self.config.getint('rotation', 'compress_workers', fallback=0)
+
+        # Archive search settings
+        self.ARCHIVE_SCAN_WORKERS = self.config.getint('search', 'archive_workers', fallback=0)
+        self.ARCHIVE_RESULT_CACHE_MB = self.config.getint('search', 'result_cache_mb', fallback=64)
+
+        # Web server settings
+        self.FRONT_WORKERS = self.config.getint('front', 'workers', fallback=2)
+        self.FRONT_THREADS = self.config.getint('front', 'threads', fallback=16)
 
         # Logging level
         self.LOG_LEVEL = self.config.get('logging', 'level')
@@ -106,11 +125,17 @@ settings = Settings(os.path.join(os.path.dirname(__file__), 'settings.conf'))
 LOG_FILE = settings.LOG_FILE
 SOCKET_PATH = settings.SOCKET_PATH
 MAX_ARRAY_SIZE = settings.MAX_ARRAY_SIZE
-TRIM_SIZE = settings.TRIM_SIZE
+LIVE_SHARED_MEMORY = settings.LIVE_SHARED_MEMORY
+LIVE_SHARED_MEMORY_PATH = settings.LIVE_SHARED_MEMORY_PATH
+LIVE_SHARED_MEMORY_MB = settings.LIVE_SHARED_MEMORY_MB
+LIVE_SNAPSHOT = settings.LIVE_SNAPSHOT
+LIVE_SNAPSHOT_PATH = settings.LIVE_SNAPSHOT_PATH
 NUM_LINES_OPTIONS = settings.NUM_LINES_OPTIONS
 DEFAULT_NUM_LINES = settings.DEFAULT_NUM_LINES
 REFRESH_INTERVAL_OPTIONS = settings.REFRESH_INTERVAL_OPTIONS
 DEFAULT_REFRESH_INTERVAL = settings.DEFAULT_REFRESH_INTERVAL
+LIVE_PUSH = settings.LIVE_PUSH
+STREAM_HEARTBEAT_SECONDS = settings.STREAM_HEARTBEAT_SECONDS
 AUTH_USERNAME = settings.AUTH_USERNAME
 AUTH_PASSWORD = settings.AUTH_PASSWORD
 SECRET_KEY = settings.SECRET_KEY
@@ -122,4 +147,13 @@ ROTATED_LOG_MAX_DAYS = settings.ROTATED_LOG_MAX_DAYS
 LOG_ROTATE_MAX_AGE_DAYS = settings.LOG_ROTATE_MAX_AGE_DAYS
 LOG_ROTATE_MAX_SIZE_MB = settings.LOG_ROTATE_MAX_SIZE_MB
 LOG_ROTATE_CHECK_INTERVAL_SECONDS = settings.LOG_ROTATE_CHECK_INTERVAL_SECONDS
+ROTATED_LOG_ARCHIVE_FORMAT = settings.ROTATED_LOG_ARCHIVE_FORMAT
+ROTATED_LOG_BLOCK_SIZE_KB = settings.ROTATED_LOG_BLOCK_SIZE_KB
+ROTATED_LOG_CODEC = settings.ROTATED_LOG_CODEC
+ROTATED_LOG_COMPRESS_LEVEL = settings.ROTATED_LOG_COMPRESS_LEVEL
+ROTATED_LOG_COMPRESS_WORKERS = settings.ROTATED_LOG_COMPRESS_WORKERS
+ARCHIVE_SCAN_WORKERS = settings.ARCHIVE_SCAN_WORKERS
+ARCHIVE_RESULT_CACHE_MB = settings.ARCHIVE_RESULT_CACHE_MB
+FRONT_WORKERS = settings.FRONT_WORKERS
+FRONT_THREADS = settings.FRONT_THREADS
 LOG_LEVEL = settings.LOG_LEVEL
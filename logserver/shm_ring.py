@@ -0,0 +1,208 @@
+"""Shared-memory copy of the live buffer, read by front processes without IPC.
+
+back.py appends every line it buffers to a memory-mapped file (normally under
+/dev/shm) and front.py workers map the same file and read lines straight out
+of it, instead of having them pickled through the IPC socket.
+
+Layout: a header, a table of capacity + 1 end offsets and a data area used as
+a byte ring. Line seq occupies the data bytes from end[seq - 1] to end[seq]
+(absolute positions, taken modulo the data size), newline terminated.
+
+    magic, version, capacity, data_size, generation, seq, first
+
+seq is the newest complete line and first the oldest line whose bytes and
+end offsets are still intact. The single writer raises first before it
+overwrites anything and raises seq after it wrote the new lines, so a reader
+copies lines and then re-reads first: whatever is older than that may have
+been torn by the writer in the meantime and is dropped. generation is the
+sequence number the writer started from; a restarted writer replaces the file
+(readers notice the new inode) and starts from a larger one.
+"""
+import os
+import mmap
+import struct
+import logging
+from array import array
+
+MAGIC = b"LOGRING1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+HEADER_SIZE = 64
+SEQ_OFFSET = 32
+FIRST_OFFSET = 40
+# Reads retried when the writer overwrote everything they copied
+READ_ATTEMPTS = 3
+
+class ShmRingWriter:
+    """The back.py side: appends lines, never blocks on readers."""
+
+    def __init__(self, path, capacity, size_mb, start_seq):
+        self.path = path
+        self.capacity = capacity
+        self.slots = capacity + 1
+        self.data_offset = HEADER_SIZE + self.slots * 8
+        self.data_size = max(size_mb * 1024 * 1024 - self.data_offset, 64 * 1024)
+        self.seq = start_seq
+        self.first = start_seq + 1
+        self.end = 0
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, self.data_offset + self.data_size)
+            self.mm = mmap.mmap(fd, self.data_offset + self.data_size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, capacity, self.data_size, start_seq, self.seq, self.first)
+        # Readers that find the file see a complete header
+        os.replace(tmp_path, path)
+        logging.info(f"Shared-memory live buffer at {path} ({capacity} lines, {self.data_size // 1024} KB data)")
+
+    def append(self, lines):
+        """Append lines (strings, trailing newline optional)."""
+        # Keep every batch well inside both rings, so it never overwrites itself
+        step = max(1, self.capacity // 2)
+        for i in range(0, len(lines), step):
+            self._append(lines[i:i + step])
+
+    def _append(self, lines):
+        limit = self.data_size // 2
+        blob = bytearray()
+        ends = array("Q")
+        for line in lines:
+            data = line.rstrip("\n").replace("\n", " ").encode("utf-8", "replace")
+            if len(data) >= limit:
+                data = data[:limit - 1]
+            if len(blob) + len(data) + 1 > limit:
+                self._write(blob, ends)
+                blob = bytearray()
+                ends = array("Q")
+            blob += data
+            blob += b"\n"
+            ends.append(self.end + len(blob))
+        self._write(blob, ends)
+
+    def _write(self, blob, ends):
+        if not ends:
+            return
+        new_seq = self.seq + len(ends)
+        new_end = ends[-1]
+        # Publish first before overwriting: the end offset slot of line t is
+        # reused by line t + capacity + 1, and the bytes of line first start
+        # at end[first - 1], which must stay within data_size of new_end
+        first = max(self.first, new_seq - self.capacity + 1)
+        while first <= self.seq and self._end_of(first - 1) < new_end - self.data_size:
+            first += 1
+        if first != self.first:
+            self.first = first
+            struct.pack_into("<Q", self.mm, FIRST_OFFSET, first)
+
+        self._put(self.data_offset, self.data_size, self.end % self.data_size, blob)
+        slot = (self.seq + 1) % self.slots
+        self._put(HEADER_SIZE, self.slots * 8, slot * 8, ends.tobytes())
+
+        self.seq = new_seq
+        self.end = new_end
+        struct.pack_into("<Q", self.mm, SEQ_OFFSET, new_seq)
+
+    def _end_of(self, seq):
+        return struct.unpack_from("<Q", self.mm, HEADER_SIZE + (seq % self.slots) * 8)[0]
+
+    def _put(self, base, size, pos, data):
+        """Write data at pos of the ring [base, base + size), wrapping around."""
+        head = min(len(data), size - pos)
+        self.mm[base + pos:base + pos + head] = data[:head]
+        if head < len(data):
+            self.mm[base:base + len(data) - head] = data[head:]
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.mm.close()
+
+class ShmRingReader:
+    """The front.py side. get_lines answers like LogBuffer.get_lines; any
+    OSError or ValueError means the ring is unusable and the caller should
+    fall back to the IPC socket."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self.inode = None
+
+    def _attach(self):
+        """Map the file, again if back.py replaced it since."""
+        inode = os.stat(self.path).st_ino
+        if self.mm is not None and inode == self.inode:
+            return
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, capacity, data_size, generation, _, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError(f"{self.path} is not a live buffer ring")
+        # The old mapping is left to the garbage collector, other threads may
+        # still be reading from it
+        self.mm, self.inode = mm, inode
+        self.capacity, self.slots, self.data_size = capacity, capacity + 1, data_size
+        self.data_offset = HEADER_SIZE + self.slots * 8
+        self.generation = generation
+
+    def _get(self, base, size, pos, length):
+        head = min(length, size - pos)
+        data = self.mm[base + pos:base + pos + head]
+        if head < length:
+            data += self.mm[base:base + length - head]
+        return data
+
+    def get_lines(self, since=None, limit=None):
+        """Return (lines, seq, reset, fill_level, max_size) with lines as
+        8-tuples, newer than since and at most the newest limit of them."""
+        self._attach()
+        for _ in range(READ_ATTEMPTS):
+            result = self._read(since, limit)
+            if result is not None:
+                return result
+        raise ValueError("live buffer ring kept changing under the reader")
+
+    def _read(self, since, limit):
+        """One attempt of get_lines; None when the writer overtook it."""
+        seq, first = struct.unpack_from("<QQ", self.mm, SEQ_OFFSET)
+        reset = since is not None and not first - 1 <= since <= seq
+        low = first - 1 if since is None or reset else since
+        if limit:
+            low = max(low, seq - limit)
+        if low >= seq:
+            return [], seq, reset, seq - first + 1, self.capacity
+
+        count = seq - low + 1
+        ends = array("Q")
+        ends.frombytes(self._get(HEADER_SIZE, self.slots * 8, (low % self.slots) * 8, count * 8))
+        start, stop = ends[0], ends[-1]
+        if 0 <= stop - start <= self.data_size:
+            blob = self._get(self.data_offset, self.data_size, start % self.data_size, stop - start)
+        else:
+            blob = None
+
+        # Anything older than first may have been overwritten while copying
+        first_after = struct.unpack_from("<Q", self.mm, FIRST_OFFSET)[0]
+        if first_after > low + 1:
+            if first_after > seq:
+                return None
+            cut = ends[first_after - 1 - low]
+            if blob is None or not start <= cut <= stop:
+                return None
+            blob = blob[cut - start:]
+            low = first_after - 1
+            reset = since is not None
+        elif blob is None:
+            raise ValueError("corrupt live buffer ring")
+        lines = blob.decode("utf-8", "replace").split("\n")
+        lines.pop()
+        if len(lines) != seq - low:
+            raise ValueError("corrupt live buffer ring")
+        rows = [tuple(line.split("|", 7)) for line in lines]
+        rows = [row if len(row) == 8 else row + ("",) * (8 - len(row)) for row in rows]
+        return rows, seq, reset, seq - first_after + 1, self.capacity
@@ -0,0 +1,195 @@
+"""Trigram index over the MSGONLY field of rotated archives.
+
+For every archive rotate.py builds a postings list per lowercased trigram,
+stored as a bitmap of the archive segments (see archive_index.py) whose
+messages contain it, in a gzip'd JSON sidecar (``<archive>.gz.tri``). A
+message search only inflates segments holding every trigram the query
+requires; rows from those segments are still matched exactly, so the index
+can only cause extra reads, never missed rows.
+"""
+import os
+import re
+import json
+import gzip
+import logging
+from functools import lru_cache
+import archive_index
+
+TEXT_INDEX_VERSION = 1
+# Hex digits taken by the \x, \u and \U regex escapes
+REGEX_ESCAPE_DIGITS = {"x": 2, "u": 4, "U": 8}
+# Letters of inline flag groups such as (?x) or (?i:...)
+REGEX_FLAG_LETTERS = "aiLmsux-"
+# ASCII letters that re.IGNORECASE also matches to characters lowercasing to
+# something else (ı, İ, ſ); those and non-ASCII ones are not case-safe
+CASE_UNSAFE_ASCII = "iIsS"
+
+def text_index_path(gz_path):
+    return gz_path + archive_index.TEXT_INDEX_SUFFIX
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TextIndexBuilder:
+    """Trigram postings of an archive, fed segment by segment."""
+
+    def __init__(self):
+        self.postings = {}
+
+    def add_segment(self, seg_no, first_line, lines):
+        messages = "\n".join(line.split("|", 7)[7] for line in lines if line.count("|") >= 7).lower()
+        bit = 1 << seg_no
+        postings = self.postings
+        for gram in trigrams(messages):
+            postings[gram] = postings.get(gram, 0) | bit
+
+    def write(self, gz_path, index):
+        tmp_path = text_index_path(gz_path) + ".tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({
+                "version": TEXT_INDEX_VERSION,
+                "segments": len(index["segments"]),
+                "postings": {gram: format(bits, "x") for gram, bits in self.postings.items()},
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, text_index_path(gz_path))
+        logging.info(f"Built text index for {gz_path}: {len(self.postings)} trigrams")
+        return self.postings
+
+def build_text_index(gz_path):
+    """Build the trigram sidecar of an indexed archive."""
+    index = archive_index.load_index(gz_path)
+    if index is None:
+        logging.warning(f"No time index for {gz_path}, skipping text index")
+        return None
+    builder = TextIndexBuilder()
+    for seg_no, lines in archive_index.iter_segments(gz_path, index=index):
+        builder.add_segment(seg_no, index["segments"][seg_no][1], lines)
+    return builder.write(gz_path, index)
+
+@lru_cache(maxsize=32)
+def _load_postings(path, mtime_ns):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable text index {path}: {e}")
+        return None
+    if data.get("version") != TEXT_INDEX_VERSION:
+        return None
+    return data["segments"], {gram: int(bits, 16) for gram, bits in data["postings"].items()}
+
+def load_postings(gz_path):
+    """Return (segment count, {trigram: segment bitmap}) or None."""
+    path = text_index_path(gz_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _load_postings(path, mtime_ns)
+
+def regex_literals(pattern, flags=0):
+    """Return the literal runs every match of a simple regex must contain,
+    or None when nothing can be required: the pattern uses alternation, or
+    flags (re.X, re.I) or an inline flag group change what its text matches.
+    Text inside groups is ignored since the group may be optional."""
+    if flags & (re.VERBOSE | re.IGNORECASE) or "|" in pattern.replace("\\|", ""):
+        return None
+    runs = []
+    run = ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "\\" and i < len(pattern):
+            nxt = pattern[i]
+            i += 1
+            if nxt.isascii() and nxt.isalnum():
+                # Classes, anchors, backreferences and character escapes
+                # (\t, \x41, \u00e9, \N{...}) are not the letters they spell
+                runs.append(run if depth == 0 else "")
+                run = ""
+                # Skip the escape's argument too, it is not literal text
+                if nxt == "N" and pattern.startswith("{", i):
+                    i = pattern.find("}", i) + 1 or len(pattern)
+                elif nxt in REGEX_ESCAPE_DIGITS:
+                    i = min(i + REGEX_ESCAPE_DIGITS[nxt], len(pattern))
+                elif nxt.isdigit():
+                    while i < len(pattern) and pattern[i].isdigit():
+                        i += 1
+            else:
+                run += nxt
+            continue
+        if c in "*?{":
+            # The previous character is optional
+            runs.append(run[:-1] if depth == 0 else "")
+            run = ""
+            if c == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+            continue
+        if c in ".^$()+[":
+            runs.append(run if depth == 0 else "")
+            run = ""
+            if c == "(":
+                if pattern.startswith("?", i) and pattern[i + 1:i + 2] and pattern[i + 1] in REGEX_FLAG_LETTERS:
+                    return None
+                depth += 1
+            elif c == ")":
+                depth = max(depth - 1, 0)
+            elif c == "[":
+                i = pattern.find("]", i + 1) + 1 or len(pattern)
+            continue
+        run += c
+    runs.append(run if depth == 0 else "")
+    return [r for r in runs if r]
+
+def case_safe_runs(literal):
+    """Split a literal matched case-insensitively at the characters that
+    lowercasing, as the index does, does not map like re.IGNORECASE."""
+    return re.split(f"[^\\x00-\\x7f]|[{CASE_UNSAFE_ASCII}]", literal)
+
+class MessageQuery:
+    """A msgonly_filter: case-insensitive substring, or regex when regex is set."""
+
+    def __init__(self, text, regex=False):
+        self.text = text
+        self.needle = text.lower()
+        self.compiled = None
+        # Identifies the query for the archive result cache
+        self.key = (text, regex)
+        literals = [text]
+        if regex:
+            try:
+                self.compiled = re.compile(text, re.IGNORECASE)
+                # The index is lowercased: the literals of the pattern itself
+                # only hold up to case where lowercasing agrees with IGNORECASE
+                literals = regex_literals(text)
+                if literals is not None:
+                    literals = [run for lit in literals for run in case_safe_runs(lit)]
+            except re.error as e:
+                logging.warning(f"Invalid message regex {text!r}, matching it literally: {e}")
+        if literals is None:
+            self.required = set()
+        else:
+            self.required = set().union(*(trigrams(lit.lower()) for lit in literals))
+
+    def matches(self, msg):
+        if self.compiled is not None:
+            return self.compiled.search(msg) is not None
+        return self.needle in msg.lower()
+
+    def candidate_segments(self, gz_path):
+        """Set of segment numbers that can hold a match, or None when every
+        segment has to be read (no text index, or nothing to look up)."""
+        if not self.required:
+            return None
+        loaded = load_postings(gz_path)
+        if loaded is None:
+            return None
+        segment_count, postings = loaded
+        bits = (1 << segment_count) - 1
+        for gram in self.required:
+            bits &= postings.get(gram, 0)
+            if not bits:
+                break
+        return {i for i in range(segment_count) if bits >> i & 1}
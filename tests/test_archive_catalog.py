@@ -0,0 +1,67 @@
+import os
+import multiprocessing
+import pytest
+import archive_catalog
+import archive_index
+import bench
+from archive_catalog import add_archive, catalog_path, load_catalog
+
+@pytest.fixture
+def pattern(tmp_path):
+    return str(tmp_path / "messages.*.gz")
+
+def make_archive(tmp_path, n):
+    src = tmp_path / f"messages.2025-06-0{n}_00-00-00-to-2025-06-0{n}_01-00-00"
+    src.write_text("".join(bench.synthetic_lines(100)))
+    archive_index.compress_archive(str(src), f"{src}.gz")
+    os.remove(src)
+    return f"{src}.gz"
+
+def names(entries):
+    return sorted(os.path.basename(entry["path"]) for entry in entries)
+
+def test_archive_added_during_refresh_is_not_hidden(tmp_path, pattern, monkeypatch):
+    first = make_archive(tmp_path, 1)
+    assert names(load_catalog(pattern)) == [os.path.basename(first)]
+    (tmp_path / "stale.tmp").write_text("")
+    real_glob = archive_index.archive_glob
+    added = []
+
+    def glob_then_rotate(p):
+        # Another process writes an archive right after the refresh globbed
+        found = list(real_glob(p))
+        if not added:
+            added.append(make_archive(tmp_path, 2))
+        return found
+
+    monkeypatch.setattr(archive_index, "archive_glob", glob_then_rotate)
+    load_catalog(pattern)
+    monkeypatch.setattr(archive_index, "archive_glob", real_glob)
+    assert names(load_catalog(pattern)) == sorted(map(os.path.basename, [first, added[0]]))
+
+def test_temporary_files_do_not_rewrite_the_catalog(tmp_path, pattern):
+    make_archive(tmp_path, 1)
+    before = load_catalog(pattern)
+    inode = os.stat(catalog_path(pattern)).st_ino
+    (tmp_path / "messages.x.gz.tmp").write_text("")
+    archive_catalog._cache.clear()
+    assert load_catalog(pattern) == before
+    st = os.stat(catalog_path(pattern))
+    assert st.st_ino == inode
+    # ... but it is up to date with the directory again
+    assert st.st_mtime_ns >= os.stat(tmp_path).st_mtime_ns
+
+def add_in_child(path, pattern):
+    add_archive(path, pattern=pattern)
+
+def test_concurrent_adds_keep_every_archive(tmp_path, pattern):
+    paths = [make_archive(tmp_path, n) for n in range(1, 7)]
+    load_catalog(pattern)
+    ctx = multiprocessing.get_context("fork")
+    children = [ctx.Process(target=add_in_child, args=(path, pattern)) for path in paths]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+    archive_catalog._cache.clear()
+    assert names(load_catalog(pattern)) == names({"path": path} for path in paths)
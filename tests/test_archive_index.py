@@ -0,0 +1,31 @@
+import gzip
+import pytest
+import archive_index
+import bench
+from isodate import IsoDateDecoder
+
+@pytest.mark.parametrize("archive_format", archive_index.ARCHIVE_FORMATS)
+def test_segments_of_a_range_hold_all_its_lines(tmp_path, archive_format):
+    lines = bench.synthetic_lines(20000)
+    src = tmp_path / "messages.1-to-2"
+    src.write_text("".join(lines))
+    gz_path = f"{src}.gz"
+    index = archive_index.compress_archive(str(src), gz_path, archive_format, 16 * 1024)
+    assert archive_index.load_index(gz_path) == index
+    assert index["lines"] == len(lines)
+    # Still a valid gzip file for zcat and friends
+    with gzip.open(gz_path, "rt") as f:
+        assert f.read() == "".join(lines)
+
+    decoder = IsoDateDecoder()
+    epochs = [decoder.epoch(line.split("|", 1)[0]) for line in lines]
+    start_ts, end_ts = epochs[0] + 1000.5, epochs[0] + 1700
+    segments = list(archive_index.iter_segments(gz_path, start_ts, end_ts))
+    assert 1 < len(segments) < len(index["segments"])
+    read = [line for _, seg_lines in segments for line in seg_lines]
+    wanted = [line.rstrip("\n") for line, epoch in zip(lines, epochs) if start_ts <= epoch <= end_ts]
+    first = read.index(wanted[0])
+    assert read[first:first + len(wanted)] == wanted
+    # Newest first
+    assert [seg_no for seg_no, _ in archive_index.iter_segments(gz_path, start_ts, end_ts, reverse=True)] == \
+        [seg_no for seg_no, _ in reversed(segments)]
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+import archive_index
+import bench
+import search_archive
+from column_index import SUMMARY_EXACT_LIMIT, build_column_index, may_contain, summarize_columns
+from search_archive import parse_log_file_lines, scan_files
+
+HOST, PROGRAM = 2, 5
+
+def test_summary_is_exact_up_to_the_limit_then_a_bloom_filter():
+    hosts = [f"host{i}.example.net" for i in range(SUMMARY_EXACT_LIMIT + 100)]
+    summary = summarize_columns({"host": dict.fromkeys(hosts), "program": dict.fromkeys(["cron", "sshd"])})
+    assert summary["program"] == ["cron", "sshd"]
+    assert set(summary["host"]) == {"bits", "filter"}
+    assert all(may_contain(summary, {HOST: host}) for host in hosts)
+    assert may_contain(summary, {PROGRAM: "cron"}) and not may_contain(summary, {PROGRAM: "nginx"})
+    false_positives = sum(may_contain(summary, {HOST: f"other{i}.example.net"}) for i in range(2000))
+    assert false_positives < 2000 * 0.05
+    # Only a filter on both can rule the archive out
+    assert not may_contain(summary, {HOST: hosts[0], PROGRAM: "nginx"})
+    assert may_contain(None, {HOST: "other0.example.net"})
+
+def test_archives_without_the_host_are_not_read(tmp_path, monkeypatch):
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    lines = bench.synthetic_lines(6000, start)
+    # The second archive saw hundreds of other hosts, summarized as a bloom filter
+    many = [line.replace("|host", f"|many{i % 400}-host", 1) for i, line in enumerate(lines[3000:])]
+    files = []
+    for i, part in enumerate((lines[:3000], many)):
+        first = start + timedelta(seconds=i * 600)
+        src = tmp_path / f"messages.{first:%Y-%m-%d_%H-%M-%S}-to-{first + timedelta(seconds=599):%Y-%m-%d_%H-%M-%S}"
+        src.write_text("".join(part))
+        archive_index.compress_archive(str(src), f"{src}.gz")
+        build_column_index(f"{src}.gz")
+        files.append(f"{src}.gz")
+    monkeypatch.setattr(search_archive, "ROTATED_LOG_PATTERN", str(tmp_path / "messages.*.gz"))
+    host = lines[0].split("|")[HOST]
+    date_args = (start.replace(tzinfo=None), (start + timedelta(hours=1)).replace(tzinfo=None))
+    rows, stats, _, _ = scan_files(parse_log_file_lines, files, date_args, None, {HOST: host}, limit=10000,
+                                   collect_facets=False)
+    assert stats["files_skipped_members"] == 1
+    assert [row[1] for row in rows] == [line.split("|")[1] for line in lines[:3000] if line.split("|")[HOST] == host]
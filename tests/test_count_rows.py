@@ -0,0 +1,61 @@
+import os
+import pytest
+from datetime import datetime, timezone
+import archive_index
+import bench
+from isodate import IsoDateDecoder
+from search_archive import count_rows
+
+def brute_force(lines, start_ts, end_ts, end_inclusive):
+    decoder = IsoDateDecoder()
+    epochs = [decoder.epoch(line.split("|", 1)[0]) for line in lines]
+    if end_inclusive:
+        return sum(1 for epoch in epochs if start_ts <= epoch <= end_ts)
+    return sum(1 for epoch in epochs if start_ts <= epoch < end_ts)
+
+@pytest.fixture(scope="module")
+def lines():
+    return bench.synthetic_lines(20000)
+
+@pytest.mark.parametrize("archive_format", archive_index.ARCHIVE_FORMATS)
+@pytest.mark.parametrize("end_inclusive", [False, True])
+def test_archive_count_is_exact(tmp_path, lines, archive_format, end_inclusive):
+    src = tmp_path / "messages.1-to-2"
+    src.write_text("".join(lines))
+    archive_index.compress_archive(str(src), f"{src}.gz", archive_format, 16 * 1024)
+    start = IsoDateDecoder().epoch(lines[0].split("|", 1)[0])
+    # Windows starting and ending mid-minute, so segments straddle both bounds
+    for offset, length in ((17, 600), (930, 3600), (0, 60), (2000, 100000)):
+        start_ts, end_ts = start + offset, start + offset + length
+        assert count_rows(f"{src}.gz", start_ts, end_ts, IsoDateDecoder(), end_inclusive) == \
+            brute_force(lines, start_ts, end_ts, end_inclusive)
+
+def test_live_file_count_follows_appends(tmp_path, lines):
+    path = tmp_path / "messages"
+    path.write_text("".join(lines[:10000]))
+    start = IsoDateDecoder().epoch(lines[0].split("|", 1)[0])
+    start_ts, end_ts = start + 45, start + 3000
+    assert count_rows(str(path), start_ts, end_ts, IsoDateDecoder()) == brute_force(lines[:10000], start_ts, end_ts, False)
+    # A half-written line is left for the next count
+    with open(path, "a") as f:
+        f.write("".join(lines[10000:15000]) + lines[15000][:20])
+    assert count_rows(str(path), start_ts, end_ts, IsoDateDecoder()) == brute_force(lines[:15000], start_ts, end_ts, False)
+    with open(path, "a") as f:
+        f.write(lines[15000][20:])
+    assert count_rows(str(path), start_ts, end_ts, IsoDateDecoder()) == brute_force(lines[:15001], start_ts, end_ts, False)
+
+@pytest.mark.parametrize("fraction", [0, 250000])
+def test_live_file_answers_any_range_from_one_read(tmp_path, fraction, monkeypatch):
+    # Dates with and without fractional seconds
+    lines = bench.synthetic_lines(20000, datetime(2025, 6, 1, 0, 0, 0, fraction, timezone.utc))
+    path = tmp_path / "messages"
+    path.write_text("".join(lines))
+    start = IsoDateDecoder().epoch(lines[0].split("|", 1)[0])
+    count_rows(str(path), None, None, IsoDateDecoder())
+    # Later ranges, fractional bounds included, are answered without reading
+    monkeypatch.setattr("builtins.open", None)
+    for offset, length in ((0, 60), (17.5, 600.25), (59, 1), (930, 3600), (-100, 100000)):
+        for end_inclusive in (False, True):
+            start_ts, end_ts = start + offset, start + offset + length
+            assert count_rows(str(path), start_ts, end_ts, IsoDateDecoder(), end_inclusive) == \
+                brute_force(lines, start_ts, end_ts, end_inclusive)
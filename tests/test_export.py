@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta, timezone
+import archive_index
+import bench
+from export import export_rows
+from isodate import IsoDateDecoder
+
+def test_export_is_in_time_order(tmp_path):
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    lines = bench.synthetic_lines(9000, start)
+    files = []
+    # Two archives of 3000 lines each, then the live file
+    for i in range(2):
+        first = start + timedelta(seconds=i * 600)
+        last = first + timedelta(seconds=599)
+        src = tmp_path / f"messages.{first:%Y-%m-%d_%H-%M-%S}-to-{last:%Y-%m-%d_%H-%M-%S}"
+        src.write_text("".join(lines[i * 3000:(i + 1) * 3000]))
+        archive_index.compress_archive(str(src), f"{src}.gz")
+        files.append(f"{src}.gz")
+    live = tmp_path / "messages"
+    live.write_text("".join(lines[6000:]))
+    files.append(str(live))
+
+    rows = list(export_rows(sorted(files), start.replace(tzinfo=None), (start + timedelta(hours=1)).replace(tzinfo=None)))
+    decoder = IsoDateDecoder()
+    epochs = [decoder.epoch(row[0]) for row in rows]
+    assert len(rows) == len(lines)
+    assert epochs == sorted(epochs)
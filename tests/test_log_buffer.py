@@ -0,0 +1,67 @@
+import time
+import threading
+import bench
+from back import LogBuffer, handle_request
+
+def rcptids(rows):
+    return [int(row[1]) for row in rows]
+
+def test_since_returns_only_newer_lines():
+    lines = bench.synthetic_lines(300)
+    buffer = LogBuffer(100, start_seq=1000)
+    buffer.add_lines(lines[:50])
+    rows, seq, reset = buffer.get_lines()
+    assert (rcptids(rows), seq, reset) == (list(range(50)), 1050, False)
+    buffer.add_lines(lines[50:80])
+    rows, seq, reset = buffer.get_lines(1050)
+    assert (rcptids(rows), seq, reset) == (list(range(50, 80)), 1080, False)
+    assert buffer.get_lines(1080) == ([], 1080, False)
+
+def test_since_evicted_or_from_another_run_resets():
+    lines = bench.synthetic_lines(300)
+    buffer = LogBuffer(100, start_seq=1000)
+    buffer.add_lines(lines[:250])
+    # The lines after 1100 were overwritten by now
+    rows, seq, reset = buffer.get_lines(1100)
+    assert (rcptids(rows), seq, reset) == (list(range(150, 250)), 1250, True)
+    # A high-water mark newer than the buffer (back.py restarted)
+    assert buffer.get_lines(5000)[2]
+    rows, seq, reset = buffer.get_lines(1200)
+    assert (rcptids(rows), reset) == (list(range(200, 250)), False)
+
+def test_get_lines_request_answers_since():
+    buffer = LogBuffer(100, start_seq=0)
+    buffer.add_lines(bench.synthetic_lines(20))
+    resp = handle_request(buffer, {"cmd": "get_lines", "since": 15})
+    assert rcptids(resp["lines"]) == [15, 16, 17, 18, 19]
+    assert (resp["seq"], resp["reset"], resp["fill_level"], resp["max_size"]) == (20, False, 20, 100)
+
+def test_wait_returns_as_soon_as_lines_arrive():
+    lines = bench.synthetic_lines(20)
+    buffer = LogBuffer(100, start_seq=0)
+    buffer.add_lines(lines[:10])
+    timer = threading.Timer(0.2, buffer.add_lines, (lines[10:],))
+    timer.start()
+    started = time.monotonic()
+    resp = handle_request(buffer, {"cmd": "get_lines", "since": 10, "wait": 10})
+    assert time.monotonic() - started < 5
+    assert rcptids(resp["lines"]) == list(range(10, 20))
+
+def test_wait_times_out_without_new_lines():
+    buffer = LogBuffer(100, start_seq=0)
+    buffer.add_lines(bench.synthetic_lines(10))
+    started = time.monotonic()
+    resp = handle_request(buffer, {"cmd": "get_lines", "since": 10, "wait": 0.2})
+    assert time.monotonic() - started >= 0.2
+    assert (resp["lines"], resp["seq"], resp["reset"]) == ([], 10, False)
+
+def test_filtered_query_with_since():
+    lines = bench.synthetic_lines(500)
+    buffer = LogBuffer(1000, start_seq=0)
+    buffer.add_lines(lines)
+    host = lines[0].split("|")[2]
+    expected = [i for i, line in enumerate(lines) if i >= 200 and line.split("|")[2] == host]
+    resp = handle_request(buffer, {"cmd": "get_lines", "since": 200, "filters": {2: host}})
+    assert rcptids(resp["lines"]) == expected
+    resp = handle_request(buffer, {"cmd": "get_lines", "since": 200, "filters": {2: host}, "limit": 3})
+    assert rcptids(resp["lines"]) == expected[-3:]
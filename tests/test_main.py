@@ -0,0 +1,69 @@
+import shutil
+import signal
+import socket
+import configparser
+import pytest
+import main
+from settings import settings
+
+class FakeProcess:
+    def __init__(self, *args, **kwargs):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -signal.SIGTERM
+
+    kill = terminate
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """A copy of settings.conf the settings object reads, restored after."""
+    path = tmp_path / "settings.conf"
+    shutil.copy(settings.config_path, path)
+    original = settings.config_path
+    settings.config_path = str(path)
+    monkeypatch.setattr(main.subprocess, "Popen", FakeProcess)
+    monkeypatch.setattr(main.front_server, "listen_socket", lambda host, port: socket.socket())
+    monkeypatch.setattr(main, "processes", {})
+    monkeypatch.setattr(main, "started", {})
+    monkeypatch.setattr(main, "front_socket", None)
+    yield path
+    settings.config_path = original
+    settings.config = configparser.ConfigParser()
+    settings.load_config()
+
+def set_workers(path, workers):
+    parser = configparser.ConfigParser()
+    parser.read(path)
+    parser.set("front", "workers", str(workers))
+    with open(path, "w") as f:
+        parser.write(f)
+
+def test_reload_applies_new_worker_count(config):
+    set_workers(config, 2)
+    settings.load_config()
+    for name in main.STARTERS:
+        main.start(name)
+    assert len(main.processes["front.py"].procs) == 2
+
+    set_workers(config, 5)
+    main.signal_handler(signal.SIGHUP, None)
+    assert settings.FRONT_WORKERS == 5
+    assert len(main.processes["front.py"].procs) == 5
+
+def test_supervise_restarts_exited_children(config, monkeypatch):
+    settings.load_config()
+    for name in main.STARTERS:
+        main.start(name)
+    back = main.processes["back.py"]
+    back.returncode = 1
+    monkeypatch.setattr(main, "RESTART_DELAY", 0)
+    main.supervise()
+    assert main.processes["back.py"] is not back
+    assert main.processes["back.py"].poll() is None
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import archive_index
+import bench
+import search_archive
+from isodate import IsoDateDecoder
+from search_archive import decode_cursor, parse_log_file_lines, scan_files
+
+@pytest.fixture(params=archive_index.ARCHIVE_FORMATS)
+def files(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(search_archive, "ROTATED_LOG_PATTERN", str(tmp_path / "messages.*.gz"))
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    lines = bench.synthetic_lines(9000, start)
+    decoder = IsoDateDecoder()
+    paths = []
+    # Split mid-second, so the rows of one second are in two files
+    for part in (lines[:2998], lines[2998:6003]):
+        first, last = (datetime.fromtimestamp(decoder.epoch(line.split("|", 1)[0]), timezone.utc)
+                       for line in (part[0], part[-1]))
+        src = tmp_path / f"messages.{first:%Y-%m-%d_%H-%M-%S}-to-{last:%Y-%m-%d_%H-%M-%S}"
+        src.write_text("".join(part))
+        archive_index.compress_archive(str(src), f"{src}.gz", request.param, 16 * 1024)
+        paths.append(f"{src}.gz")
+    live = tmp_path / "messages"
+    live.write_text("".join(lines[6003:]))
+    paths.append(str(live))
+    return paths, lines
+
+def search(files, field_filters, cursor, newer, limit):
+    start = datetime(2025, 6, 1)
+    rows, _, _, cursors = scan_files(parse_log_file_lines, files, (start, start + timedelta(hours=1)), None,
+                                     field_filters, limit=limit, collect_facets=False,
+                                     cursor=decode_cursor(cursor) if cursor else None, newer=newer)
+    return [int(row[1]) for row in rows], cursors
+
+@pytest.mark.parametrize("host", [None, "host3.example.net"])
+def test_pages_cover_the_range_once(files, host):
+    paths, lines = files
+    field_filters = {2: host} if host else {}
+    expected = [i for i, line in enumerate(lines) if not host or line.split("|")[2] == host]
+    limit = 100 if host else 700
+
+    # Older pages from the newest rows
+    pages = []
+    ids, cursors = search(paths, field_filters, None, False, limit)
+    pages.append(ids)
+    while cursors["older"]:
+        ids, cursors = search(paths, field_filters, cursors["older"], False, limit)
+        pages.append(ids)
+    assert [i for page in reversed(pages) for i in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+
+    # Newer pages from the oldest rows, and back again
+    pages = []
+    ids, cursors = search(paths, field_filters, None, True, limit)
+    pages.append(ids)
+    while cursors["newer"]:
+        ids, cursors = search(paths, field_filters, cursors["newer"], True, limit)
+        pages.append(ids)
+    assert [i for page in pages for i in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+    older, _ = search(paths, field_filters, cursors["older"], False, limit)
+    assert older == pages[-2][-len(older):]
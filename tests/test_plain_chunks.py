@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+import bench
+import search_archive
+from search_archive import TopRows, read_log_file, scan_segments
+
+def test_backward_read_matches_forward(tmp_path, monkeypatch):
+    # Small blocks, so lines straddle block boundaries
+    monkeypatch.setattr(search_archive, "UNINDEXED_BLOCK_SIZE", 4096)
+    lines = bench.synthetic_lines(5000)
+    path = tmp_path / "messages"
+    path.write_text("".join(lines))
+    forward = [(n, line) for _, nos, chunk, _, _ in scan_segments(str(path), None, None) for n, line in zip(nos, chunk)]
+    backward = [(n, line) for _, nos, chunk, _, _ in scan_segments(str(path), None, None, reverse=True)
+                for n, line in zip(nos, chunk)]
+    assert [line for _, line in forward] == [line.rstrip("\n") for line in lines]
+    assert backward == forward[::-1]
+
+def test_newest_rows_stop_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_archive, "UNINDEXED_BLOCK_SIZE", 4096)
+    lines = bench.synthetic_lines(20000)
+    path = tmp_path / "messages"
+    path.write_text("".join(lines))
+    first = datetime.fromisoformat(lines[0].split("|", 1)[0])
+    last = datetime.fromisoformat(lines[-1].split("|", 1)[0])
+    utc = timezone.utc
+    full = read_log_file(str(path), first, last, utc, utc)
+    read = []
+    original = search_archive._plain_chunks
+
+    def counting(*args):
+        for chunk in original(*args):
+            read.append(len(chunk[2]))
+            yield chunk
+    monkeypatch.setattr(search_archive, "_plain_chunks", counting)
+    assert read_log_file(str(path), first, last, utc, utc, top=TopRows(30)) == full[-30:]
+    assert sum(read) < len(lines) // 2
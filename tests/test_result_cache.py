@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timedelta, timezone
+import archive_index
+import bench
+import search_archive
+from result_cache import ResultCache
+from search_archive import parse_log_file_lines, scan_files
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(300)
+    for key in "abc":
+        cache.put(key, key.upper(), 100)
+    assert cache.get("a") == "A"
+    cache.put("d", "D", 100)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    # Larger than the whole cache: not kept, nothing evicted for it
+    cache.put("e", "E", 301)
+    assert cache.get("e") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"], stats["bytes"]) == (4, 2, 1, 3, 300)
+
+def test_repeated_search_reuses_archive_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_archive, "_result_cache", ResultCache(64 * 1024 * 1024))
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    lines = bench.synthetic_lines(9000, start)
+    files = []
+    for i in range(2):
+        first = start + timedelta(seconds=i * 600)
+        src = tmp_path / f"messages.{first:%Y-%m-%d_%H-%M-%S}-to-{first + timedelta(seconds=599):%Y-%m-%d_%H-%M-%S}"
+        src.write_text("".join(lines[i * 3000:(i + 1) * 3000]))
+        archive_index.compress_archive(str(src), f"{src}.gz")
+        files.append(f"{src}.gz")
+    live = tmp_path / "messages"
+    live.write_text("".join(lines[6000:]))
+    files.append(str(live))
+    date_args = (start.replace(tzinfo=None), (start + timedelta(hours=1)).replace(tzinfo=None))
+
+    def search():
+        return scan_files(parse_log_file_lines, files, date_args, None, {}, limit=8000, collect_facets=False)
+
+    rows, stats, _, _ = search()
+    assert stats["files_cached"] == 0
+    cached_rows, stats, _, _ = search()
+    # The live file is read again every time
+    assert stats["files_cached"] == 2
+    assert cached_rows == rows
+    assert stats["rows_in_range"] == len(lines)
+    # A rewritten archive is searched again
+    os.utime(files[0], ns=(0, 0))
+    assert search()[1]["files_cached"] == 1
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import archive_index
+import bench
+import histogram
+from isodate import IsoDateDecoder
+from rollup import LiveRollups, Rollup, build_rollup, load_rollup
+
+START = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(scope="module")
+def lines():
+    return [line.rstrip("\n") for line in bench.synthetic_lines(20000, START)]
+
+def brute_force(lines, start_minute, end_minute, filters, group_by, bucket_minutes):
+    names = {"host": 2, "facility": 3, "level": 4, "program": 5}
+    decoder = IsoDateDecoder()
+    out = {}
+    for line in lines:
+        parts = line.split("|")
+        minute = int(decoder.epoch(parts[0]) // 60)
+        if not start_minute <= minute < end_minute or any(parts[names[k]] != v for k, v in filters.items()):
+            continue
+        buckets = out.setdefault(parts[names[group_by]] if group_by else "", {})
+        bucket = (minute - start_minute) // bucket_minutes
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    return out
+
+QUERIES = [({}, None, 1), ({}, "level", 7), ({"host": "host3.example.net"}, "program", 5),
+           ({"level": "err", "program": "cron"}, None, 60)]
+
+@pytest.mark.parametrize("filters, group_by, bucket_minutes", QUERIES)
+def test_counts_match_the_lines(tmp_path, lines, filters, group_by, bucket_minutes):
+    start_minute = int(START.timestamp() // 60) + 3
+    end_minute = start_minute + 50
+    expected = brute_force(lines, start_minute, end_minute, filters, group_by, bucket_minutes)
+    live = Rollup()
+    live.add_lines(lines + ["undated line", ""])
+    out = {}
+    live.aggregate(start_minute, end_minute, filters, group_by, bucket_minutes, out)
+    assert out == expected
+    # The same from an archive's sidecar
+    src = tmp_path / "messages.1-to-2"
+    src.write_text("\n".join(lines) + "\n")
+    archive_index.compress_archive(str(src), f"{src}.gz")
+    build_rollup(f"{src}.gz")
+    out = {}
+    load_rollup(f"{src}.gz").aggregate(start_minute, end_minute, filters, group_by, bucket_minutes, out)
+    assert out == expected
+
+def test_histogram_adds_archives_and_live_counts_once(tmp_path, lines, monkeypatch):
+    # An archive with a rollup, and the live counters of the file it was
+    # made from, still held by back.py
+    src = tmp_path / "messages.2025-06-01_00-00-00-to-2025-06-01_00-33-19"
+    src.write_text("\n".join(lines[:10000]) + "\n")
+    archive_index.compress_archive(str(src), f"{src}.gz")
+    build_rollup(f"{src}.gz", "1:old")
+    rollups = LiveRollups()
+    rollups.add_lines(rollups.start_file("1:old"), lines[:10000])
+    rollups.add_lines(rollups.start_file("2:new"), lines[10000:])
+    monkeypatch.setattr(histogram, "ROTATED_LOG_PATTERN", str(tmp_path / "messages.*.gz"))
+    monkeypatch.setattr(histogram, "fetch_rollup", lambda *args: rollups.aggregate(*args))
+
+    start_ts = START.timestamp()
+    result = histogram.histogram(start_ts, start_ts + 4000, {"level": "err"}, "host")
+    assert result["bucket_seconds"] == 60 * histogram.choose_bucket(67)
+    expected = brute_force(lines, int(start_ts // 60), int(start_ts // 60) + 67, {"level": "err"}, "host",
+                           result["bucket_seconds"] // 60)
+    assert result["series"] == {host: [buckets.get(i, 0) for i in range(len(result["series"][host]))]
+                                for host, buckets in expected.items()}
+    assert result["total"] == sum(line.split("|")[4] == "err" for line in lines)
+    assert (result["archives_without_rollup"], result["live"]) == (0, True)
@@ -0,0 +1,53 @@
+import os
+from datetime import datetime, timezone
+import bench
+import rotate
+from rotate import get_isodate_range_from_log
+
+def isodate(line):
+    return line.split("|", 1)[0]
+
+def test_reused_inode_gets_its_own_dates(tmp_path):
+    path = tmp_path / "messages"
+    old = bench.synthetic_lines(1000, datetime(2025, 6, 1, tzinfo=timezone.utc))
+    path.write_text("".join(old))
+    assert get_isodate_range_from_log(str(path)) == (isodate(old[0]), isodate(old[-1]))
+    inode = os.stat(path).st_ino
+    # The next log file on the same inode, and as large, once written
+    new = bench.synthetic_lines(1000, datetime(2025, 6, 8, tzinfo=timezone.utc))
+    with open(path, "r+") as f:
+        f.truncate(0)
+        f.write("".join(new))
+    assert os.stat(path).st_ino == inode
+    assert get_isodate_range_from_log(str(path)) == (isodate(new[0]), isodate(new[-1]))
+
+def test_growing_file_reads_its_new_tail(tmp_path):
+    path = tmp_path / "messages"
+    lines = bench.synthetic_lines(2000)
+    path.write_text("".join(lines[:1000]))
+    assert get_isodate_range_from_log(str(path))[1] == isodate(lines[999])
+    with open(path, "a") as f:
+        f.write("".join(lines[1000:]))
+    assert get_isodate_range_from_log(str(path)) == (isodate(lines[0]), isodate(lines[-1]))
+    assert rotate._isodate_cache[(os.stat(path).st_dev, os.stat(path).st_ino)][0] == os.path.getsize(path)
+
+def test_retention_counts_and_deletes_sidecars(tmp_path, monkeypatch):
+    import archive_index
+    archives = []
+    for n in range(1, 4):
+        src = tmp_path / f"messages.2025-06-0{n}_00-00-00-to-2025-06-0{n}_01-00-00"
+        src.write_text("".join(bench.synthetic_lines(100)))
+        archive_index.compress_archive(str(src), f"{src}.gz")
+        os.remove(src)
+        # Sidecars far larger than the archive itself
+        (tmp_path / f"{src.name}.gz{archive_index.ROLLUP_SUFFIX}").write_bytes(b"x" * 400 * 1024)
+        os.utime(f"{src}.gz", (n * 1000, n * 1000))
+        archives.append(f"{src}.gz")
+    monkeypatch.setattr(rotate, "ROTATED_LOG_PATTERN", str(tmp_path / "messages.*-to-*.gz"))
+    monkeypatch.setattr(rotate, "ROTATED_LOG_DELETE_MIN_COUNT", 100)
+    monkeypatch.setattr(rotate, "ROTATED_LOG_MAX_DAYS", 100000)
+    # The archives alone take a few KB, with their sidecars 1.2 MB
+    monkeypatch.setattr(rotate, "ROTATED_LOG_TOTAL_MAX_MB", 1)
+    rotate.delete_oldest_gz_if_needed()
+    assert [os.path.exists(path) for path in archives] == [False, True, True]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(os.path.basename(archives[0]))]
@@ -0,0 +1,58 @@
+import pytest
+import bench
+from back import LogBuffer
+from shm_ring import ShmRingReader, ShmRingWriter
+
+@pytest.fixture
+def lines():
+    return [line.rstrip("\n") for line in bench.synthetic_lines(30000)]
+
+def feed(writer, buffer, lines, batch=500):
+    for i in range(0, len(lines), batch):
+        writer.append(lines[i:i + batch])
+        buffer.add_lines(lines[i:i + batch])
+
+def test_ring_answers_like_the_buffer(tmp_path, lines):
+    path = str(tmp_path / "ring")
+    writer = ShmRingWriter(path, 1000, 1, 5000)
+    buffer = LogBuffer(1000, start_seq=5000)
+    reader = ShmRingReader(path)
+    feed(writer, buffer, lines[:600])
+    assert reader.get_lines() == buffer.get_lines() + (600, 1000)
+    for since in (5000, 5300, 5599, 5600):
+        assert reader.get_lines(since)[:3] == buffer.get_lines(since)
+    rows, seq, reset, _, _ = reader.get_lines(5300, limit=10)
+    assert (rows, seq, reset) == (buffer.get_lines(5590)[0], 5600, False)
+    writer.close()
+
+def test_ring_wraps_around(tmp_path, lines):
+    path = str(tmp_path / "ring")
+    # More lines than there are entries, and several times the 1 MB of data:
+    # the data runs out first
+    writer = ShmRingWriter(path, 20000, 1, 0)
+    buffer = LogBuffer(20000, start_seq=0)
+    reader = ShmRingReader(path)
+    feed(writer, buffer, lines)
+    rows, seq, reset, fill_level, max_size = reader.get_lines()
+    assert (seq, reset, max_size) == (30000, False, 20000)
+    assert 1000 < len(rows) < 20000
+    assert rows == buffer.get_lines()[0][-len(rows):]
+    assert fill_level == len(rows)
+    assert reader.get_lines(29900)[:3] == buffer.get_lines(29900)
+    # Lines already overwritten: everything still held, flagged as a reset
+    rows, seq, reset, _, _ = reader.get_lines(100)
+    assert reset and rows[-1] == buffer.get_lines()[0][-1]
+    writer.close()
+
+def test_restarted_writer_resets_readers(tmp_path, lines):
+    path = str(tmp_path / "ring")
+    writer = ShmRingWriter(path, 1000, 1, 0)
+    reader = ShmRingReader(path)
+    writer.append(lines[:100])
+    assert reader.get_lines(90)[1:3] == (100, False)
+    writer.close()
+    writer = ShmRingWriter(path, 1000, 1, 10 ** 9)
+    writer.append(lines[100:150])
+    rows, seq, reset, _, _ = reader.get_lines(100)
+    assert (len(rows), seq, reset) == (50, 10 ** 9 + 50, True)
+    writer.close()
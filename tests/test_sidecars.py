@@ -0,0 +1,43 @@
+import gzip
+import json
+import pytest
+import archive_index
+import bench
+from column_index import ColumnIndexBuilder, build_column_index, column_index_path
+from rollup import Rollup, build_rollup, rollup_path
+from text_index import TextIndexBuilder, build_text_index, text_index_path
+
+def read_sidecars(gz_path):
+    sidecars = []
+    for path in (text_index_path(gz_path), column_index_path(gz_path), rollup_path(gz_path)):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            sidecars.append(json.load(f))
+    return sidecars
+
+@pytest.mark.parametrize("archive_format", archive_index.ARCHIVE_FORMATS)
+def test_sidecars_built_while_compressing_match_a_rebuild(tmp_path, archive_format):
+    lines = bench.synthetic_lines(20000)
+    # Undated lines before the first segment and within, a blank line and
+    # bytes that are not UTF-8
+    src = tmp_path / "messages.1-to-2"
+    src.write_bytes(b"no date here\n" + "".join(lines[:5000]).encode() + b"\nstray \xff line\n"
+                    + "".join(lines[5000:]).encode())
+    gz_path = f"{src}.gz"
+    builders = [TextIndexBuilder(), ColumnIndexBuilder(), Rollup("1:x")]
+    segments = []
+
+    def on_segment(seg_no, first_line, seg_lines):
+        segments.append(seg_no)
+        for builder in builders:
+            builder.add_segment(seg_no, first_line, seg_lines)
+
+    index = archive_index.compress_archive(str(src), gz_path, archive_format, 16 * 1024, on_segment=on_segment)
+    for builder in builders:
+        builder.write(gz_path, index)
+    assert segments == list(range(len(index["segments"])))
+    built = read_sidecars(gz_path)
+
+    build_text_index(gz_path)
+    build_column_index(gz_path)
+    build_rollup(gz_path, "1:x")
+    assert built == read_sidecars(gz_path)
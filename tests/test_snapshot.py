@@ -0,0 +1,58 @@
+import os
+from datetime import datetime, timezone
+import archive_index
+import bench
+from back import save_snapshot, warm_start
+
+def rcptids(rows):
+    return [int(row[1]) for row in rows]
+
+def test_warm_start_reads_the_log_then_the_archives(tmp_path):
+    lines = bench.synthetic_lines(300, datetime(2025, 6, 1, tzinfo=timezone.utc))
+    src = tmp_path / "messages.2025-06-01_00-00-00-to-2025-06-01_00-00-49"
+    src.write_text("".join(lines[:250]))
+    archive_index.compress_archive(str(src), f"{src}.gz")
+    os.remove(src)
+    log = tmp_path / "messages"
+    # A half-written last line is left to the tailer
+    log.write_text("".join(lines[250:]) + "2025-06-01T00:01:00|partial")
+    buffer, tailer = warm_start(str(log), 100, pattern=str(tmp_path / "messages.*.gz"))
+    assert rcptids(buffer.get_lines()[0]) == list(range(200, 300))
+    assert tailer.offset == os.path.getsize(log) - len("2025-06-01T00:01:00|partial")
+    tailer._close()
+
+def test_snapshot_carries_on_where_it_stopped(tmp_path):
+    lines = bench.synthetic_lines(300)
+    log = tmp_path / "messages"
+    snapshot = str(tmp_path / "snapshot")
+    log.write_text("".join(lines[:200]))
+    buffer, tailer = warm_start(str(log), 150)
+    seq = buffer.seq
+    save_snapshot(buffer, tailer, snapshot)
+    # Written while back.py was down
+    with open(log, "a") as f:
+        f.write("".join(lines[200:]))
+
+    buffer, tailer = warm_start(str(log), 150, snapshot)
+    assert not os.path.exists(snapshot)
+    rows, restored_seq, _ = buffer.get_lines()
+    assert (rcptids(rows), restored_seq) == (list(range(50, 200)), seq)
+    tailer._drain()
+    rows, new_seq, reset = buffer.get_lines(seq)
+    assert (rcptids(rows), new_seq, reset) == (list(range(200, 300)), seq + 100, False)
+    tailer._close()
+
+def test_snapshot_of_a_replaced_log_is_ignored(tmp_path):
+    lines = bench.synthetic_lines(300)
+    log = tmp_path / "messages"
+    snapshot = str(tmp_path / "snapshot")
+    log.write_text("".join(lines[:200]))
+    buffer, tailer = warm_start(str(log), 150)
+    save_snapshot(buffer, tailer, snapshot)
+    # Rotated meanwhile: a new file in its place
+    os.rename(log, tmp_path / "messages.old")
+    log.write_text("".join(lines[200:]))
+    buffer, tailer = warm_start(str(log), 150, snapshot, pattern=str(tmp_path / "none.*.gz"))
+    assert not os.path.exists(snapshot)
+    assert rcptids(buffer.get_lines()[0]) == list(range(200, 300))
+    tailer._close()
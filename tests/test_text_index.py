@@ -0,0 +1,51 @@
+import re
+import pytest
+from text_index import MessageQuery, regex_literals, trigrams
+
+@pytest.mark.parametrize("pattern, literals", [
+    (r"beta\tgam", ["beta", "gam"]),
+    (r"\x41BC", ["BC"]),
+    (r"caf\u00e9 open", ["caf", " open"]),
+    (r"\U0001F600 smile", [" smile"]),
+    (r"\N{LATIN SMALL LETTER E}nd", ["nd"]),
+    (r"a\r\n\f\v\ab", ["a", "b"]),
+    (r"(user)\1 x", [" x"]),
+    (r"1\.2\.3", ["1.2.3"]),
+    (r"session \d+ opened", ["session ", " opened"]),
+])
+def test_regex_literals_escapes(pattern, literals):
+    assert regex_literals(pattern) == literals
+
+@pytest.mark.parametrize("pattern, text", [
+    (r"beta\tgam", "alpha beta\tgamma"),
+    (r"\x41", "status A ok"),
+    (r"caf\u00e9", "the caf\u00e9 opens"),
+])
+def test_required_trigrams_occur_in_matching_text(pattern, text):
+    query = MessageQuery(pattern, regex=True)
+    assert re.search(pattern, text, re.IGNORECASE)
+    assert query.required <= trigrams(text.lower())
+
+@pytest.mark.parametrize("pattern, flags", [
+    (r"(?x) foo bar", 0),
+    (r"(?i)foo", 0),
+    (r"x(?s:a.b)yz", 0),
+    (r"foo bar", re.VERBOSE),
+    (r"foo", re.IGNORECASE),
+])
+def test_regex_literals_give_up_on_flags(pattern, flags):
+    assert regex_literals(pattern, flags) is None
+
+@pytest.mark.parametrize("pattern, text", [
+    (r"(?x) foo bar", "xx foobar xx"),
+    (r"(?x) sess ion \s opened", "Session opened"),
+    (r"session opened", "ſeſſion opened"),
+    (r"kid", "KİD"),
+])
+def test_flags_and_case_folds_do_not_prune_matches(pattern, text):
+    query = MessageQuery(pattern, regex=True)
+    assert query.matches(text)
+    assert query.required <= trigrams(text.lower())
+
+def test_case_safe_literals_still_prune():
+    assert trigrams("opened") <= MessageQuery(r"session \d+ opened", regex=True).required